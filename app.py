@@ -1,4 +1,4 @@
-import os, sys, certifi
+import os, sys, time, certifi
 
 ca = certifi.where()
 
@@ -6,32 +6,89 @@ from dotenv import load_dotenv
 load_dotenv()
 
 mongo_db_url = os.getenv("MONGO_DB_URL")
-print(mongo_db_url)
 
-import pymongo
+import functools
 from networksecurity_project.exception.exception import NetworkSecurityException
 from networksecurity_project.logging.logger import logging
-from networksecurity_project.pipeline.training_pipeline import TrainingPipeline
+from networksecurity_project.pipeline.training_jobs import TrainingJobManager
 
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import FastAPI, File, UploadFile, Request
 from uvicorn import run as app_run
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse, JSONResponse
 from starlette.responses import RedirectResponse
 import pandas as pd
 
-from networksecurity_project.utils.main_utils.utils import load_object
-from networksecurity_project.utils.ml_utils.model.estimator import NetworkModel
-
-client = pymongo.MongoClient(mongo_db_url, tlsCAFile=ca)
+from networksecurity_project.utils.ml_utils.model.registry import ModelRegistry
+from networksecurity_project.utils.ml_utils.model.prediction_cache import PredictionCache
+from networksecurity_project.pipeline.batch_prediction import BatchPrediction
+from networksecurity_project.pipeline.prediction_batcher import PredictionBatcher, InvalidRecordsError
+from networksecurity_project.constant.training_pipeline import PREDICTION_BATCH_MAX_SIZE, PREDICTION_BATCH_MAX_WAIT_MS
+from networksecurity_project.constant.training_pipeline import PREDICTION_CACHE_MAX_ENTRIES, PREDICTION_CACHE_TTL_SECONDS
+from networksecurity_project.constant.training_pipeline import TRAINING_JOB_MAX_CONCURRENT
+from networksecurity_project.constant.training_pipeline import DRIFT_MONITOR_WINDOWS_SECONDS, DRIFT_MONITOR_BUCKET_SECONDS
+from networksecurity_project.monitoring.live_drift import LiveDriftMonitor
+from networksecurity_project.monitoring.metrics import PREDICTION_LATENCY_SECONDS, PREDICTION_ROWS, render_metrics
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from contextlib import asynccontextmanager
 
 from networksecurity_project.constant.training_pipeline import DATA_INGESTION_COLLECTION_NAME
 from networksecurity_project.constant.training_pipeline import DATA_INGESTION_DATABASE_NAME
 
-database = client[DATA_INGESTION_DATABASE_NAME]
-collection = database[DATA_INGESTION_COLLECTION_NAME]
+## the mongo client is created on first use, so the app starts without reaching the database
+@functools.lru_cache(maxsize=None)
+def get_collection():
+    import pymongo
+    client = pymongo.MongoClient(mongo_db_url, tlsCAFile=ca)
+    return client[DATA_INGESTION_DATABASE_NAME][DATA_INGESTION_COLLECTION_NAME]
+
+## the final model is loaded once and kept in memory, a watcher thread swaps in new versions.
+## Predictions of recently scored rows are cached until the next version, PREDICTION_CACHE_MAX_ENTRIES=0 turns the cache off
+model_registry = ModelRegistry(prediction_cache=PredictionCache(
+    max_entries=int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", PREDICTION_CACHE_MAX_ENTRIES)),
+    ttl_seconds=float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", PREDICTION_CACHE_TTL_SECONDS))
+))
+
+## the features of every scored batch are counted and compared with the drift baseline of the served model,
+## the windows are given in seconds, comma separated
+drift_monitor = LiveDriftMonitor(
+    get_baseline=model_registry.get_drift_baseline,
+    windows_seconds=tuple(int(window) for window in os.getenv("DRIFT_MONITOR_WINDOWS_SECONDS", ",".join(map(str, DRIFT_MONITOR_WINDOWS_SECONDS))).split(",")),
+    bucket_seconds=int(os.getenv("DRIFT_MONITOR_BUCKET_SECONDS", DRIFT_MONITOR_BUCKET_SECONDS))
+)
+
+## small json requests are grouped into one model call, the limits can be tuned from the environment
+prediction_batcher = PredictionBatcher(
+    get_model=model_registry.get_model,
+    max_batch_size=int(os.getenv("PREDICTION_BATCH_MAX_SIZE", PREDICTION_BATCH_MAX_SIZE)),
+    max_wait_ms=float(os.getenv("PREDICTION_BATCH_MAX_WAIT_MS", PREDICTION_BATCH_MAX_WAIT_MS)),
+    observe=drift_monitor.observe
+)
+
+## trainings run in separate processes, a finished training makes the registry pick up the new model
+training_jobs = TrainingJobManager(
+    max_concurrent=int(os.getenv("TRAINING_JOB_MAX_CONCURRENT", TRAINING_JOB_MAX_CONCURRENT)),
+    on_success=model_registry.refresh
+)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        model_registry.reload()
+    except Exception as e:
+        logging.info(f"No model loaded at startup: {e}")
+    model_registry.start_watcher()
+    drift_monitor.start_watcher()
+    await prediction_batcher.start()
+    training_jobs.start()
+    yield
+    training_jobs.stop()
+    await prediction_batcher.stop()
+    drift_monitor.stop_watcher()
+    model_registry.stop_watcher()
+
+app = FastAPI(lifespan=lifespan)
 origins = ["*"]
 
 app.add_middleware(
@@ -53,21 +110,46 @@ async def index():
 @app.get("/train")
 async def train_route():
     try:
-        train_pipeline = TrainingPipeline()
-        train_pipeline.run_pipeline()
-        return Response("Training is successful")
+        job = training_jobs.submit()
+        return training_jobs.status(job.job_id)
     except Exception as e:
         raise NetworkSecurityException(e, sys) #type: ignore
+
+@app.get("/train/{job_id}")
+async def train_status_route(job_id: str):
+    job_status = training_jobs.status(job_id)
+    if job_status is None:
+        return JSONResponse({"detail": f"Training job {job_id} not found"}, status_code=404)
+    return job_status
+
+@app.delete("/train/{job_id}")
+async def train_cancel_route(job_id: str):
+    job = training_jobs.cancel(job_id)
+    if job is None:
+        return JSONResponse({"detail": f"Training job {job_id} not found"}, status_code=404)
+    return training_jobs.status(job_id)
     
 
+def observe_prediction(route: str, started: float, n_rows: int):
+    PREDICTION_LATENCY_SECONDS.labels(route=route).observe(time.perf_counter() - started)
+    PREDICTION_ROWS.labels(route=route).observe(n_rows)
+
+def observe_stream(route: str, started: float, batch_prediction: BatchPrediction, chunks):
+    ## a streamed prediction is only finished when its last chunk was sent
+    try:
+        yield from chunks
+    finally:
+        observe_prediction(route, started, batch_prediction.row_count)
+
+
 @app.post("/predict")
 async def predict_route(request:Request, file:UploadFile=File(...)):
     try:
+        started = time.perf_counter()
         df = pd.read_csv(file.file)
 
-        preprocessor= load_object("final_model/preprocessor.pkl")
-        final_model =load_object("final_model/model.pkl")
-        network_model = NetworkModel(preprocessor=preprocessor, model = final_model)
+        network_model = model_registry.get_model()
+        drift_monitor.observe(df)
         print(df.iloc[0])
         y_pred = network_model.predict(df)
         print(y_pred)
@@ -76,6 +158,7 @@ async def predict_route(request:Request, file:UploadFile=File(...)):
 
         df.to_csv("prediction_output/output.csv")
         table_html = df.to_html(classes='table table-striped')
+        observe_prediction("/predict", started, len(df))
 
         return templates.TemplateResponse("table.html", {"request": request, "table": table_html})
     
@@ -83,6 +166,64 @@ async def predict_route(request:Request, file:UploadFile=File(...)):
         raise NetworkSecurityException(e, sys) #type: ignore
 
 
+## streams the predictions back chunk by chunk instead of rendering the whole file,
+## the format can be csv or ndjson
+@app.post("/predict/stream")
+async def predict_stream_route(file:UploadFile=File(...), format:str="csv"):
+    try:
+        started = time.perf_counter()
+        if format not in ("csv", "ndjson"):
+            return Response(f"Unsupported format: {format}", status_code=400)
+
+        batch_prediction = BatchPrediction(network_model=model_registry.get_model(), observe=drift_monitor.observe)
+        if format == "ndjson":
+            chunks = observe_stream("/predict/stream", started, batch_prediction, batch_prediction.stream_ndjson(file.file))
+            return StreamingResponse(chunks, media_type="application/x-ndjson")
+        chunks = observe_stream("/predict/stream", started, batch_prediction, batch_prediction.stream_csv(file.file))
+        return StreamingResponse(chunks, media_type="text/csv")
+
+    except Exception as e:
+        raise NetworkSecurityException(e, sys) #type: ignore
+
+
+class PredictionRecords(BaseModel):
+    records: List[Dict[str, Optional[float]]]
+
+@app.post("/predict/records")
+async def predict_records_route(body: PredictionRecords):
+    try:
+        started = time.perf_counter()
+        predictions = await prediction_batcher.predict(body.records)
+        observe_prediction("/predict/records", started, len(body.records))
+        return {"predictions": predictions, "model_version": model_registry.version}
+    except InvalidRecordsError as e:
+        return JSONResponse(status_code=422, content={"detail": e.errors})
+    except Exception as e:
+        raise NetworkSecurityException(e, sys) #type: ignore
+
+@app.get("/predict/records/status")
+async def predict_records_status_route():
+    return prediction_batcher.status()
+
+
+@app.get("/model/status")
+async def model_status_route():
+    return model_registry.status()
+
+
+## drift scores of the live traffic in every rolling window
+@app.get("/drift")
+async def drift_route():
+    return drift_monitor.scores()
+
+
+## prometheus scrape endpoint
+@app.get("/metrics")
+async def metrics_route():
+    ## the drift gauges are brought up to date at scrape time
+    drift_monitor.scores()
+    content, content_type = render_metrics()
+    return Response(content, media_type=content_type)
 
 
 if __name__=="__main__":
@@ -0,0 +1,3 @@
+'''
+Benchmarks of the pipeline, run from the repository root as modules, e.g. python -m benchmarks.run_benchmarks
+'''
@@ -0,0 +1,59 @@
+'''
+Per row latency of the KNNImputer preprocessor against the serving InferencePreprocessor,
+for growing training set sizes.
+
+usage: python -m benchmarks.bench_inference_preprocessor --train-sizes 1000 10000 50000
+'''
+import argparse
+import time
+
+import numpy as np
+from sklearn.impute import KNNImputer
+from sklearn.pipeline import Pipeline
+
+from networksecurity_project.constant.training_pipeline import DATA_TRANSFORMATION_IMPUTER_PARAMS
+from networksecurity_project.utils.ml_utils.model.inference_preprocessor import KNNImputerIndex, InferencePreprocessor
+
+N_FEATURES = 30
+
+
+def make_data(rng, n_rows, missing_rate):
+    X = rng.choice([-1.0, 0.0, 1.0], size=(n_rows, N_FEATURES))
+    X[rng.random(X.shape) < missing_rate] = np.nan
+    return X
+
+
+def time_per_row(transform, X, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        transform(X)
+        best = min(best, time.perf_counter() - start)
+    return best / len(X)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--train-sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--missing-rate", type=float, default=0.05)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'train rows':>10} {'batch':>12} {'knn imputer us/row':>20} {'inference us/row':>18} {'speedup':>8}")
+    for train_size in args.train_sizes:
+        preprocessor = Pipeline([("imputer", KNNImputer(**DATA_TRANSFORMATION_IMPUTER_PARAMS))])
+        preprocessor.fit(make_data(rng, train_size, 0.0))
+        fast = InferencePreprocessor(preprocessor, KNNImputerIndex.from_preprocessor(preprocessor))
+
+        for label, missing_rate in (("complete", 0.0), ("with nan", args.missing_rate)):
+            X = make_data(rng, args.batch_size, missing_rate)
+            assert np.array_equal(preprocessor.transform(X), fast.transform(X), equal_nan=True)
+            slow_t = time_per_row(preprocessor.transform, X, args.repeats)
+            fast_t = time_per_row(fast.transform, X, args.repeats)
+            print(f"{train_size:>10} {label:>12} {slow_t * 1e6:>20.1f} {fast_t * 1e6:>18.1f} {slow_t / fast_t:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
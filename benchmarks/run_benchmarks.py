@@ -0,0 +1,507 @@
+'''
+Repeatable throughput and latency benchmarks of the pipeline hot spots on synthetic data:
+ingestion parsing, KNN imputation fit and transform, drift detection, model search and
+NetworkModel.predict, the compiled tree ensembles against sklearn, the row prediction cache on repeated traffic,
+the model search on a deduplicated weighted train set, the peak memory of the out of core training as the rows grow,
+plus the import time of the serving app against a budget. Results are
+written as json, and an earlier result file can be given to compare two commits.
+
+usage: python -m benchmarks.run_benchmarks --rows 100000 --missing-rate 0.01 --output results.json
+       python -m benchmarks.run_benchmarks --rows 100000 --compare results_main.json
+'''
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.tree import DecisionTreeClassifier
+
+from networksecurity_project.constant.training_pipeline import TARGET_COLUMN
+from networksecurity_project.components.data_ingestion import DataIngestion
+from networksecurity_project.components.data_transformation import DataTransformation
+from networksecurity_project.components.data_validation import DataValidation
+from networksecurity_project.entity.config_entity import TrainingPipelineConfig, DataIngestionConfig, DataValidationConfig
+from networksecurity_project.utils.main_utils.utils import evaluate_models, deduplicate_rows
+from networksecurity_project.utils.ml_utils.model.estimator import NetworkModel
+from networksecurity_project.utils.ml_utils.model.compiled_ensemble import CompiledTreeEnsemble
+from networksecurity_project.utils.ml_utils.model.inference_preprocessor import KNNImputerIndex, InferencePreprocessor
+from networksecurity_project.utils.ml_utils.model.prediction_cache import PredictionCache
+from networksecurity_project.cloud.object_store import LocalObjectStore
+from networksecurity_project.cloud.s3_syncer import S3Sync
+
+from benchmarks.synthetic import SyntheticGenerator
+
+BENCHMARKS = ["ingestion_parsing", "knn_imputation", "drift_detection", "model_search", "predict", "compiled_predict",
+              "prediction_cache", "deduplicated_search", "artifact_sync", "out_of_core", "serving_import"]
+## modules the serving app must only load on first use, not when it is imported
+SERVING_LAZY_MODULES = ["mlflow", "dagshub", "pymongo", "boto3", "sklearn", "scipy.stats",
+                        "networksecurity_project.components.model_trainer"]
+SERVING_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import app
+print(json.dumps({"seconds": time.perf_counter() - start,
+                  "eager_modules": [name for name in json.loads(sys.argv[1]) if name in sys.modules]}))
+"""
+## runs the out of core stages on generated documents in a fresh interpreter, the peak memory is the one of the run
+OUT_OF_CORE_SCRIPT = """
+import json, sys, time
+from benchmarks.synthetic import SyntheticGenerator
+from networksecurity_project.components.data_ingestion import DataIngestion
+from networksecurity_project.components.data_validation import DataValidation
+from networksecurity_project.components.data_transformation import DataTransformation
+from networksecurity_project.components.model_trainer import ModelTrainer
+from networksecurity_project.entity.config_entity import (TrainingPipelineConfig, DataIngestionConfig, DataValidationConfig,
+                                                          DataTransformationConfig, ModelTrainerConfig)
+from networksecurity_project.utils.main_utils.utils import get_peak_rss_bytes
+
+n_rows, missing_rate, seed = int(sys.argv[1]), float(sys.argv[2]), int(sys.argv[3])
+generator = SyntheticGenerator(missing_rate=missing_rate, seed=seed)
+
+## a cursor that makes its documents a thousand at a time, like the batches of a mongodb cursor
+class GeneratedCollection:
+    def find(self, *args, **kwargs):
+        for chunk in generator.iter_chunks(n_rows, chunk_rows=1000):
+            chunk = chunk.astype(object)
+            yield from chunk.where(chunk.notna(), "na").to_dict("records")
+
+DataIngestion.get_collection = lambda self: GeneratedCollection()
+config = TrainingPipelineConfig()
+start = time.perf_counter()
+data_ingestion_config = DataIngestionConfig(config)
+data_ingestion_config.incremental = False
+ingestion = DataIngestion(data_ingestion_config).initiate_data_ingestion()
+validation = DataValidation(ingestion, DataValidationConfig(config)).initiate_data_validation()
+transformation = DataTransformation(validation, DataTransformationConfig(config)).initiate_data_transformation()
+trainer = ModelTrainer(ModelTrainerConfig(config), transformation).initiate_model_trainer()
+print(json.dumps({"seconds": time.perf_counter() - start, "peak_rss_bytes": get_peak_rss_bytes(),
+                  "test_f1_score": trainer.test_metric_artifact.f1_score}))
+"""
+
+
+def measure(function, repeats):
+    """
+    Runs the function repeats times, returns the timings and the last result
+    """
+    timings, result = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return {"seconds_best": min(timings), "seconds_median": float(np.median(timings)), "seconds": timings}, result
+
+
+def throughput(timing, rows):
+    timing["rows"] = rows
+    timing["rows_per_second"] = rows / timing["seconds_best"] if timing["seconds_best"] else None
+    return timing
+
+
+def make_preprocessor():
+    ## the same preprocessor the transformation stage fits
+    return DataTransformation.get_data_transformer_object()
+
+
+def split(dataframe, test_share=0.2):
+    n_test = max(1, int(len(dataframe) * test_share))
+    return dataframe.iloc[:-n_test], dataframe.iloc[-n_test:]
+
+
+def bench_ingestion_parsing(args, generator, dataframe):
+    documents = generator.documents(len(dataframe))
+    data_ingestion = DataIngestion(DataIngestionConfig(TrainingPipelineConfig()))
+    timing, parsed = measure(lambda: data_ingestion.read_cursor_dataframe(iter(documents)), args.repeats)
+    assert len(parsed) == len(dataframe)
+    return throughput(timing, len(documents))
+
+
+def bench_knn_imputation(args, generator, dataframe):
+    features = dataframe.drop(columns=[TARGET_COLUMN]).iloc[:args.max_knn_rows]
+    train, test = split(features)
+    preprocessor = make_preprocessor()
+    fit_timing, _ = measure(lambda: preprocessor.fit(train), args.repeats)
+    transform_timing, _ = measure(lambda: preprocessor.transform(test), args.repeats)
+    return {
+        "train_rows": len(train),
+        "fit": throughput(fit_timing, len(train)),
+        "transform": throughput(transform_timing, len(test))
+    }
+
+
+def bench_drift_detection(args, generator, dataframe):
+    train, test = split(dataframe)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_validation_config = DataValidationConfig(TrainingPipelineConfig())
+        data_validation_config.drift_report_file_path = os.path.join(tmp_dir, "report.yaml")
+        data_validation = DataValidation(data_ingestion_artifact=None, data_validation_config=data_validation_config)
+        timing, _ = measure(lambda: data_validation.detect_dataset_drift(train, test), args.repeats)
+    return throughput(timing, len(dataframe))
+
+
+def training_arrays(args, dataframe):
+    dataframe = dataframe.iloc[:args.max_search_rows]
+    train, test = split(dataframe)
+    preprocessor = make_preprocessor()
+    X_train = preprocessor.fit_transform(train.drop(columns=[TARGET_COLUMN]))
+    X_test = preprocessor.transform(test.drop(columns=[TARGET_COLUMN]))
+    y_train = train[TARGET_COLUMN].replace(-1, 0).to_numpy()
+    y_test = test[TARGET_COLUMN].replace(-1, 0).to_numpy()
+    return preprocessor, X_train, y_train, X_test, y_test
+
+
+def bench_deduplicated_search(args, generator, dataframe):
+    """
+    The model search on a train set drawn with repetition from a pool of distinct rows, against the
+    same search on its deduplicated rows weighted by their counts, both scored on unseen rows
+    """
+    n_rows = min(len(dataframe), args.max_search_rows)
+    n_test = max(1, int(n_rows * 0.2))
+    ## the test rows are fresh rows, not drawn from the pool the train rows repeat
+    rows = generator.dataframe(args.pool_rows + n_test)
+    pool, test = rows.iloc[:args.pool_rows], rows.iloc[args.pool_rows:]
+    rng = np.random.default_rng(args.seed)
+    repeated = pd.concat([pool.iloc[rng.integers(0, len(pool), n_rows - n_test)], test], ignore_index=True)
+    _, X_train, y_train, X_test, y_test = training_arrays(args, repeated)
+    X_unique, y_unique, counts, report = deduplicate_rows(X_train, y_train)
+    params = {
+        "Decision_Tree": {"criterion": ["gini", "entropy"], "max_depth": [4, 8, None]},
+        "Random_Forest": {"n_estimators": [32, 64]},
+        "Logistic_Regression": {"C": [0.1, 1.0]}
+    }
+
+    def search(X, y, sample_weight):
+        models = {"Decision_Tree": DecisionTreeClassifier(random_state=0), "Random_Forest": RandomForestClassifier(random_state=0),
+                  "Logistic_Regression": LogisticRegression()}
+        return evaluate_models(X, y, X_test, y_test, models=models, params=params, n_jobs=args.n_jobs, sample_weight=sample_weight)
+
+    full_timing, full_report = measure(lambda: search(X_train, y_train, None), args.repeats)
+    deduplicated_timing, deduplicated_report = measure(lambda: search(X_unique, y_unique, counts), args.repeats)
+    ## fit of a single reference tree, without the search overhead around it
+    full_tree_timing, _ = measure(lambda: DecisionTreeClassifier(random_state=0).fit(X_train, y_train), args.repeats)
+    deduplicated_tree_timing, _ = measure(
+        lambda: DecisionTreeClassifier(random_state=0).fit(X_unique, y_unique, sample_weight=counts), args.repeats)
+    return {
+        "deduplication": report,
+        "full": throughput(full_timing, len(X_train)),
+        "deduplicated": throughput(deduplicated_timing, len(X_unique)),
+        "speedup": full_timing["seconds_best"] / deduplicated_timing["seconds_best"],
+        "reference_tree_fit_speedup": full_tree_timing["seconds_best"] / deduplicated_tree_timing["seconds_best"],
+        "test_scores": {name: {"full": float(full_report[name]), "deduplicated": float(deduplicated_report[name])}
+                        for name in full_report}
+    }
+
+
+def bench_model_search(args, generator, dataframe):
+    _, X_train, y_train, X_test, y_test = training_arrays(args, dataframe)
+    params = {
+        "Decision_Tree": {"criterion": ["gini", "entropy"], "max_depth": [4, 8, None]},
+        "Logistic_Regression": {"C": [0.1, 1.0]}
+    }
+
+    def search():
+        models = {"Decision_Tree": DecisionTreeClassifier(random_state=0), "Logistic_Regression": LogisticRegression()}
+        return evaluate_models(X_train, y_train, X_test, y_test, models=models, params=params, n_jobs=args.n_jobs)
+
+    timing, report = measure(search, args.repeats)
+    timing["n_jobs"] = args.n_jobs
+    timing["test_scores"] = {name: float(score) for name, score in report.items()}
+    return throughput(timing, len(X_train))
+
+
+def bench_predict(args, generator, dataframe):
+    preprocessor, X_train, y_train, _, _ = training_arrays(args, dataframe)
+    model = DecisionTreeClassifier(random_state=0).fit(X_train, y_train)
+    ## the serving app wraps the preprocessor the same way
+    network_model = NetworkModel(InferencePreprocessor(preprocessor, KNNImputerIndex.from_preprocessor(preprocessor)), model)
+
+    features = generator.dataframe(args.predict_batch + args.latency_calls).drop(columns=[TARGET_COLUMN])
+    batch = features.iloc[:args.predict_batch]
+    batch_timing, _ = measure(lambda: network_model.predict(batch), args.repeats)
+
+    latencies = []
+    for position in range(args.predict_batch, len(features)):
+        row = features.iloc[position:position + 1]
+        start = time.perf_counter()
+        network_model.predict(row)
+        latencies.append(time.perf_counter() - start)
+    return {
+        "batch": throughput(batch_timing, len(batch)),
+        "single_row_latency_seconds": {
+            "calls": len(latencies),
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "p99": float(np.percentile(latencies, 99))
+        }
+    }
+
+
+def bench_serving_import(args, generator, dataframe):
+    """
+    Imports app.py in a fresh interpreter per repeat, the cold start cost of the serving path
+    """
+    timings, eager_modules = [], []
+    for _ in range(args.repeats):
+        completed = subprocess.run([sys.executable, "-c", SERVING_IMPORT_SCRIPT, json.dumps(SERVING_LAZY_MODULES)],
+                                   capture_output=True, text=True, check=True)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        timings.append(result["seconds"])
+        eager_modules = result["eager_modules"]
+    return {
+        "seconds_best": min(timings),
+        "seconds_median": float(np.median(timings)),
+        "seconds": timings,
+        "budget_seconds": args.import_budget,
+        "within_budget": min(timings) <= args.import_budget and not eager_modules,
+        "eager_modules": eager_modules
+    }
+
+
+def latency(function, calls):
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return {"p50": float(np.percentile(timings, 50)), "p95": float(np.percentile(timings, 95))}
+
+
+def bench_compiled_predict(args, generator, dataframe):
+    """
+    Latency of model.predict against the compiled node arrays of the same model, per batch size
+    """
+    _, X_train, y_train, X_test, _ = training_arrays(args, dataframe)
+    models = {
+        "Random_Forest": RandomForestClassifier(n_estimators=128, random_state=0),
+        "Gradient_Boosting": GradientBoostingClassifier(n_estimators=128, random_state=0)
+    }
+    results = {}
+    for name, model in models.items():
+        model.fit(X_train, y_train)
+        compiled_model = CompiledTreeEnsemble.from_model(model)
+        X = np.resize(X_test, (max(args.compiled_batch_sizes), X_test.shape[1]))
+        results[name] = {"identical": bool(np.array_equal(model.predict(X), compiled_model.predict(X)))}
+        for batch_size in args.compiled_batch_sizes:
+            batch = X[:batch_size]
+            ## fewer calls for the large batches, every measurement takes about the same time
+            calls = max(3, min(args.latency_calls, 10000 // batch_size))
+            sklearn_latency = latency(lambda: model.predict(batch), calls)
+            compiled_latency = latency(lambda: compiled_model.predict(batch), calls)
+            results[name][f"batch_{batch_size}"] = {
+                "sklearn": sklearn_latency,
+                "compiled": compiled_latency,
+                "speedup": sklearn_latency["p50"] / compiled_latency["p50"]
+            }
+    return results
+
+
+def latency_over(function, batches):
+    timings = []
+    for batch in batches:
+        start = time.perf_counter()
+        function(batch)
+        timings.append(time.perf_counter() - start)
+    return {"p50": float(np.percentile(timings, 50)), "p95": float(np.percentile(timings, 95))}
+
+
+def bench_prediction_cache(args, generator, dataframe):
+    """
+    NetworkModel.predict with the row cache, cold and warm, against scoring every row, on traffic
+    drawn with repetition from a pool of distinct rows
+    """
+    preprocessor, X_train, y_train, _, _ = training_arrays(args, dataframe)
+    model = RandomForestClassifier(n_estimators=128, random_state=0).fit(X_train, y_train)
+    preprocessor = InferencePreprocessor(preprocessor, KNNImputerIndex.from_preprocessor(preprocessor))
+    cache = PredictionCache()
+    network_model = NetworkModel(preprocessor, model, prediction_cache=cache, cache_generation=cache.invalidate())
+
+    pool = generator.dataframe(args.pool_rows).drop(columns=[TARGET_COLUMN])
+    rng = np.random.default_rng(args.seed)
+    traffic = pool.iloc[rng.integers(0, len(pool), args.predict_batch)].reset_index(drop=True)
+    identical = bool(np.array_equal(network_model.predict(traffic), network_model.predict_rows(traffic)))
+
+    results = {"identical": identical, "pool_rows": len(pool), "traffic_rows": len(traffic)}
+    for batch_size in args.compiled_batch_sizes:
+        batches = [traffic.iloc[start:start + batch_size] for start in range(0, len(traffic), batch_size)]
+        batches = batches[:max(3, min(args.latency_calls, 10000 // batch_size))]
+        uncached = latency_over(network_model.predict_rows, batches)
+        ## a cold pass that fills a fresh cache, then a warm pass over the same batches
+        network_model.cache_generation = cache.invalidate()
+        cold = latency_over(network_model.predict, batches)
+        warm = latency_over(network_model.predict, batches)
+        results[f"batch_{batch_size}"] = {
+            "uncached": uncached,
+            "cold": cold,
+            "warm": warm,
+            "cold_speedup": uncached["p50"] / cold["p50"],
+            "warm_speedup": uncached["p50"] / warm["p50"]
+        }
+    results["cache"] = cache.status()
+    return results
+
+
+def bench_artifact_sync(args, generator, dataframe):
+    """
+    S3Sync of an artifact like folder to a local folder store: the first sync of a run, a repeated
+    sync of the same run, and the sync of the next run to a new prefix with one changed file
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        folder = os.path.join(tmp_dir, "artifact")
+        os.makedirs(os.path.join(folder, "data"))
+        dataframe.to_csv(os.path.join(folder, "data", "train.csv"), index=False)
+        dataframe.to_csv(os.path.join(folder, "data", "test.csv"), index=False)
+        rng = np.random.default_rng(args.seed)
+        for position in range(args.sync_files):
+            np.save(os.path.join(folder, "data", f"array_{position}.npy"), rng.random(args.sync_file_rows))
+        with open(os.path.join(folder, "model.bin"), "wb") as file_obj:
+            file_obj.write(rng.bytes(args.sync_large_file_mb * 1024 * 1024))
+
+        sync = S3Sync(store=LocalObjectStore(os.path.join(tmp_dir, "store")),
+                      multipart_threshold=min(args.sync_large_file_mb, 8) * 1024 * 1024,
+                      hash_cache_file_path=os.path.join(tmp_dir, "hash_cache.json"))
+        results = {}
+        for name, url in [("first", "s3://bench/artifact/run_1"), ("repeated", "s3://bench/artifact/run_1")]:
+            artifact = sync.sync_folder_to_s3(folder, url)
+            results[name] = {key: getattr(artifact, key) for key in
+                             ["files", "files_transferred", "files_copied", "files_skipped", "bytes_transferred",
+                              "multipart_uploads", "elapsed_seconds", "bytes_per_second"]}
+        np.save(os.path.join(folder, "data", "array_0.npy"), rng.random(args.sync_file_rows))
+        artifact = sync.sync_folder_to_s3(folder, "s3://bench/artifact/run_2")
+        results["next_run"] = {key: getattr(artifact, key) for key in
+                               ["files", "files_transferred", "files_copied", "files_skipped", "bytes_transferred",
+                                "bytes_copied", "elapsed_seconds"]}
+        download_folder = os.path.join(tmp_dir, "download")
+        artifact = sync.sync_folder_from_s3(download_folder, "s3://bench/artifact/run_2")
+        results["download"] = {"files": artifact.files, "elapsed_seconds": artifact.elapsed_seconds,
+                               "bytes_per_second": artifact.bytes_per_second}
+        return results
+
+
+def bench_out_of_core(args, generator, dataframe):
+    """
+    Peak resident memory and time of the out of core stages, ingestion to model, for growing row counts
+    under the same memory budget. The peak should stay flat while the rows grow.
+    """
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, TRAINING_OUT_OF_CORE="1", TRAINING_MEMORY_BUDGET_BYTES=str(args.out_of_core_budget_mb * 2**20),
+               MODEL_TRAINER_TRACKING_ENABLED="0",
+               PYTHONPATH=os.pathsep.join([repo_dir, os.environ.get("PYTHONPATH", "")]))
+    results = {"budget_bytes": args.out_of_core_budget_mb * 2**20}
+    for factor in args.out_of_core_row_factors:
+        n_rows = args.rows * factor
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            shutil.copytree(os.path.join(repo_dir, "data_schema"), os.path.join(tmp_dir, "data_schema"))
+            completed = subprocess.run([sys.executable, "-c", OUT_OF_CORE_SCRIPT, str(n_rows), str(args.missing_rate), str(args.seed)],
+                                       capture_output=True, text=True, check=True, cwd=tmp_dir, env=env)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        result["rows_per_second"] = n_rows / result["seconds"]
+        results[f"rows_{n_rows}"] = result
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__
+    }
+
+
+def flatten(results, prefix=""):
+    """
+    The comparable numbers of a result file, keyed by their path
+    """
+    values = {}
+    for name, value in results.items():
+        key = f"{prefix}{name}"
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{key}."))
+        elif name in ("rows_per_second", "seconds_best", "p50", "p95", "p99") and value is not None:
+            values[key] = value
+    return values
+
+
+def compare(baseline, current):
+    baseline_values = flatten(baseline["results"])
+    current_values = flatten(current["results"])
+    print(f"\n{'metric':<55} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key, value in current_values.items():
+        if key not in baseline_values:
+            continue
+        base = baseline_values[key]
+        ## higher is better for throughput, lower for timings
+        ratio = value / base if key.endswith("rows_per_second") else base / value
+        print(f"{key:<55} {base:>12.4g} {value:>12.4g} {ratio:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--missing-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--benchmarks", nargs="+", default=BENCHMARKS, choices=BENCHMARKS)
+    parser.add_argument("--max-knn-rows", type=int, default=20000, help="the knn imputer is quadratic, larger data is cut to this")
+    parser.add_argument("--max-search-rows", type=int, default=50000)
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--predict-batch", type=int, default=10000)
+    parser.add_argument("--latency-calls", type=int, default=200)
+    parser.add_argument("--compiled-batch-sizes", type=int, nargs="+", default=[1, 64, 10000])
+    parser.add_argument("--pool-rows", type=int, default=2000, help="distinct rows the repeated traffic and train sets are drawn from")
+    parser.add_argument("--sync-files", type=int, default=50)
+    parser.add_argument("--sync-file-rows", type=int, default=10000)
+    parser.add_argument("--sync-large-file-mb", type=int, default=32)
+    parser.add_argument("--out-of-core-budget-mb", type=int, default=16)
+    parser.add_argument("--out-of-core-row-factors", type=int, nargs="+", default=[1, 4, 16], help="row counts as multiples of --rows")
+    parser.add_argument("--import-budget", type=float, default=1.5, help="seconds allowed to import the serving app")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, help="result file of an earlier run to compare with")
+    args = parser.parse_args()
+
+    generator = SyntheticGenerator(missing_rate=args.missing_rate, seed=args.seed)
+    dataframe = generator.dataframe(args.rows)
+
+    results = {}
+    for name in args.benchmarks:
+        start = time.perf_counter()
+        results[name] = globals()[f"bench_{name}"](args, generator, dataframe)
+        print(f"{name} done in {time.perf_counter() - start:.1f} seconds", file=sys.stderr)
+
+    output = {
+        "environment": environment(),
+        "parameters": vars(args),
+        "results": results
+    }
+    with open(args.output, "w") as file_obj:
+        json.dump(output, file_obj, indent=2)
+    print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as file_obj:
+            compare(json.load(file_obj), output)
+
+    serving_import = results.get("serving_import")
+    if serving_import is not None and not serving_import["within_budget"]:
+        sys.exit(f"Serving app import is over budget: {serving_import['seconds_best']:.2f} seconds "
+                 f"of {serving_import['budget_seconds']:.2f}, eager modules: {serving_import['eager_modules']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+'''
+Synthetic phishing shaped data generated from data_schema/schema.yaml, of any size.
+
+Every integer column of the schema takes the values seen for it in the reference csv with
+the same frequencies, or -1, 0 and 1 uniformly without a reference. The target column is
+a noisy linear function of the features, so the models have something to learn. The data
+is generated in chunks from a fixed seed, so the same arguments give the same rows.
+
+usage: python -m benchmarks.synthetic --rows 1000000 --missing-rate 0.01 --output synthetic.parquet
+'''
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from networksecurity_project.constant.training_pipeline import SCHEMA_FILE_PATH, TARGET_COLUMN
+from networksecurity_project.utils.main_utils.utils import get_schema_dtypes
+
+REFERENCE_FILE_PATH = os.path.join("Network_Data", "phisingData.csv")
+CHUNK_ROWS = 1_000_000
+
+
+class SyntheticGenerator:
+    def __init__(self, schema_file_path=SCHEMA_FILE_PATH, reference_file_path=REFERENCE_FILE_PATH,
+                 missing_rate=0.0, seed=0):
+        self.columns = list(get_schema_dtypes(schema_file_path))
+        self.features = [column for column in self.columns if column != TARGET_COLUMN]
+        self.missing_rate = missing_rate
+        self.seed = seed
+
+        reference = None
+        if reference_file_path and os.path.exists(reference_file_path):
+            reference = pd.read_csv(reference_file_path)
+        self.domains = {}
+        for column in self.columns:
+            if reference is not None and column in reference.columns:
+                frequencies = reference[column].value_counts(normalize=True).sort_index()
+                self.domains[column] = (frequencies.index.to_numpy(dtype=np.int8), frequencies.to_numpy())
+            else:
+                self.domains[column] = (np.array([-1, 0, 1], dtype=np.int8), np.full(3, 1 / 3))
+
+        rng = np.random.default_rng(seed)
+        self.weights = rng.normal(size=len(self.features))
+        target_values, target_p = self.domains[TARGET_COLUMN]
+        self.target_values = np.sort(target_values)
+        ## the threshold keeps the share of the first target value of the reference
+        self.target_share = float(target_p[np.argsort(target_values)][0])
+
+    def _chunk(self, chunk_index, n_rows):
+        rng = np.random.default_rng([self.seed, chunk_index])
+        X = np.empty((n_rows, len(self.features)), dtype=np.int8)
+        for position, column in enumerate(self.features):
+            values, p = self.domains[column]
+            X[:, position] = rng.choice(values, size=n_rows, p=p)
+
+        score = X @ self.weights + rng.normal(scale=1.0, size=n_rows)
+        threshold = np.quantile(score, self.target_share) if n_rows else 0.0
+        y = np.where(score <= threshold, self.target_values[0], self.target_values[-1])
+
+        dataframe = pd.DataFrame(X.astype(np.int64), columns=self.features)
+        if self.missing_rate > 0:
+            missing = rng.random(X.shape) < self.missing_rate
+            dataframe = dataframe.mask(missing)
+        dataframe[TARGET_COLUMN] = y.astype(np.int64)
+        return dataframe[self.columns]
+
+    def iter_chunks(self, n_rows, chunk_rows=CHUNK_ROWS):
+        for chunk_index, start in enumerate(range(0, n_rows, chunk_rows)):
+            yield self._chunk(chunk_index, min(chunk_rows, n_rows - start))
+
+    def dataframe(self, n_rows):
+        """
+        The rows as read from a csv: int64 columns, float64 with nan for columns with missing values
+        """
+        chunks = list(self.iter_chunks(n_rows))
+        if not chunks:
+            return self._chunk(0, 0)
+        return pd.concat(chunks, ignore_index=True)
+
+    def documents(self, n_rows):
+        """
+        The rows as mongodb documents, with "na" for the missing values like the source data
+        """
+        dataframe = self.dataframe(n_rows).astype(object)
+        return dataframe.where(dataframe.notna(), "na").to_dict("records")
+
+
+def write_dataset(generator, n_rows, output_file_path):
+    if output_file_path.endswith(".parquet"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for chunk in generator.iter_chunks(n_rows):
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_file_path, table.schema)
+                writer.write_table(table.cast(writer.schema))
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        for chunk_index, chunk in enumerate(generator.iter_chunks(n_rows)):
+            chunk.to_csv(output_file_path, index=False, mode="w" if chunk_index == 0 else "a", header=chunk_index == 0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--missing-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reference", default=REFERENCE_FILE_PATH, help="csv the value frequencies are taken from")
+    parser.add_argument("--output", default="synthetic.csv", help=".csv or .parquet")
+    args = parser.parse_args()
+
+    generator = SyntheticGenerator(reference_file_path=args.reference, missing_rate=args.missing_rate, seed=args.seed)
+    start = time.perf_counter()
+    write_dataset(generator, args.rows, args.output)
+    print(f"Wrote {args.rows} rows to {args.output} in {time.perf_counter() - start:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import sys
+import json
+import argparse
+from dataclasses import asdict
+
+from networksecurity_project.entity.config_entity import TrainingPipelineConfig, ArtifactStoreConfig
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.pipeline.artifact_store import ArtifactStore
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Deduplicate, retain and garbage collect the run folders under Artifacts")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="runs, blobs and disk usage")
+
+    intern = commands.add_parser("intern", help="link the files of runs to the artifact store, all runs by default")
+    intern.add_argument("runs", nargs="*")
+
+    promote = commands.add_parser("promote", help="keep a run whatever the retention policy")
+    promote.add_argument("run")
+    promote.add_argument("--note", default=None)
+
+    demote = commands.add_parser("demote", help="hand a promoted run back to the retention policy")
+    demote.add_argument("run")
+
+    gc = commands.add_parser("gc", help="delete the runs that are not retained and the blobs no run uses")
+    gc.add_argument("--keep-last", type=int, default=None, help="number of latest runs to keep, from the config by default")
+    gc.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    return parser.parse_args()
+
+
+if __name__=="__main__":
+    try:
+        args = parse_args()
+        artifact_store = ArtifactStore(ArtifactStoreConfig(TrainingPipelineConfig()))
+        if args.command == "status":
+            print(json.dumps(artifact_store.status(), indent=2))
+        elif args.command == "intern":
+            for run in args.runs or artifact_store.runs():
+                print(json.dumps(asdict(artifact_store.intern_run(artifact_store.run_dir(run)))))
+        elif args.command == "promote":
+            artifact_store.promote(args.run, note=args.note)
+        elif args.command == "demote":
+            artifact_store.demote(args.run)
+        elif args.command == "gc":
+            print(json.dumps(asdict(artifact_store.collect_garbage(keep_last=args.keep_last, dry_run=args.dry_run)), indent=2))
+    except Exception as e:
+        raise NetworkSecurityException(e,sys)
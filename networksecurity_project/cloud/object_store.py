@@ -0,0 +1,239 @@
+import os, sys
+import shutil
+import functools
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from networksecurity_project.exception.exception import NetworkSecurityException
+
+
+class ObjectNotFoundError(Exception):
+    pass
+
+
+def parse_url(url: str) -> Tuple[str, str]:
+    """
+    Bucket and key prefix of an s3://bucket/prefix url, the prefix without the trailing slash
+    """
+    if not url.startswith("s3://"):
+        raise ValueError(f"Not an s3 url: {url}")
+    bucket, _, prefix = url[len("s3://"):].partition("/")
+    if not bucket:
+        raise ValueError(f"No bucket in the url: {url}")
+    return bucket, prefix.strip("/")
+
+
+def join_key(*parts: str) -> str:
+    return "/".join(part.strip("/") for part in parts if part and part.strip("/"))
+
+
+@functools.lru_cache(maxsize=None)
+def get_s3_client():
+    """
+    Imports boto3 and creates the client on first use, the credentials come from the usual aws
+    environment variables, config files or instance role
+    """
+    import boto3
+    return boto3.client("s3")
+
+
+class S3ObjectStore:
+    """
+    Object store calls of the sync engine on Amazon S3, or any S3 compatible endpoint of the client
+    """
+    def __init__(self, client=None):
+        try:
+            self._client = client
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_s3_client()
+        return self._client
+
+    @staticmethod
+    def _is_not_found(error) -> bool:
+        code = str(getattr(error, "response", {}).get("Error", {}).get("Code", ""))
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def head(self, bucket: str, key: str) -> Optional[int]:
+        """
+        Size of the object, None if it does not exist
+        """
+        try:
+            return self.client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        except Exception as e:
+            if self._is_not_found(e):
+                return None
+            raise
+
+    def get_bytes(self, bucket: str, key: str) -> bytes:
+        try:
+            return self.client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        except Exception as e:
+            if self._is_not_found(e):
+                raise ObjectNotFoundError(f"s3://{bucket}/{key}") from e
+            raise
+
+    def put_bytes(self, bucket: str, key: str, data: bytes, metadata: Dict[str, str] = None):
+        self.client.put_object(Bucket=bucket, Key=key, Body=data, Metadata=metadata or {})
+
+    def put_file(self, bucket: str, key: str, file_path: str, metadata: Dict[str, str] = None):
+        with open(file_path, "rb") as file_obj:
+            self.client.put_object(Bucket=bucket, Key=key, Body=file_obj, Metadata=metadata or {})
+
+    def copy(self, bucket: str, source_key: str, key: str):
+        """
+        Server side copy, the managed copy of boto3 switches to a multipart copy for large objects
+        """
+        try:
+            self.client.copy({"Bucket": bucket, "Key": source_key}, bucket, key)
+        except Exception as e:
+            if self._is_not_found(e):
+                raise ObjectNotFoundError(f"s3://{bucket}/{source_key}") from e
+            raise
+
+    def download_file(self, bucket: str, key: str, file_path: str):
+        try:
+            self.client.download_file(bucket, key, file_path)
+        except Exception as e:
+            if self._is_not_found(e):
+                raise ObjectNotFoundError(f"s3://{bucket}/{key}") from e
+            raise
+
+    def list(self, bucket: str, prefix: str) -> Dict[str, int]:
+        """
+        Size of every object under the prefix, by key
+        """
+        objects = {}
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=join_key(prefix) + "/" if prefix else ""):
+            for item in page.get("Contents", []):
+                objects[item["Key"]] = item["Size"]
+        return objects
+
+    def create_multipart_upload(self, bucket: str, key: str, metadata: Dict[str, str] = None) -> str:
+        return self.client.create_multipart_upload(Bucket=bucket, Key=key, Metadata=metadata or {})["UploadId"]
+
+    def upload_part(self, bucket: str, key: str, upload_id: str, part_number: int, data: bytes) -> str:
+        return self.client.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=data)["ETag"]
+
+    def complete_multipart_upload(self, bucket: str, key: str, upload_id: str, parts: List[Tuple[int, str]]):
+        self.client.complete_multipart_upload(
+            Bucket=bucket, Key=key, UploadId=upload_id,
+            MultipartUpload={"Parts": [{"PartNumber": number, "ETag": etag} for number, etag in sorted(parts)]}
+        )
+
+    def abort_multipart_upload(self, bucket: str, key: str, upload_id: str):
+        self.client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+
+
+class LocalObjectStore:
+    """
+    The same object store calls on a local folder, one sub folder per bucket, for tests and
+    for offline runs. Objects are written to a temporary file first and moved in place, so a
+    reader never sees a partial object.
+    """
+    MULTIPART_DIR_NAME = ".multipart"
+
+    def __init__(self, root_dir: str):
+        try:
+            self.root_dir = root_dir
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def _path(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root_dir, bucket, *key.split("/"))
+
+    def _write(self, path: str, write):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as file_obj:
+                write(file_obj)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def head(self, bucket: str, key: str) -> Optional[int]:
+        path = self._path(bucket, key)
+        return os.path.getsize(path) if os.path.isfile(path) else None
+
+    def get_bytes(self, bucket: str, key: str) -> bytes:
+        path = self._path(bucket, key)
+        if not os.path.isfile(path):
+            raise ObjectNotFoundError(f"s3://{bucket}/{key}")
+        with open(path, "rb") as file_obj:
+            return file_obj.read()
+
+    def put_bytes(self, bucket: str, key: str, data: bytes, metadata: Dict[str, str] = None):
+        self._write(self._path(bucket, key), lambda file_obj: file_obj.write(data))
+
+    def put_file(self, bucket: str, key: str, file_path: str, metadata: Dict[str, str] = None):
+        def write(file_obj):
+            with open(file_path, "rb") as source:
+                shutil.copyfileobj(source, file_obj, 1024 * 1024)
+        self._write(self._path(bucket, key), write)
+
+    def copy(self, bucket: str, source_key: str, key: str):
+        source_path = self._path(bucket, source_key)
+        if not os.path.isfile(source_path):
+            raise ObjectNotFoundError(f"s3://{bucket}/{source_key}")
+        self.put_file(bucket, key, source_path)
+
+    def download_file(self, bucket: str, key: str, file_path: str):
+        path = self._path(bucket, key)
+        if not os.path.isfile(path):
+            raise ObjectNotFoundError(f"s3://{bucket}/{key}")
+        shutil.copyfile(path, file_path)
+
+    def list(self, bucket: str, prefix: str) -> Dict[str, int]:
+        objects = {}
+        prefix_dir = self._path(bucket, prefix) if prefix else os.path.join(self.root_dir, bucket)
+        for dir_path, dir_names, file_names in os.walk(prefix_dir):
+            dir_names[:] = [name for name in dir_names if name != self.MULTIPART_DIR_NAME]
+            for file_name in file_names:
+                if file_name.endswith(".tmp"):
+                    continue
+                path = os.path.join(dir_path, file_name)
+                key = os.path.relpath(path, os.path.join(self.root_dir, bucket)).replace(os.sep, "/")
+                objects[key] = os.path.getsize(path)
+        return objects
+
+    def _parts_dir(self, bucket: str, upload_id: str) -> str:
+        return os.path.join(self.root_dir, bucket, self.MULTIPART_DIR_NAME, upload_id)
+
+    def create_multipart_upload(self, bucket: str, key: str, metadata: Dict[str, str] = None) -> str:
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._parts_dir(bucket, upload_id))
+        return upload_id
+
+    def upload_part(self, bucket: str, key: str, upload_id: str, part_number: int, data: bytes) -> str:
+        part_path = os.path.join(self._parts_dir(bucket, upload_id), f"{part_number:05d}")
+        self._write(part_path, lambda file_obj: file_obj.write(data))
+        return f"{upload_id}-{part_number}"
+
+    def complete_multipart_upload(self, bucket: str, key: str, upload_id: str, parts: List[Tuple[int, str]]):
+        parts_dir = self._parts_dir(bucket, upload_id)
+
+        def write(file_obj):
+            for number, _ in sorted(parts):
+                with open(os.path.join(parts_dir, f"{number:05d}"), "rb") as part:
+                    shutil.copyfileobj(part, file_obj, 1024 * 1024)
+        self._write(self._path(bucket, key), write)
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    def abort_multipart_upload(self, bucket: str, key: str, upload_id: str):
+        shutil.rmtree(self._parts_dir(bucket, upload_id), ignore_errors=True)
+
+
+def get_object_store(local_root: str = None):
+    """
+    The local folder store when a root folder is given, S3 otherwise
+    """
+    if local_root:
+        return LocalObjectStore(local_root)
+    return S3ObjectStore()
@@ -1,10 +1,359 @@
-import os
+import os, sys, time
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+from networksecurity_project.cloud.object_store import ObjectNotFoundError, get_object_store, join_key, parse_url
+from networksecurity_project.constant.training_pipeline import (
+    SYNC_MAX_WORKERS,
+    SYNC_MULTIPART_THRESHOLD_BYTES,
+    SYNC_MULTIPART_PART_SIZE_BYTES,
+    SYNC_MANIFEST_FILE_NAME,
+    SYNC_LATEST_FILE_NAME
+)
+from networksecurity_project.entity.artifact_entity import SyncArtifact
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.logging.logger import logging
+
+## S3 limits of a multipart upload
+MAX_PARTS = 10000
+MIN_PART_SIZE = 5 * 1024 * 1024
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file_obj:
+        for block in iter(lambda: file_obj.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FileHashCache:
+    """
+    sha256 of local files by path, size and modification time, so a file that did not change
+    since the last sync is not read again
+    """
+    def __init__(self, file_path: str = None):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._hashes = {}
+        if file_path is not None and os.path.exists(file_path):
+            try:
+                with open(file_path, "r") as file_obj:
+                    self._hashes = json.load(file_obj)
+            except ValueError:
+                logging.info(f"Ignoring the unreadable hash cache {file_path}")
+
+    def sha256(self, file_path: str) -> str:
+        stat = os.stat(file_path)
+        path = os.path.abspath(file_path)
+        entry = self._hashes.get(path)
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["sha256"]
+        digest = file_sha256(file_path)
+        with self._lock:
+            self._hashes[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+        return digest
+
+    def remember(self, file_path: str, digest: str):
+        """
+        Records the sha256 of a file whose content is known, e.g. a file replaced by a link to a blob of that content
+        """
+        stat = os.stat(file_path)
+        with self._lock:
+            self._hashes[os.path.abspath(file_path)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+
+    def save(self):
+        if self.file_path is None:
+            return
+        ## files that are gone are dropped
+        with self._lock:
+            hashes = {path: entry for path, entry in self._hashes.items() if os.path.exists(path)}
+        os.makedirs(os.path.dirname(self.file_path) or ".", exist_ok=True)
+        tmp_file_path = f"{self.file_path}.{os.getpid()}.tmp"
+        with open(tmp_file_path, "w") as file_obj:
+            json.dump(hashes, file_obj)
+        os.replace(tmp_file_path, self.file_path)
+
 
 class S3Sync:
-    def sync_folder_to_s3(self,folder,aws_bucket_url):
-        command = f"aws s3 sync {folder} {aws_bucket_url}"
-        os.system(command)
+    """
+    In process sync of a local folder with an object store prefix.
+
+    Every synced prefix gets a manifest with the sha256 and size of its files, and the parent
+    prefix points to the manifest of its latest sync. A new sync skips the files the manifest of
+    the destination already lists with the same content, and has the store copy the files whose
+    content an earlier run already uploaded, so a new timestamped prefix only uploads what changed.
+    The rest is uploaded with at most max_workers requests in flight, large files as multipart
+    uploads whose parts go in parallel. Any failure aborts the sync and is raised, the manifest is
+    only written once every file is in place.
+    """
+    def __init__(self, store=None, max_workers: int = SYNC_MAX_WORKERS,
+                 multipart_threshold: int = SYNC_MULTIPART_THRESHOLD_BYTES,
+                 part_size: int = SYNC_MULTIPART_PART_SIZE_BYTES, hash_cache_file_path: str = None):
+        try:
+            self.store = store if store is not None else get_object_store(os.getenv("SYNC_LOCAL_ROOT"))
+            self.max_workers = max_workers
+            self.multipart_threshold = multipart_threshold
+            self.part_size = part_size
+            self.hash_cache_file_path = hash_cache_file_path
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def _read_json(self, bucket: str, key: str):
+        try:
+            return json.loads(self.store.get_bytes(bucket, key))
+        except ObjectNotFoundError:
+            return None
+
+    def _write_json(self, bucket: str, key: str, content: dict):
+        self.store.put_bytes(bucket, key, json.dumps(content, indent=2).encode("utf-8"))
+
+    def _run(self, tasks, on_done=None):
+        """
+        Runs the tasks with at most max_workers * 2 in flight, the first error cancels the
+        tasks that did not start and is raised once the running ones finished
+        """
+        tasks = iter(tasks)
+        in_flight = set()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="s3-sync")
+        try:
+            error = None
+            while True:
+                while error is None and len(in_flight) < self.max_workers * 2:
+                    task = next(tasks, None)
+                    if task is None:
+                        break
+                    in_flight.add(executor.submit(*task))
+                if not in_flight:
+                    break
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is not None:
+                        error = error or future.exception()
+                    elif on_done is not None:
+                        on_done(future.result())
+            if error is not None:
+                raise error
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _local_files(self, folder: str, hash_cache: FileHashCache) -> dict:
+        paths = []
+        for dir_path, _, file_names in os.walk(folder):
+            for file_name in sorted(file_names):
+                paths.append(os.path.join(dir_path, file_name))
+
+        def describe(path):
+            relative_path = os.path.relpath(path, folder).replace(os.sep, "/")
+            return relative_path, {"sha256": hash_cache.sha256(path), "size": os.path.getsize(path), "path": path}
+
+        ## the files are hashed in parallel too, hashlib releases the gil on large blocks
+        files = []
+        self._run(((describe, path) for path in paths), on_done=files.append)
+        return dict(sorted(files))
+
+    def _part_size(self, size: int) -> int:
+        part_size = max(self.part_size, MIN_PART_SIZE)
+        return max(part_size, -(-size // MAX_PARTS))
+
+    def _upload_part(self, bucket: str, key: str, upload_id: str, part_number: int, file_path: str, offset: int, length: int):
+        with open(file_path, "rb") as file_obj:
+            file_obj.seek(offset)
+            data = file_obj.read(length)
+        return key, part_number, self.store.upload_part(bucket, key, upload_id, part_number, data)
+
+    def _put(self, bucket: str, key: str, entry: dict):
+        self.store.put_file(bucket, key, entry["path"], metadata={"sha256": entry["sha256"]})
+        return key, "transferred", entry["size"]
+
+    def _put_multipart_sequential(self, bucket: str, key: str, entry: dict):
+        upload_id = self.store.create_multipart_upload(bucket, key, metadata={"sha256": entry["sha256"]})
+        try:
+            part_size = self._part_size(entry["size"])
+            parts = [self._upload_part(bucket, key, upload_id, number, entry["path"], offset, part_size)[1:]
+                     for number, offset in enumerate(range(0, entry["size"], part_size), start=1)]
+            self.store.complete_multipart_upload(bucket, key, upload_id, parts)
+        except Exception:
+            self.store.abort_multipart_upload(bucket, key, upload_id)
+            raise
+        return key, "transferred", entry["size"]
+
+    def _copy(self, bucket: str, source_key: str, key: str, entry: dict):
+        try:
+            self.store.copy(bucket, source_key, key)
+            return key, "copied", entry["size"]
+        except ObjectNotFoundError:
+            ## the earlier object is gone, e.g. expired by a lifecycle rule
+            logging.info(f"s3://{bucket}/{source_key} is gone, uploading {entry['path']} instead")
+            if entry["size"] >= self.multipart_threshold:
+                return self._put_multipart_sequential(bucket, key, entry)
+            return self._put(bucket, key, entry)
+
+    @staticmethod
+    def _known_contents(prefix: str, manifest: dict) -> dict:
+        """
+        Key of the object of every content hash of a synced prefix
+        """
+        if not manifest:
+            return {}
+        return {entry["sha256"]: join_key(prefix, relative_path) for relative_path, entry in manifest["files"].items()}
+
+    def sync_folder_to_s3(self, folder: str, aws_bucket_url: str) -> SyncArtifact:
+        try:
+            start = time.perf_counter()
+            ## a missing folder would be synced as an empty one and become the latest sync of the parent
+            if not os.path.isdir(folder):
+                raise NotADirectoryError(f"Sync source {folder} is not a folder")
+            bucket, prefix = parse_url(aws_bucket_url)
+            parent_prefix = prefix.rpartition("/")[0]
+            hash_cache = FileHashCache(self.hash_cache_file_path)
+            files = self._local_files(folder, hash_cache)
+
+            ## the destination manifest for a sync of the same prefix again, the latest sync of the parent for a new one
+            manifest = self._read_json(bucket, join_key(prefix, SYNC_MANIFEST_FILE_NAME))
+            latest = self._read_json(bucket, join_key(parent_prefix, SYNC_LATEST_FILE_NAME))
+            previous_prefix = latest["prefix"] if latest and latest.get("prefix") != prefix else None
+            previous_manifest = self._read_json(bucket, join_key(previous_prefix, SYNC_MANIFEST_FILE_NAME)) if previous_prefix else None
+            known = {**S3Sync._known_contents(previous_prefix, previous_manifest), **S3Sync._known_contents(prefix, manifest)}
+
+            stats = {"transferred": [0, 0], "copied": [0, 0], "skipped": [0, 0], "multipart": 0}
+            tasks, duplicates, multipart_files = [], [], []
+            first_keys = {}
+            for relative_path, entry in files.items():
+                key = join_key(prefix, relative_path)
+                if manifest and manifest["files"].get(relative_path, {}).get("sha256") == entry["sha256"]:
+                    stats["skipped"][0] += 1
+                    stats["skipped"][1] += entry["size"]
+                elif entry["sha256"] in known:
+                    tasks.append((self._copy, bucket, known[entry["sha256"]], key, entry))
+                elif entry["sha256"] in first_keys:
+                    ## the same content twice in the folder is uploaded once and copied
+                    duplicates.append((self._copy, bucket, first_keys[entry["sha256"]], key, entry))
+                elif entry["size"] >= self.multipart_threshold:
+                    multipart_files.append((key, entry))
+                    first_keys[entry["sha256"]] = key
+                else:
+                    tasks.append((self._put, bucket, key, entry))
+                    first_keys[entry["sha256"]] = key
+
+            uploads = {}
+            for key, entry in multipart_files:
+                part_size = self._part_size(entry["size"])
+                upload_id = self.store.create_multipart_upload(bucket, key, metadata={"sha256": entry["sha256"]})
+                uploads[key] = {"upload_id": upload_id, "entry": entry, "parts": []}
+                tasks.extend((self._upload_part, bucket, key, upload_id, number, entry["path"], offset, part_size)
+                             for number, offset in enumerate(range(0, entry["size"], part_size), start=1))
+
+            def on_done(result):
+                if result[1] in ("transferred", "copied"):
+                    key, action, size = result
+                    stats[action][0] += 1
+                    stats[action][1] += size
+                else:
+                    key, part_number, etag = result
+                    uploads[key]["parts"].append((part_number, etag))
+
+            try:
+                self._run(tasks, on_done)
+                for key, upload in uploads.items():
+                    self.store.complete_multipart_upload(bucket, key, upload["upload_id"], upload["parts"])
+                    upload["completed"] = True
+                    stats["transferred"][0] += 1
+                    stats["transferred"][1] += upload["entry"]["size"]
+                    stats["multipart"] += 1
+            finally:
+                for key, upload in uploads.items():
+                    if not upload.get("completed"):
+                        self.store.abort_multipart_upload(bucket, key, upload["upload_id"])
+            self._run(duplicates, on_done)
+
+            ## the manifest goes last, a sync that failed half way is not taken as a source of copies
+            manifest_key = join_key(prefix, SYNC_MANIFEST_FILE_NAME)
+            self._write_json(bucket, manifest_key, {
+                "created_at": datetime.now().isoformat(),
+                "source": os.path.abspath(folder),
+                "files": {relative_path: {"sha256": entry["sha256"], "size": entry["size"]} for relative_path, entry in files.items()}
+            })
+            self._write_json(bucket, join_key(parent_prefix, SYNC_LATEST_FILE_NAME), {"prefix": prefix})
+            hash_cache.save()
+
+            return self._artifact(folder, aws_bucket_url, f"s3://{bucket}/{manifest_key}", len(files), stats, start)
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def _download(self, bucket: str, key: str, file_path: str, size: int):
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        tmp_file_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            self.store.download_file(bucket, key, tmp_file_path)
+            os.replace(tmp_file_path, file_path)
+        finally:
+            if os.path.exists(tmp_file_path):
+                os.remove(tmp_file_path)
+        return key, "transferred", size
+
+    def sync_folder_from_s3(self, folder: str, aws_bucket_url: str) -> SyncArtifact:
+        """
+        Downloads the files of the prefix that are missing or differ locally, compared by sha256
+        with the manifest of the prefix, or by size for a prefix that has no manifest
+        """
+        try:
+            start = time.perf_counter()
+            bucket, prefix = parse_url(aws_bucket_url)
+            hash_cache = FileHashCache(self.hash_cache_file_path)
+            manifest = self._read_json(bucket, join_key(prefix, SYNC_MANIFEST_FILE_NAME))
+            if manifest is not None:
+                remote = {relative_path: entry for relative_path, entry in manifest["files"].items()}
+            else:
+                remote = {key[len(prefix):].lstrip("/"): {"size": size}
+                          for key, size in self.store.list(bucket, prefix).items()
+                          if not key.endswith(SYNC_MANIFEST_FILE_NAME)}
+
+            stats = {"transferred": [0, 0], "copied": [0, 0], "skipped": [0, 0], "multipart": 0}
+            tasks = []
+            for relative_path, entry in remote.items():
+                file_path = os.path.join(folder, *relative_path.split("/"))
+                if os.path.isfile(file_path) and os.path.getsize(file_path) == entry["size"] and \
+                        ("sha256" not in entry or hash_cache.sha256(file_path) == entry["sha256"]):
+                    stats["skipped"][0] += 1
+                    stats["skipped"][1] += entry["size"]
+                    continue
+                tasks.append((self._download, bucket, join_key(prefix, relative_path), file_path, entry["size"]))
+
+            def on_done(result):
+                stats["transferred"][0] += 1
+                stats["transferred"][1] += result[2]
+
+            self._run(tasks, on_done)
+            hash_cache.save()
+            return self._artifact(aws_bucket_url, folder, None, len(remote), stats, start)
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
 
-    def sync_folder_from_s3(self, folder, aws_bucket_url):
-        command=f"aws s3 sync {aws_bucket_url} {folder}"
-        os.system(command)
\ No newline at end of file
+    @staticmethod
+    def _artifact(source: str, destination: str, manifest_url, n_files: int, stats: dict, start: float) -> SyncArtifact:
+        elapsed = time.perf_counter() - start
+        bytes_transferred = stats["transferred"][1]
+        artifact = SyncArtifact(
+            source=source,
+            destination=destination,
+            manifest_url=manifest_url,
+            files=n_files,
+            files_transferred=stats["transferred"][0],
+            files_copied=stats["copied"][0],
+            files_skipped=stats["skipped"][0],
+            bytes_transferred=bytes_transferred,
+            bytes_copied=stats["copied"][1],
+            bytes_skipped=stats["skipped"][1],
+            multipart_uploads=stats["multipart"],
+            elapsed_seconds=elapsed,
+            bytes_per_second=bytes_transferred / elapsed if elapsed else 0.0
+        )
+        logging.info(f"Synced {source} to {destination}: {artifact.files_transferred} files and {bytes_transferred} bytes "
+                     f"transferred at {artifact.bytes_per_second / 2**20:.1f} MiB/s, {artifact.files_copied} copied "
+                     f"and {artifact.files_skipped} unchanged in {elapsed:.2f} seconds")
+        return artifact
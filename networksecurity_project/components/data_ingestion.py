@@ -14,6 +14,16 @@ import pymongo
 from typing import List 
 from sklearn.model_selection import train_test_split
 import numpy as np
+import glob
+from datetime import datetime
+from bson import ObjectId
+
+from networksecurity_project.utils.main_utils.utils import read_yaml_file, write_yaml_file
+from networksecurity_project.utils.main_utils.utils import get_schema_dtypes, save_dataframe, load_dataframe, to_compact_dataframe
+from networksecurity_project.utils.main_utils.utils import from_compact_dataframe
+from networksecurity_project.utils.main_utils.shards import ShardWriter, chunk_rows_for_budget, hash_split, iter_dataframe_chunks
+from networksecurity_project.constant.training_pipeline import SCHEMA_FILE_PATH
+from networksecurity_project.pipeline.bulk_loader import in_progress_load_floor
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -25,26 +35,193 @@ class DataIngestion:
     def __init__(self, data_ingestion_config:DataIngestionConfig):
         try:
             self.data_ingestion_config=data_ingestion_config
+            self._schema_dtypes = get_schema_dtypes(SCHEMA_FILE_PATH)
         except Exception as e:
             raise NetworkSecurityException(e,sys) # type: ignore
     
 
+    def get_collection(self):
+        database_name = self.data_ingestion_config.database_name
+        collectio_name = self.data_ingestion_config.collection_name
+        self.mongo_client = pymongo.MongoClient(MONGO_DB_URL) 
+        return self.mongo_client[database_name][collectio_name]
+
+    def source_fingerprint(self) -> dict:
+        """
+        Cheap summary of the collection contents: document count and last _id
+        """
+        try:
+            collection = self.get_collection()
+            last_document = collection.find_one({}, projection={"_id": 1}, sort=[("_id", pymongo.DESCENDING)])
+            return {
+                "namespace": f"{self.data_ingestion_config.database_name}.{self.data_ingestion_config.collection_name}",
+                "count": collection.estimated_document_count(),
+                "last_id": None if last_document is None else str(last_document["_id"])
+            }
+        except Exception as e:
+            raise NetworkSecurityException(e,sys) # type: ignore
+
+    def read_watermark(self):
+        """
+        Returns the _id of the last document in the local snapshot, or None for an empty snapshot
+        """
+        try:
+            if not os.path.exists(self.data_ingestion_config.watermark_file_path):
+                return None
+            watermark = read_yaml_file(self.data_ingestion_config.watermark_file_path)
+            return ObjectId(watermark["last_id"]) if watermark.get("last_id") else None
+        except Exception as e:
+            raise NetworkSecurityException(e,sys) # type: ignore
+
+    def read_pull_target(self):
+        """
+        Returns the _id a pull of new documents that did not finish was going up to, or None
+        """
+        if not os.path.exists(self.data_ingestion_config.watermark_file_path):
+            return None
+        watermark = read_yaml_file(self.data_ingestion_config.watermark_file_path)
+        return ObjectId(watermark["pull_target_id"]) if watermark.get("pull_target_id") else None
+
+    def write_watermark(self, last_id, pull_target=None):
+        content = {"last_id": None if last_id is None else str(last_id), "updated_at": datetime.now().isoformat()}
+        if pull_target is not None:
+            content["pull_target_id"] = str(pull_target)
+        write_yaml_file(self.data_ingestion_config.watermark_file_path, content=content)
+
+    def start_pull(self, collection, watermark):
+        """
+        Cursor over the documents inserted after the watermark and the _id the pull goes up to, no cursor
+        when there are none. The target is recorded before any part is written, and the retry of a pull that
+        stopped half way reuses it, so it reads the same documents into parts of the same names.
+        """
+        target = self.read_pull_target()
+        if target is not None:
+            logging.info(f"Retrying the pull of the documents after watermark {watermark} up to {target}")
+            return self.new_documents_cursor(collection, watermark, target)
+        cursor, target = self.new_documents_cursor(collection, watermark)
+        if cursor is not None:
+            self.write_watermark(watermark, pull_target=target)
+        return cursor, target
+
+    def iter_cursor_batches(self, cursor, batch_size: int = None):
+        """
+        The documents of the cursor as dataframes of batch_size rows, so only one batch of documents is held
+        as python dicts. In compact mode every batch is turned into int8 columns right away.
+        """
+        batch = []
+        batch_size = batch_size or self.data_ingestion_config.find_batch_size
+        for document in cursor:
+            batch.append(document)
+            if len(batch) == batch_size:
+                yield self.prepare_batch(batch)
+                batch = []
+        if batch:
+            yield self.prepare_batch(batch)
+
+    def read_cursor_dataframe(self, cursor) -> pd.DataFrame:
+        """
+        Build the dataframe batch by batch
+        """
+        try:
+            frames = list(self.iter_cursor_batches(cursor))
+            if not frames:
+                return pd.DataFrame()
+            return pd.concat(frames, ignore_index=True)
+        except Exception as e:
+            raise NetworkSecurityException(e,sys) # type: ignore
+
+    def prepare_batch(self, documents: List[dict]) -> pd.DataFrame:
+        df = pd.DataFrame(documents)
+        df.replace({"na":np.nan}, inplace=True)
+        if self.data_ingestion_config.compact_dtype:
+            df = to_compact_dataframe(df, self._schema_dtypes)
+        return df
+
+    def fetch_new_documents(self, collection, watermark):
+        """
+        Read the documents inserted after the watermark, without their _id.
+        The upper bound is fixed first so documents inserted while reading are left for the next run.
+        This relies on _id being an ObjectId that grows with the insertion order.
+
+        Returns:
+            dataframe of the new documents and the new watermark
+        """
+        try:
+            cursor, new_watermark = self.start_pull(collection, watermark)
+            if cursor is None:
+                return pd.DataFrame(), watermark
+            return self.read_cursor_dataframe(cursor), new_watermark
+        except Exception as e:
+            raise NetworkSecurityException(e,sys) # type: ignore
+
+    def new_documents_cursor(self, collection, watermark, new_watermark=None):
+        """
+        Cursor over the documents inserted after the watermark and the new watermark, no cursor when there are none.
+        A given new watermark is used as the upper bound as it is.
+        """
+        if new_watermark is not None:
+            id_filter = {"_id": {"$lte": new_watermark}} if watermark is None else {"_id": {"$gt": watermark, "$lte": new_watermark}}
+            return collection.find(id_filter, projection={"_id": 0}, batch_size=self.data_ingestion_config.find_batch_size), new_watermark
+
+        id_filter = {} if watermark is None else {"_id": {"$gt": watermark}}
+        ## rows of a bulk load that has not completed can still appear below the ids already visible,
+        ## the watermark stays below the lowest id of such loads until they complete
+        load_floor = in_progress_load_floor(collection)
+        if load_floor is not None:
+            logging.info(f"A bulk load into {collection.full_name} is in progress, reading the documents before {load_floor}")
+            id_filter = {"_id": dict(id_filter.get("_id", {}), **{"$lt": load_floor})}
+        last_document = collection.find_one(id_filter, projection={"_id": 1}, sort=[("_id", pymongo.DESCENDING)])
+        if last_document is None:
+            return None, watermark
+
+        new_watermark = last_document["_id"]
+        id_filter = {"_id": {"$lte": new_watermark}} if watermark is None else {"_id": {"$gt": watermark, "$lte": new_watermark}}
+        return collection.find(id_filter, projection={"_id": 0}, batch_size=self.data_ingestion_config.find_batch_size), new_watermark
+
+    def decode_part(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        """
+        A snapshot part in the dtypes of the current mode. Parts are decoded one by one by their stored
+        dtypes, as the compact mode may have been switched since they were written: without it the int8
+        columns of older parts get their missing value sentinel back as nan.
+        """
+        if self.data_ingestion_config.compact_dtype:
+            return to_compact_dataframe(dataframe, self._schema_dtypes)
+        return from_compact_dataframe(dataframe)
+
+    def read_snapshot(self) -> pd.DataFrame:
+        snapshot_dir = self.data_ingestion_config.snapshot_dir
+        part_file_paths = sorted(glob.glob(os.path.join(snapshot_dir, "part_*.parquet")))
+        if not part_file_paths:
+            return pd.DataFrame()
+        return pd.concat([self.decode_part(load_dataframe(part_file_path)) for part_file_path in part_file_paths], ignore_index=True)
+
     def export_collection_dataframe(self):
         """
-        Read data from mongodb
+        Read data from mongodb.
+        In incremental mode only the documents added since the last run are read, appended to the
+        local snapshot as a new part file, and the whole snapshot is returned.
         """
         try:
-            database_name = self.data_ingestion_config.database_name
-            collectio_name = self.data_ingestion_config.collection_name
-            self.mongo_client = pymongo.MongoClient(MONGO_DB_URL) 
-            collection=self.mongo_client[database_name][collectio_name]
+            collection = self.get_collection()
 
+            if not self.data_ingestion_config.incremental:
+                df = self.read_cursor_dataframe(collection.find(projection={"_id": 0}, batch_size=self.data_ingestion_config.find_batch_size))
+            else:
+                watermark = self.read_watermark()
+                new_df, new_watermark = self.fetch_new_documents(collection, watermark)
+                logging.info(f"Read {len(new_df)} new documents from mongodb after watermark {watermark}")
 
-            df = pd.DataFrame(list(collection.find()))
-            if "_id" in df.columns.to_list():
-                df= df.drop(columns=["_id"], axis=1)
+                if len(new_df):
+                    os.makedirs(self.data_ingestion_config.snapshot_dir, exist_ok=True)
+                    #the part is named after the recorded target of the pull, a retry after a failure overwrites the same part
+                    part_file_path = os.path.join(self.data_ingestion_config.snapshot_dir, f"part_{new_watermark}.parquet")
+                    save_dataframe(part_file_path, new_df, schema_dtypes=self._schema_dtypes)
+                ## moved even when a retried pull came back empty, e.g. its documents were deleted since,
+                ## so the recorded target is cleared and the next run does not retry the same range
+                if new_watermark != watermark:
+                    self.write_watermark(new_watermark)
+                df = self.read_snapshot()
 
-            df.replace({"na":np.nan}, inplace=True)
             return df 
         except Exception as e:
             raise NetworkSecurityException(e,sys)    # type: ignore       
@@ -55,7 +232,8 @@ class DataIngestion:
             #creating folder
             dir_path = os.path.dirname(feature_store_file_path)
             os.makedirs(dir_path, exist_ok=True)
-            dataframe.to_csv(feature_store_file_path, index=False, header=True)
+            save_dataframe(feature_store_file_path, dataframe, schema_dtypes=self._schema_dtypes,
+                           export_csv=self.data_ingestion_config.export_csv)
             return dataframe
         except Exception as e:
             raise NetworkSecurityException(e,sys) # type: ignore
@@ -77,9 +255,11 @@ class DataIngestion:
 
             logging.info(f"Exporting train and test file path.")
 
-            train_set.to_csv(self.data_ingestion_config.training_file_path, index=False, header=True)
+            save_dataframe(self.data_ingestion_config.training_file_path, train_set, schema_dtypes=self._schema_dtypes,
+                           export_csv=self.data_ingestion_config.export_csv)
 
-            test_set.to_csv(self.data_ingestion_config.testing_file_path, index=False, header=True)
+            save_dataframe(self.data_ingestion_config.testing_file_path, test_set, schema_dtypes=self._schema_dtypes,
+                           export_csv=self.data_ingestion_config.export_csv)
 
             logging.info(f"Exported train and test file path.")
 
@@ -87,8 +267,65 @@ class DataIngestion:
             raise NetworkSecurityException(e,sys) # type: ignore
         
 
+    def iter_out_of_core_source(self, chunk_rows: int):
+        """
+        The collection as dataframes of at most chunk_rows rows. In incremental mode the new documents are
+        appended to the snapshot as parts of chunk_rows rows first, then the snapshot is read part by part.
+        """
+        collection = self.get_collection()
+        batch_size = min(self.data_ingestion_config.find_batch_size, chunk_rows)
+        if not self.data_ingestion_config.incremental:
+            yield from self.iter_cursor_batches(collection.find(projection={"_id": 0}, batch_size=batch_size), batch_size)
+            return
+
+        watermark = self.read_watermark()
+        cursor, new_watermark = self.start_pull(collection, watermark)
+        if cursor is not None:
+            #parts of one pull share the prefix of its recorded target _id, the parts an earlier try of the
+            #same pull left are removed first, as the retry may split the documents into fewer parts
+            prefix = f"part_{new_watermark}_"
+            for part_file_path in glob.glob(os.path.join(self.data_ingestion_config.snapshot_dir, f"{prefix}*.parquet")):
+                os.remove(part_file_path)
+            part_writer = ShardWriter(self.data_ingestion_config.snapshot_dir, chunk_rows, schema_dtypes=self._schema_dtypes,
+                                      prefix=prefix)
+            for dataframe in self.iter_cursor_batches(cursor, batch_size):
+                part_writer.write(dataframe)
+            part_writer.close()
+            logging.info(f"Appended {part_writer.rows} new documents after watermark {watermark} to the snapshot")
+            self.write_watermark(new_watermark)
+
+        for part_file_path in sorted(glob.glob(os.path.join(self.data_ingestion_config.snapshot_dir, "part_*.parquet"))):
+            for dataframe in iter_dataframe_chunks(part_file_path, chunk_rows):
+                yield self.decode_part(dataframe)
+
+    def initiate_out_of_core_ingestion(self) -> DataIngestionArtifact:
+        """
+        Streams the collection into folders of parquet shards of the train and test sets. Every row goes to
+        the test set by its hash, so no step holds more than a chunk whatever the size of the collection.
+        The whole collection is not written to the feature store in this mode, the snapshot parts hold it.
+        """
+        try:
+            chunk_rows = chunk_rows_for_budget(self.data_ingestion_config.memory_budget_bytes, len(self._schema_dtypes),
+                                               self.data_ingestion_config.bytes_per_cell)
+            train_writer = ShardWriter(self.data_ingestion_config.train_shard_dir, chunk_rows, schema_dtypes=self._schema_dtypes)
+            test_writer = ShardWriter(self.data_ingestion_config.test_shard_dir, chunk_rows, schema_dtypes=self._schema_dtypes)
+            for dataframe in self.iter_out_of_core_source(chunk_rows):
+                test_rows = hash_split(dataframe, self.data_ingestion_config.train_test_split_ratio)
+                train_writer.write(dataframe[~test_rows])
+                test_writer.write(dataframe[test_rows])
+            train_writer.close()
+            test_writer.close()
+            logging.info(f"Streamed {train_writer.rows} train and {test_writer.rows} test rows into shards of {chunk_rows} rows")
+
+            return DataIngestionArtifact(trained_file_path=self.data_ingestion_config.train_shard_dir,
+                                         test_file_path=self.data_ingestion_config.test_shard_dir)
+        except Exception as e:
+            raise NetworkSecurityException(e,sys) # type: ignore
+
     def initiate_data_ingestion(self):
         try:
+            if self.data_ingestion_config.out_of_core:
+                return self.initiate_out_of_core_ingestion()
             dataframe = self.export_collection_dataframe()
             dataframe = self.export_data_into_feature_store(dataframe)
             self.split_data_as_train_test(dataframe)  
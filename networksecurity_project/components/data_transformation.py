@@ -12,7 +12,17 @@ from networksecurity_project.entity.config_entity import DataTransformationConfi
 from networksecurity_project.exception.exception import NetworkSecurityException
 
 from networksecurity_project.logging.logger import logging
-from networksecurity_project.utils.main_utils.utils import save_numpy_array_data, save_object
+from networksecurity_project.utils.main_utils.utils import save_numpy_array_data, save_object, load_dataframe, write_yaml_file
+from networksecurity_project.utils.main_utils.utils import deduplicate_rows
+from networksecurity_project.utils.main_utils.utils import from_compact_dataframe, to_compact_array
+from networksecurity_project.utils.main_utils.shards import (
+    NumpyArrayWriter,
+    chunk_rows_for_budget,
+    iter_dataframe_chunks,
+    reservoir_sample,
+    shard_schema
+)
+from networksecurity_project.utils.ml_utils.model.inference_preprocessor import KNNImputerIndex
 
 class DataTransformation:
     def __init__(self, data_validation_artifact: DataValidationArtifact,\
@@ -26,10 +36,11 @@ class DataTransformation:
     @staticmethod
     def read_data(file_path) -> pd.DataFrame:
         try:
-            return pd.read_csv(file_path)
+            return load_dataframe(file_path)
         except Exception as e:
             raise NetworkSecurityException(e,sys)
 
+    @classmethod
     def get_data_transformer_object(cls) -> Pipeline:
         """
         Initiates a KNNimputer object with the parameters specified in the training_pipeline.py file 
@@ -57,9 +68,75 @@ class DataTransformation:
         except Exception as e:
             raise NetworkSecurityException(e,sys ) # type: ignore
 
+    def save_preprocessor(self, preprocessor_object):
+        save_object(self.data_transformation_config.transformed_object_file_path, preprocessor_object)
+
+        #save this also in the final_model folder
+        save_object(self.data_transformation_config.final_preprocessor_file_path, preprocessor_object)
+
+        #precomputed neighbor index used by the serving path, kept next to the preprocessor
+        imputer_index = KNNImputerIndex.from_preprocessor(preprocessor_object)
+        if imputer_index is not None:
+            save_object(self.data_transformation_config.transformed_index_object_file_path, imputer_index)
+            save_object(self.data_transformation_config.final_preprocessor_index_file_path, imputer_index)
+
+    def initiate_out_of_core_transformation(self) -> DataTransformationArtifact:
+        """
+        Fits the imputer on a uniform sample of the train rows, then imputes the train and test shards chunk by
+        chunk into .npy files that are written block after block. The distances of a chunk to the sample are
+        computed in blocks of the sklearn working memory, a quarter of the budget. The train set is not
+        deduplicated in this mode, that needs all of its rows at once.
+        """
+        try:
+            from sklearn import config_context
+
+            config = self.data_transformation_config
+            train_path = self.data_validation_artifact.valid_train_file_path
+            test_path = self.data_validation_artifact.valid_test_file_path
+            n_train, columns = shard_schema(train_path)
+            n_test, _ = shard_schema(test_path)
+            feature_columns = [column for column in columns if column != TARGET_COLUMN]
+            chunk_rows = chunk_rows_for_budget(config.memory_budget_bytes, len(columns), config.bytes_per_cell)
+
+            def chunks(file_path):
+                for dataframe in iter_dataframe_chunks(file_path, chunk_rows):
+                    yield from_compact_dataframe(dataframe[feature_columns]), dataframe[TARGET_COLUMN].replace(-1, 0)
+
+            sample = reservoir_sample((features.to_numpy(dtype=np.float64) for features, _ in chunks(train_path)),
+                                      config.imputer_sample_rows)
+            preprocessor_object = self.get_data_transformer_object().fit(pd.DataFrame(sample, columns=feature_columns))
+            logging.info(f"Fitted the imputer on {len(sample)} of {n_train} train rows, imputing chunks of {chunk_rows} rows")
+
+            with config_context(working_memory=max(1, config.memory_budget_bytes // 4 // 2**20)):
+                for file_path, n_rows, features_file_path, labels_file_path in [
+                        (train_path, n_train, config.transformed_train_file_path, config.transformed_train_labels_file_path),
+                        (test_path, n_test, config.transformed_test_file_path, config.transformed_test_labels_file_path)]:
+                    features_writer = NumpyArrayWriter(features_file_path, (n_rows, len(feature_columns)), config.out_of_core_dtype)
+                    labels_writer = NumpyArrayWriter(labels_file_path, (n_rows,), np.int8)
+                    for features, labels in chunks(file_path):
+                        features_writer.write(preprocessor_object.transform(features))
+                        labels_writer.write(labels.to_numpy())
+                    features_writer.close()
+                    labels_writer.close()
+
+            self.save_preprocessor(preprocessor_object)
+
+            return DataTransformationArtifact(
+                 transformed_object_file_path=config.transformed_object_file_path,
+                 transformed_train_file_path=config.transformed_train_file_path,
+                 transformed_test_file_path=config.transformed_test_file_path,
+                 transformed_index_object_file_path=config.transformed_index_object_file_path,
+                 transformed_train_labels_file_path=config.transformed_train_labels_file_path,
+                 transformed_test_labels_file_path=config.transformed_test_labels_file_path
+            )
+        except Exception as e:
+            raise NetworkSecurityException(e,sys) # type: ignore
+
     def initiate_data_transformation(self) -> DataTransformationArtifact:
         logging.info("Entered initiate_data_transformation method of DataTransformtion class ")
         try:
+            if self.data_transformation_config.out_of_core:
+                return self.initiate_out_of_core_transformation()
             logging.info("Starting data transformation")
             train_df = DataTransformation.read_data(self.data_validation_artifact.valid_train_file_path)
             test_df = DataTransformation.read_data(self.data_validation_artifact.valid_test_file_path)
@@ -75,28 +152,57 @@ class DataTransformation:
             target_feature_test_df = target_feature_test_df.replace(-1,0)
 
 
+            #compact int8 columns become float with nan here, the input the imputer is fitted on
+            input_feature_train_df = from_compact_dataframe(input_feature_train_df)
+            input_feature_test_df = from_compact_dataframe(input_feature_test_df)
+
             preprocessor= self.get_data_transformer_object()
 
             preprocessor_object = preprocessor.fit(input_feature_train_df)
             transformed_input_train_feature = preprocessor_object.transform(input_feature_train_df)
             transformed_input_test_feature = preprocessor_object.transform(input_feature_test_df)
 
-            train_arr = np.c_[transformed_input_train_feature, np.array(target_feature_train_df)]
-            test_arr = np.c_[transformed_input_test_feature, np.array(target_feature_test_df)]
-
-            #save numpy array data
-            save_numpy_array_data(self.data_transformation_config.transformed_train_file_path, array=train_arr)
-            save_numpy_array_data(self.data_transformation_config.transformed_test_file_path, array= test_arr)
-            save_object(self.data_transformation_config.transformed_object_file_path, preprocessor_object)
-
-            #save this also in the final_model folder
-            save_object("final_model/preprocessor.pkl", preprocessor_object)
+            #save numpy array data, features and labels go to separate files so they can be memory mapped without a combined copy
+            train_labels = target_feature_train_df.to_numpy(dtype=np.float64)
+            test_labels = target_feature_test_df.to_numpy(dtype=np.float64)
+            if self.data_transformation_config.compact_dtype:
+                #stored as int8 when that is lossless, imputed fractions keep the float arrays
+                transformed_input_train_feature = to_compact_array(transformed_input_train_feature)
+                transformed_input_test_feature = to_compact_array(transformed_input_test_feature)
+                train_labels = to_compact_array(train_labels)
+                test_labels = to_compact_array(test_labels)
+            logging.info(f"Transformed arrays stored as {transformed_input_train_feature.dtype} and {transformed_input_test_feature.dtype}")
+
+            #identical train rows are kept once, with their counts as sample weights
+            train_weights_file_path, deduplication_report_file_path = None, None
+            if self.data_transformation_config.deduplicate_train:
+                transformed_input_train_feature, train_labels, train_weights, deduplication_report = deduplicate_rows(
+                    transformed_input_train_feature, train_labels)
+                train_weights_file_path = self.data_transformation_config.transformed_train_weights_file_path
+                deduplication_report_file_path = self.data_transformation_config.deduplication_report_file_path
+                save_numpy_array_data(train_weights_file_path, array=train_weights)
+                write_yaml_file(deduplication_report_file_path, content=deduplication_report, replace=True)
+                logging.info(f"Deduplicated the train set: {deduplication_report}")
+                if deduplication_report["conflicting_feature_rows"]:
+                    logging.info(f"{deduplication_report['conflicting_feature_rows']} train feature rows appear with both labels, "
+                                 f"{deduplication_report['conflicting_rows']} rows in all")
+
+            save_numpy_array_data(self.data_transformation_config.transformed_train_file_path, array=transformed_input_train_feature)
+            save_numpy_array_data(self.data_transformation_config.transformed_train_labels_file_path, array=train_labels)
+            save_numpy_array_data(self.data_transformation_config.transformed_test_file_path, array= transformed_input_test_feature)
+            save_numpy_array_data(self.data_transformation_config.transformed_test_labels_file_path, array=test_labels)
+            self.save_preprocessor(preprocessor_object)
             
             #preparing artifacts
             data_transformation_artifact= DataTransformationArtifact(
                  transformed_object_file_path=self.data_transformation_config.transformed_object_file_path,
                  transformed_train_file_path=self.data_transformation_config.transformed_train_file_path,
-                 transformed_test_file_path= self.data_transformation_config.transformed_test_file_path
+                 transformed_test_file_path= self.data_transformation_config.transformed_test_file_path,
+                 transformed_index_object_file_path=self.data_transformation_config.transformed_index_object_file_path,
+                 transformed_train_labels_file_path=self.data_transformation_config.transformed_train_labels_file_path,
+                 transformed_test_labels_file_path=self.data_transformation_config.transformed_test_labels_file_path,
+                 transformed_train_weights_file_path=train_weights_file_path,
+                 deduplication_report_file_path=deduplication_report_file_path
             )
 
             return data_transformation_artifact
@@ -6,12 +6,14 @@ from networksecurity_project.entity.config_entity import DataValidationConfig
 from networksecurity_project.exception.exception import NetworkSecurityException
 from networksecurity_project.logging.logger import logging
 
-from networksecurity_project.constant.training_pipeline import SCHEMA_FILE_PATH
-from scipy.stats import ks_2samp
+from networksecurity_project.constant.training_pipeline import SCHEMA_FILE_PATH, TARGET_COLUMN
 import pandas as pd
 import os,sys 
 
 from networksecurity_project.utils.main_utils.utils import read_yaml_file, write_yaml_file
+from networksecurity_project.utils.main_utils.utils import get_schema_dtypes, save_dataframe, load_dataframe
+from networksecurity_project.utils.main_utils.shards import chunk_rows_for_budget, iter_dataframe_chunks
+from networksecurity_project.monitoring.drift import DriftHistogram, drift_statistics
 
 class DataValidation:
     def __init__(self, data_ingestion_artifact: DataIngestionArtifact, data_validation_config: DataValidationConfig):
@@ -20,6 +22,7 @@ class DataValidation:
             self.data_ingestion_artifact=data_ingestion_artifact
             self.data_validation_config= data_validation_config
             self._schema_config = read_yaml_file(SCHEMA_FILE_PATH)
+            self._schema_dtypes = get_schema_dtypes(SCHEMA_FILE_PATH)
         except Exception as e:
             raise NetworkSecurityException(e, sys) # type: ignore
     
@@ -27,7 +30,7 @@ class DataValidation:
     @staticmethod
     def read_data(file_path)-> pd.DataFrame:
         try:
-            return pd.read_csv(file_path)
+            return load_dataframe(file_path)
         except Exception as e:
             raise NetworkSecurityException(e,sys ) # type: ignore
         
@@ -43,36 +46,125 @@ class DataValidation:
         except Exception as e:
             raise NetworkSecurityException(e,sys) # type: ignore
 
-    def detect_dataset_drift(self, base_df, current_df, threshold=0.05)-> bool:
+    def detect_dataset_drift(self, base_df, current_df, threshold=None)-> bool:
+        """
+        Compares the value counts of every column, the counts of both frames are built in one pass each
+        so the cost does not grow with a sort per column. Compact int8 frames are counted as they are.
+        """
         try:
+            return self.detect_histogram_drift(DriftHistogram.from_dataframe(base_df),
+                                               DriftHistogram.from_dataframe(current_df[base_df.columns]), threshold=threshold)
+        except Exception as e:
+            raise NetworkSecurityException(e,sys) # type: ignore
+
+    def detect_histogram_drift(self, base: DriftHistogram, current: DriftHistogram, threshold=None) -> bool:
+        """
+        Writes the drift report of the value counts of two datasets, True when no column drifted
+        """
+        try:
+            threshold = self.data_validation_config.drift_threshold if threshold is None else threshold
+            statistics = drift_statistics(base, current)
+            p_values = statistics[f"{self.data_validation_config.drift_test}_p_value"]
+
             status = True
             report ={}
-            for column in base_df.columns:
-                d1=base_df[column]
-                d2=current_df[column]
-                is_same_dist=ks_2samp(d1,d2)
-                if threshold<=is_same_dist.pvalue:
-                    is_found=False
-                else:
-                    is_found=True
+            for column in base.columns:
+                p_value = float(p_values[str(column)])
+                is_found = not threshold <= p_value
+                if is_found:
                     status = False
                 report.update({
                     column:{
-                        "p_value":float(is_same_dist.pvalue),
+                        "p_value":p_value,
                         "drift_status":is_found
                     }
                 })
+            logging.info(f"Largest population stability index: {statistics['psi'].max():.4f}")
             drift_report_file_path = self.data_validation_config.drift_report_file_path
 
             dir_path = os.path.dirname(drift_report_file_path)
             os.makedirs(dir_path,exist_ok=True)
             write_yaml_file(file_path=drift_report_file_path, content=report)
+            return status
+        except Exception as e:
+            raise NetworkSecurityException(e,sys) # type: ignore
+
+
+    def save_drift_baseline(self, dataframe: pd.DataFrame) -> None:
+        """
+        Saves the value counts of the train features, in the run folder and in the final model folder
+        where the serving app picks them up with the model.
+        """
+        try:
+            features = dataframe.drop(columns=[TARGET_COLUMN], errors="ignore")
+            self.save_drift_baseline_histogram(DriftHistogram.from_dataframe(features), rows=len(features))
         except Exception as e:
             raise NetworkSecurityException(e,sys) # type: ignore
 
+    def save_drift_baseline_histogram(self, histogram: DriftHistogram, rows: int) -> None:
+        try:
+            baseline = histogram.to_dict()
+            write_yaml_file(file_path=self.data_validation_config.drift_baseline_file_path, content=baseline)
+            write_yaml_file(file_path=self.data_validation_config.final_drift_baseline_file_path, content=baseline)
+            logging.info(f"Saved the drift baseline of {rows} rows and {len(baseline)} features")
+        except Exception as e:
+            raise NetworkSecurityException(e,sys) # type: ignore
+
+    def initiate_out_of_core_validation(self) -> DataValidationArtifact:
+        """
+        Validates the train and test shards chunk by chunk: the columns are checked and the value counts of
+        the drift test are built in one streaming pass over each set. The shards are not copied, the
+        artifact points to the ingested ones as in the in memory mode.
+        """
+        try:
+            chunk_rows = chunk_rows_for_budget(self.data_validation_config.memory_budget_bytes, len(self._schema_config),
+                                               self.data_validation_config.bytes_per_cell)
+            shard_sets = {"train": self.data_ingestion_artifact.trained_file_path,
+                          "test": self.data_ingestion_artifact.test_file_path}
+            histograms, rows, columns = {}, {}, None
+            for name, file_path in shard_sets.items():
+                histogram, rows[name] = None, 0
+                for dataframe in iter_dataframe_chunks(file_path, chunk_rows):
+                    if histogram is None:
+                        if not self.validate_number_of_columns(dataframe=dataframe):
+                            logging.info(f"The {name} shards do not contain all columns")
+                        ## the test set is counted over the columns of the train set
+                        columns = columns or list(dataframe.columns)
+                        histogram = DriftHistogram.from_dataframe(dataframe[columns])
+                    else:
+                        histogram = histogram.update(dataframe)
+                    rows[name] += len(dataframe)
+                histograms[name] = histogram
+
+            ## an empty set has nothing to compare or to take as the baseline, e.g. the collection was empty
+            empty_sets = [name for name in shard_sets if rows[name] == 0]
+            if empty_sets:
+                error_message = "Data validation failed, no rows in the " + \
+                    " and ".join(f"{name} shards {shard_sets[name]}" for name in empty_sets)
+                write_yaml_file(self.data_validation_config.drift_report_file_path,
+                                content={"validation_error": error_message, "rows": rows})
+                raise ValueError(error_message)
+
+            status = self.detect_histogram_drift(histograms["train"], histograms["test"])
+            features = [column for column in histograms["train"].columns if column != TARGET_COLUMN]
+            self.save_drift_baseline_histogram(histograms["train"].select(features), rows=rows["train"])
+
+            return DataValidationArtifact(
+                validation_status=status,
+                valid_train_file_path=self.data_ingestion_artifact.trained_file_path,
+                valid_test_file_path=self.data_ingestion_artifact.test_file_path,
+                invalid_test_file_path=None,
+                invalid_train_file_path=None,
+                drift_report_file_path=self.data_validation_config.drift_report_file_path,
+                drift_baseline_file_path=self.data_validation_config.drift_baseline_file_path
+            )
+        except Exception as e:
+            raise NetworkSecurityException(e,sys) # type: ignore
 
     def initiate_data_validation(self) -> DataValidationArtifact:
         try:
+            if self.data_validation_config.out_of_core:
+                return self.initiate_out_of_core_validation()
             train_file_path = self.data_ingestion_artifact.trained_file_path
             test_file_path = self.data_ingestion_artifact.test_file_path
 
@@ -90,12 +182,15 @@ class DataValidation:
              
             ## lets check datadrift
             status = self.detect_dataset_drift(base_df=train_dataframe,current_df=test_dataframe)
+            self.save_drift_baseline(train_dataframe)
             dir_path=os.path.dirname(self.data_validation_config.valid_train_file_path)
             os.makedirs(dir_path, exist_ok=True)
 
-            train_dataframe.to_csv(self.data_validation_config.valid_train_file_path, index=False, header= True)
+            save_dataframe(self.data_validation_config.valid_train_file_path, train_dataframe, schema_dtypes=self._schema_dtypes,
+                           export_csv=self.data_validation_config.export_csv)
 
-            test_dataframe.to_csv(self.data_validation_config.valid_test_file_path, index=False, header= True)
+            save_dataframe(self.data_validation_config.valid_test_file_path, test_dataframe, schema_dtypes=self._schema_dtypes,
+                           export_csv=self.data_validation_config.export_csv)
 
             data_validation_artifact= DataValidationArtifact(
                 validation_status=status,
@@ -103,7 +198,8 @@ class DataValidation:
                 valid_test_file_path=self.data_ingestion_artifact.test_file_path,
                 invalid_test_file_path=None,
                 invalid_train_file_path=None,
-                drift_report_file_path=self.data_validation_config.drift_report_file_path
+                drift_report_file_path=self.data_validation_config.drift_report_file_path,
+                drift_baseline_file_path=self.data_validation_config.drift_baseline_file_path
             )
 
             return data_validation_artifact
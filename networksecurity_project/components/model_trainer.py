@@ -1,52 +1,187 @@
-import os, sys
+import os, sys, time
+import numpy as np
 
 from networksecurity_project.exception.exception import NetworkSecurityException
 from networksecurity_project.logging.logger import logging
 
-from networksecurity_project.entity.artifact_entity import DataTransformationArtifact, ModelTrainerArtifact
+from networksecurity_project.entity.artifact_entity import DataTransformationArtifact, ModelTrainerArtifact, ClassificationMetricArtifact
 from networksecurity_project.entity.config_entity import ModelTrainerConfig
 
 from networksecurity_project.utils.ml_utils.model.estimator import NetworkModel
-from networksecurity_project.utils.main_utils.utils import save_object, load_object
+from networksecurity_project.utils.ml_utils.model.compiled_ensemble import CompiledTreeEnsemble
+from networksecurity_project.utils.ml_utils.model.registry import publish_model_version
+from networksecurity_project.utils.main_utils.utils import save_object, load_object, write_yaml_file
 from networksecurity_project.utils.main_utils.utils import load_numpy_array_data, evaluate_models
-from networksecurity_project.utils.ml_utils.metric.classification_metric import get_classification_score
+from networksecurity_project.utils.main_utils.utils import reset_peak_rss, get_peak_rss_bytes
+from networksecurity_project.utils.main_utils.shards import chunk_rows_for_budget
+from networksecurity_project.utils.ml_utils.metric.classification_metric import get_classification_score, StreamingClassificationScore
+from networksecurity_project.utils.ml_utils.model.search_cache import SearchResultCache
+from networksecurity_project.monitoring.tracking import ExperimentTracker
 
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.metrics import r2_score
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.ensemble import (
     AdaBoostClassifier,
     GradientBoostingClassifier,
-    RandomForestClassifier
+    RandomForestClassifier,
+    HistGradientBoostingClassifier
 )
-import mlflow 
-import dagshub
-dagshub.init(repo_owner='lolguy699', repo_name='End-to-End-Network-Security-Mlops-Pipeline-Project', mlflow=True)
-
-mlflow.set_tracking_uri("https://dagshub.com/lolguy699/End-to-End-Network-Security-Mlops-Pipeline-Project.mlflow")
 
 class ModelTrainer:
-    def __init__(self, model_trainer_config: ModelTrainerConfig, data_transformation_artifact: DataTransformationArtifact):
+    def __init__(self, model_trainer_config: ModelTrainerConfig, data_transformation_artifact: DataTransformationArtifact,
+                 telemetry=None):
         try:
             self.model_trainer_config = model_trainer_config
             self.data_transformation_artifact = data_transformation_artifact
+            #optional PipelineTelemetry of the run, gets the measurements of every candidate model
+            self.telemetry = telemetry
+            self.tracker = ExperimentTracker(
+                spool_dir=model_trainer_config.tracking_spool_dir,
+                tracking_uri=model_trainer_config.tracking_uri,
+                repo_owner=model_trainer_config.dagshub_repo_owner,
+                repo_name=model_trainer_config.dagshub_repo_name,
+                experiment_name=model_trainer_config.tracking_experiment_name,
+                enabled=model_trainer_config.tracking_enabled
+            )
         except Exception as e:
             raise NetworkSecurityException(e, sys) # type: ignore
         
-    def track_mlflow(self,best_model, classificationmetric, model_name):
-        with mlflow.start_run():
-            f1_score= classificationmetric.f1_score
-            precision_score = classificationmetric.precision_score
-            recall_score = classificationmetric.recall_score
+    def track_metrics(self, classificationmetric, prefix: str):
+        self.tracker.log_metrics({
+            f"{prefix}_f1_score": classificationmetric.f1_score,
+            f"{prefix}_precision_score": classificationmetric.precision_score,
+            f"{prefix}_recall_score": classificationmetric.recall_score
+        })
+
+
+    def export_compiled_model(self, model):
+        """
+        Saves the flat node arrays of a tree ensemble next to the final model, and removes the arrays
+        of an earlier model when this one can not be compiled
+        """
+        compiled_model_file_path = self.model_trainer_config.final_compiled_model_file_path
+        compiled_model = CompiledTreeEnsemble.from_model(model)
+        if compiled_model is None:
+            if os.path.exists(compiled_model_file_path):
+                os.remove(compiled_model_file_path)
+            return
+        compiled_model.save(compiled_model_file_path)
+
+    def save_model(self, best_model, best_model_name: str):
+        preprocessor = load_object(file_path= self.data_transformation_artifact.transformed_object_file_path)
+
+        model_dir_path = os.path.dirname(self.model_trainer_config.trained_model_file_path)
+        os.makedirs(model_dir_path, exist_ok=True)
+
+        Network_Model=NetworkModel(preprocessor=preprocessor, model=best_model)
 
-            mlflow.log_metric("f1_score", f1_score)
-            mlflow.log_metric("precision_score", precision_score)
-            mlflow.log_metric("recall_score", recall_score)
-            mlflow.sklearn.log_model(best_model, artifact_path=model_name)
+        save_object(self.model_trainer_config.trained_model_file_path, obj=Network_Model)
+
+        #save the best model in another folder
+        save_object(self.model_trainer_config.final_model_file_path, best_model)
+        self.export_compiled_model(best_model)
+
+        #the staged preprocessor, drift baseline and model of this run are published together, the manifest last
+        publish_model_version(self.model_trainer_config.staged_model_dir, self.model_trainer_config.model_dir,
+                              version=self.model_trainer_config.model_version,
+                              manifest={"model_name": best_model_name,
+                                        "trained_model_file_path": self.model_trainer_config.trained_model_file_path},
+                              keep_versions=self.model_trainer_config.keep_model_versions)
+
+        ## the run is sent in the background, what is not sent within the timeout stays spooled for a later training
+        self.tracker.end_run(timeout=self.model_trainer_config.tracking_flush_timeout)
+
+    @staticmethod
+    def iter_chunks(x, y, chunk_rows: int, validation_step: int = None, validation: bool = False):
+        """
+        The rows of memory mapped arrays in chunks of chunk_rows. With a validation_step, every
+        validation_step-th row is held out: only those rows with validation, all the others without.
+        """
+        for start in range(0, len(y), chunk_rows):
+            x_chunk, y_chunk = np.asarray(x[start:start + chunk_rows]), np.asarray(y[start:start + chunk_rows])
+            if validation_step is not None:
+                held_out = np.arange(start, start + len(y_chunk)) % validation_step == 0
+                keep = held_out if validation else ~held_out
+                x_chunk, y_chunk = x_chunk[keep], y_chunk[keep]
+            yield x_chunk, y_chunk
 
+    def score_out_of_core(self, model, chunks) -> ClassificationMetricArtifact:
+        score = StreamingClassificationScore()
+        for x_chunk, y_chunk in chunks:
+            score.update(y_chunk, model.predict(x_chunk))
+        return score.result()
 
-    def train_model(self, X_train, y_train, X_test, y_test):
+    def train_model_out_of_core(self, x_train, y_train, x_test, y_test) -> ModelTrainerArtifact:
+        """
+        Trains on memory mapped arrays read in chunks of the memory budget. A logistic regression learns
+        the whole train set by partial_fit over a few epochs, a histogram gradient boosting model is fitted
+        on an evenly strided sample of one chunk, as it copies its X. The model is picked by the f1 score
+        on every validation_step-th train row, that the models do not see.
+        """
+        config = self.model_trainer_config
+        chunk_rows = chunk_rows_for_budget(config.memory_budget_bytes, x_train.shape[1] + 1, config.bytes_per_cell)
+        validation_step = max(2, round(1 / config.validation_split_ratio))
+        rng = np.random.default_rng(0)
+        models, fit_times = {}, {}
+
+        start = time.perf_counter()
+        linear_model = SGDClassifier(loss="log_loss", random_state=0)
+        for _ in range(config.out_of_core_epochs):
+            for x_chunk, y_chunk in self.iter_chunks(x_train, y_train, chunk_rows, validation_step):
+                order = rng.permutation(len(y_chunk))
+                linear_model.partial_fit(x_chunk[order], y_chunk[order], classes=np.array([0, 1]))
+        models["SGD_Logistic_Regression"], fit_times["SGD_Logistic_Regression"] = linear_model, time.perf_counter() - start
+
+        start = time.perf_counter()
+        ## a held out row of the sample is swapped for the next row, which is never held out
+        rows = np.arange(0, len(y_train), max(1, -(-len(y_train) // chunk_rows)))
+        rows = np.unique(rows + (rows % validation_step == 0))
+        rows = rows[rows < len(y_train)]
+        boosting_model = HistGradientBoostingClassifier(random_state=0).fit(np.asarray(x_train[rows]), np.asarray(y_train[rows]))
+        models["Hist_Gradient_Boosting"], fit_times["Hist_Gradient_Boosting"] = boosting_model, time.perf_counter() - start
+
+        search_report = {"rows": len(y_train), "chunk_rows": chunk_rows, "validation_step": validation_step, "candidates": {}}
+        for model_name, model in models.items():
+            start = time.perf_counter()
+            validation_metric = self.score_out_of_core(model, self.iter_chunks(x_train, y_train, chunk_rows, validation_step, validation=True))
+            search_report["candidates"][model_name] = {"fit_time_seconds": fit_times[model_name],
+                                                       "validation_f1_score": validation_metric.f1_score}
+            if self.telemetry is not None:
+                self.telemetry.add_candidate({
+                    "model": model_name,
+                    "fit_time_seconds": fit_times[model_name],
+                    "score_time_seconds": time.perf_counter() - start,
+                    "rows_in": len(y_train),
+                    "test_score": validation_metric.f1_score
+                })
+        write_yaml_file(config.model_search_report_file_path, content=search_report)
+
+        best_model_name = max(search_report["candidates"], key=lambda name: search_report["candidates"][name]["validation_f1_score"])
+        best_model = models[best_model_name]
+        logging.info(f"Out of core model search: {search_report['candidates']}, best model {best_model_name}")
+
+        self.tracker.start_run(run_name=f"{best_model_name}_{config.model_version}")
+        self.tracker.log_params({"model_name": best_model_name, "out_of_core": True, **best_model.get_params()})
+
+        classification_train_metric = self.score_out_of_core(best_model, self.iter_chunks(x_train, y_train, chunk_rows))
+        self.track_metrics(classification_train_metric, "train")
+        classification_test_metric = self.score_out_of_core(best_model, self.iter_chunks(x_test, y_test, chunk_rows))
+        self.track_metrics(classification_test_metric, "test")
+        self.tracker.log_model(best_model, best_model_name)
+        self.save_model(best_model, best_model_name)
+
+        model_trainer_artifact = ModelTrainerArtifact(trained_model_file_path=config.trained_model_file_path,
+                                                      train_metric_artifact=classification_train_metric,
+                                                      test_metric_artifact=classification_test_metric,
+                                                      peak_rss_bytes=get_peak_rss_bytes(),
+                                                      train_rows=len(y_train),
+                                                      train_weighted_rows=len(y_train))
+        logging.info(f"Model trainer artifact: {model_trainer_artifact}")
+        return model_trainer_artifact
+
+    def train_model(self, X_train, y_train, X_test, y_test, sample_weight=None):
         models={
             "Random_Forest": RandomForestClassifier(verbose=1),
             "Decision_Tree": DecisionTreeClassifier(),
@@ -80,7 +215,12 @@ class ModelTrainer:
                 'n_estimators': [8,16,32,64,128,256]
             }
         }
-        model_report:dict = evaluate_models(X_train=X_train, y_train=y_train, X_test=X_test, y_test=y_test, models=models, params=params)
+        model_report:dict = evaluate_models(X_train=X_train, y_train=y_train, X_test=X_test, y_test=y_test, models=models, params=params,
+                                            n_jobs=self.model_trainer_config.search_n_jobs,
+                                            search_report_file_path=self.model_trainer_config.model_search_report_file_path,
+                                            search_cache=SearchResultCache(self.model_trainer_config.search_cache_dir,
+                                                                           self.model_trainer_config.search_cache_max_size_bytes),
+                                            telemetry=self.telemetry, sample_weight=sample_weight)
 
         #to get the best model score from dict
         best_model_score = max(sorted(model_report.values()))
@@ -92,36 +232,33 @@ class ModelTrainer:
 
         best_model = models[best_model_name]
 
+        ## the run is queued to the tracker thread, training does not wait for the tracking server
+        self.tracker.start_run(run_name=f"{best_model_name}_{self.model_trainer_config.model_version}")
+        self.tracker.log_params({"model_name": best_model_name, **best_model.get_params()})
+
         y_train_pred= best_model.predict(X_train)
 
-        classification_train_metric=get_classification_score(y_true=y_train, y_pred=y_train_pred)
+        classification_train_metric=get_classification_score(y_true=y_train, y_pred=y_train_pred, sample_weight=sample_weight)
 
-        ## track the train metrics with mlflow
-        self.track_mlflow(best_model, classification_train_metric, best_model_name)
+        ## track the train metrics
+        self.track_metrics(classification_train_metric, "train")
 
 
         y_test_pred = best_model.predict(X_test)
         classification_test_metric = get_classification_score(y_true=y_test, y_pred=y_test_pred)
 
-        ## track the testn metrics with mlflow
-        self.track_mlflow(best_model, classification_test_metric, best_model_name)
-
-        preprocessor = load_object(file_path= self.data_transformation_artifact.transformed_object_file_path)
-
-        model_dir_path = os.path.dirname(self.model_trainer_config.trained_model_file_path)
-        os.makedirs(model_dir_path, exist_ok=True)
-
-        Network_Model=NetworkModel(preprocessor=preprocessor, model=best_model)
-
-        save_object(self.model_trainer_config.trained_model_file_path, obj=Network_Model)
-
-        #save the best model in another folder
-        save_object("final_model/model.pkl", best_model)
+        ## track the test metrics, the model is uploaded once with the run
+        self.track_metrics(classification_test_metric, "test")
+        self.tracker.log_model(best_model, best_model_name)
+        self.save_model(best_model, best_model_name)
 
         ## Model trainer Artifact
         model_trainer_artifact = ModelTrainerArtifact(trained_model_file_path=self.model_trainer_config.trained_model_file_path,
                                                       train_metric_artifact= classification_train_metric,
-                                                      test_metric_artifact=classification_test_metric)
+                                                      test_metric_artifact=classification_test_metric,
+                                                      peak_rss_bytes=get_peak_rss_bytes(),
+                                                      train_rows=len(y_train),
+                                                      train_weighted_rows=int(np.sum(sample_weight)) if sample_weight is not None else len(y_train))
         
         logging.info(f"Model trainer artifact: {model_trainer_artifact}")
 
@@ -129,21 +266,31 @@ class ModelTrainer:
 
     def initiate_model_trainer(self)-> ModelTrainerArtifact:
         try:
-            train_file_path = self.data_transformation_artifact.transformed_train_file_path
-            test_file_path = self.data_transformation_artifact.transformed_test_file_path
-
-            #loading the training and testing array
-            train_arr = load_numpy_array_data(train_file_path)
-            test_arr = load_numpy_array_data(test_file_path)
-
-            x_train, y_train, x_test, y_test = (
-                train_arr[:, :-1],
-                train_arr[:,-1],
-                test_arr[:,:-1],
-                test_arr[:,-1]
-            )
+            reset_peak_rss()
+            mmap_mode = self.model_trainer_config.mmap_mode
+            #out of core the arrays are only read in chunks, whatever the mmap mode of the config
+            if self.model_trainer_config.out_of_core:
+                mmap_mode = "r"
+
+            #memory mapping the training and testing arrays, the model search workers map the same files
+            x_train = load_numpy_array_data(self.data_transformation_artifact.transformed_train_file_path, mmap_mode=mmap_mode)
+            y_train = load_numpy_array_data(self.data_transformation_artifact.transformed_train_labels_file_path, mmap_mode=mmap_mode)
+            x_test = load_numpy_array_data(self.data_transformation_artifact.transformed_test_file_path, mmap_mode=mmap_mode)
+            y_test = load_numpy_array_data(self.data_transformation_artifact.transformed_test_labels_file_path, mmap_mode=mmap_mode)
+            #row counts of a deduplicated train set, artifacts of earlier runs have none
+            train_weights = None
+            train_weights_file_path = getattr(self.data_transformation_artifact, "transformed_train_weights_file_path", None)
+            if train_weights_file_path is not None:
+                train_weights = load_numpy_array_data(train_weights_file_path, mmap_mode=mmap_mode)
+                logging.info(f"Training on {len(train_weights)} unique rows standing for {int(np.sum(train_weights))} rows")
+
+            if self.model_trainer_config.out_of_core:
+                model_trainer_artifact = self.train_model_out_of_core(x_train, y_train, x_test, y_test)
+            else:
+                model_trainer_artifact = self.train_model(x_train,y_train, x_test, y_test, sample_weight=train_weights)
 
-            model_trainer_artifact = self.train_model(x_train,y_train, x_test, y_test)
+            model_trainer_artifact.peak_rss_bytes = get_peak_rss_bytes()
+            logging.info(f"Peak resident memory of the model trainer: {model_trainer_artifact.peak_rss_bytes / 2**20:.1f} MiB")
             return model_trainer_artifact
     
         except Exception as e:
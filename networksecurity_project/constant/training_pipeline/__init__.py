@@ -16,6 +16,19 @@ TEST_FILE_NAME: str = "test.csv"
 
 SCHEMA_FILE_PATH = os.path.join("data_schema", "schema.yaml")
 
+#dataframes are handed from stage to stage as parquet files typed from the schema,
+#csv copies are only written when the export is turned on
+DATA_FILE_FORMAT: str = "parquet"
+DATA_EXPORT_CSV: bool = False
+
+#every feature only takes the values -1, 0 and 1, so in compact mode the integer columns of the schema
+#are kept as int8 with a sentinel for the missing values, and only turned into float at the model boundary
+DATA_COMPACT_DTYPE: bool = True
+DATA_COMPACT_MISSING_VALUE: int = -128
+
+#wall time, cpu time, memory, rows and bytes of every stage, written to the run folder
+TELEMETRY_FILE_NAME: str = "telemetry.json"
+
 SAVED_MODEL_DIR =os.path.join("saved_models")
 MODEL_FILE_NAME = "model.pkl"
 
@@ -29,6 +42,11 @@ DATA_INGESTION_DIR_NAME: str= "data_ingestion"
 DATA_INGESTION_FEATURE_STORE_DIR: str= "feature_store"
 DATA_INGESTION_INGESTED_DIR: str = "ingested"
 DATA_INGESTION_TRAIN_TEST_SPLIT_RATIO: float=0.2
+#only the documents added since the last run are pulled from mongodb and merged into a local snapshot
+DATA_INGESTION_INCREMENTAL: bool = True
+DATA_INGESTION_SNAPSHOT_DIR_NAME: str = "ingestion_snapshot"
+DATA_INGESTION_WATERMARK_FILE_NAME: str = "watermark.yaml"
+DATA_INGESTION_FIND_BATCH_SIZE: int = 10000
 
 """
 Data Validation related constant start with DATA_VALIDATION VAR NAME
@@ -39,7 +57,13 @@ DATA_VALIDATION_VALID_DIR: str = "validated"
 DATA_VALIDATION_INVALID_DIR: str = "invalid"
 DATA_VALIDATION_DRIFT_REPORT_DIR: str = 'drift_report'
 DATA_VALIDATION_DRIFT_REPORT_FILE_NAME: str = "report.yaml"
+#test whose p value decides the drift of a column, "ks" (discrete KS) or "chi2", both computed from value counts
+DATA_VALIDATION_DRIFT_TEST: str = "ks"
+DATA_VALIDATION_DRIFT_THRESHOLD: float = 0.05
+#value counts of the train features, the baseline the serving app compares the live traffic with
+DATA_VALIDATION_DRIFT_BASELINE_FILE_NAME: str = "drift_baseline.yaml"
 PREPROCESSING_OBJECT_FILE_NAME = "preprocessing.pkl"
+PREPROCESSING_INDEX_OBJECT_FILE_NAME = "preprocessing_index.pkl"
 
 """
 Data Transformation related constant start with DATA_VALIDATION VAR NAME
@@ -48,6 +72,17 @@ Data Transformation related constant start with DATA_VALIDATION VAR NAME
 DATA_TRANSFORMATION_DIR_NAME: str = "data_transformation"
 DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR: str = "transformed"
 DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR: str = "transformed_object"
+#features and labels are saved as separate .npy files so the trainer can memory map each of them,
+#train.npy/test.npy hold the features only
+DATA_TRANSFORMATION_TRAIN_LABELS_FILE_NAME: str = "train_labels.npy"
+DATA_TRANSFORMATION_TEST_LABELS_FILE_NAME: str = "test_labels.npy"
+#identical (features, label) rows of the transformed train set are kept once, with the number of rows
+#they stand for in the weights file, which the model search and the final fit use as sample_weight.
+#off by default: the weighted fit is not the same fit for every model, bootstrap and subsampling draw
+#a weighted row once where they drew its copies apart, compare with benchmarks deduplicated_search first
+DATA_TRANSFORMATION_DEDUPLICATE_TRAIN: bool = False
+DATA_TRANSFORMATION_TRAIN_WEIGHTS_FILE_NAME: str = "train_weights.npy"
+DATA_TRANSFORMATION_DEDUPLICATION_REPORT_FILE_NAME: str = "deduplication_report.yaml"
 
 #knn imputer class which is to rplace nan values
 DATA_TRANSFORMATION_IMPUTER_PARAMS: dict = {
@@ -65,6 +100,163 @@ MODEL_TRAINER_TRAINED_MODEL_DIR: str = "trained_model"
 MODEL_TRAINER_TRAINED_MODEL_NAME: str = "model.pkl"
 MODEL_TRAINER_EXPECTED_SCORE: float = 0.6
 MODEL_TRAINER_OVER_FITTING_UNDER_FITTING_THRESHOLD: float = 0.05 
+#worker processes of the parallel model search, -1 uses all the cores
+MODEL_TRAINER_SEARCH_N_JOBS: int = -1
+MODEL_TRAINER_MMAP_MODE: str = "r"
+MODEL_TRAINER_SEARCH_REPORT_FILE_NAME: str = "model_search_report.yaml"
+#fold scores of the model search are memoized across runs in this folder under the artifact dir
+MODEL_TRAINER_SEARCH_CACHE_DIR_NAME: str = "model_search_cache"
+MODEL_TRAINER_SEARCH_CACHE_MAX_SIZE_BYTES: int = 64 * 1024 * 1024
+#experiments are logged to mlflow on dagshub, the client is only set up when the first run is sent,
+#tracking can be turned off for air gapped training with the MODEL_TRAINER_TRACKING_ENABLED environment variable
+MODEL_TRAINER_TRACKING_ENABLED: bool = True
+MODEL_TRAINER_TRACKING_URI: str = "https://dagshub.com/lolguy699/End-to-End-Network-Security-Mlops-Pipeline-Project.mlflow"
+MODEL_TRAINER_DAGSHUB_REPO_OWNER: str = "lolguy699"
+MODEL_TRAINER_DAGSHUB_REPO_NAME: str = "End-to-End-Network-Security-Mlops-Pipeline-Project"
+MODEL_TRAINER_TRACKING_EXPERIMENT_NAME: str = "Default"
+#runs are written to this folder under the artifact dir and sent by a background thread, runs that could
+#not be sent stay here until a later training sends them; the trainer waits at most this long at the end
+MODEL_TRAINER_TRACKING_SPOOL_DIR_NAME: str = "tracking_spool"
+MODEL_TRAINER_TRACKING_FLUSH_TIMEOUT_SECONDS: float = 10.0
+
+"""
+Out of core related constant start with OUT_OF_CORE VAR NAME
+"""
+
+#for collections larger than memory, turned on with the TRAINING_OUT_OF_CORE environment variable: ingestion
+#streams the documents into parquet shards of the train and test sets, validation and transformation go
+#through the shards chunk by chunk and the trainer only fits models that learn from one chunk at a time
+OUT_OF_CORE_ENABLED: bool = False
+OUT_OF_CORE_MEMORY_BUDGET_BYTES: int = 1024 * 1024 * 1024
+#bytes a cell of a chunk can take while it is processed, its float64 copies included; a chunk holds the
+#budget over this and the number of columns rows
+OUT_OF_CORE_BYTES_PER_CELL: int = 64
+OUT_OF_CORE_TRAIN_SHARD_DIR_NAME: str = "train_shards"
+OUT_OF_CORE_TEST_SHARD_DIR_NAME: str = "test_shards"
+#rows of the train set the knn imputer is fitted on, a uniform sample of the stream
+OUT_OF_CORE_IMPUTER_SAMPLE_ROWS: int = 20000
+#imputed features are written in this dtype, the labels as int8
+OUT_OF_CORE_TRANSFORMED_DTYPE: str = "float32"
+#passes of the incremental models over the train set, and the share of the train rows held out to pick the model
+OUT_OF_CORE_EPOCHS: int = 5
+OUT_OF_CORE_VALIDATION_SPLIT_RATIO: float = 0.1
+
+"""
+Stage cache related constant start with STAGE_CACHE VAR NAME
+"""
+
+#ingestion, validation and transformation reuse the artifacts of an earlier run when their inputs,
+#config and constants are the same, bump the version when the code of a stage changes its output
+STAGE_CACHE_ENABLED: bool = True
+STAGE_CACHE_DIR_NAME: str = "stage_cache"
+STAGE_CACHE_VERSION: int = 4
+
+"""
+Artifact store related constant start with ARTIFACT_STORE VAR NAME
+"""
+
+#the files of a run folder are hardlinked to one blob per content under this folder of Artifacts,
+#so identical files of different stages and runs take the disk space once
+ARTIFACT_STORE_ENABLED: bool = True
+ARTIFACT_STORE_DIR_NAME: str = "artifact_store"
+#run folders are named after the start time of the run
+ARTIFACT_STORE_RUN_NAME_FORMAT: str = "%m_%d_%Y_%H_%M_%S"
+#retention: the last runs, the run of the served model and the runs marked with the promoted file are kept,
+#the garbage collection after a training deletes the other runs and the blobs no run links to anymore
+ARTIFACT_STORE_KEEP_LAST_RUNS: int = 10
+ARTIFACT_STORE_PROMOTED_FILE_NAME: str = "promoted.yaml"
+ARTIFACT_STORE_GC_ON_RUN: bool = True
+
+"""
+Final model related constant start with FINAL_MODEL VAR NAME
+"""
+
+FINAL_MODEL_DIR: str = "final_model"
+FINAL_MODEL_PREPROCESSOR_FILE_NAME: str = "preprocessor.pkl"
+FINAL_MODEL_PREPROCESSOR_INDEX_FILE_NAME: str = "preprocessor_index.pkl"
+FINAL_MODEL_FILE_NAME: str = "model.pkl"
+FINAL_MODEL_MANIFEST_FILE_NAME: str = "manifest.yaml"
+FINAL_MODEL_DRIFT_BASELINE_FILE_NAME: str = "drift_baseline.yaml"
+#tree ensembles are also saved as flat node arrays for the numpy evaluator of the serving path
+FINAL_MODEL_COMPILED_FILE_NAME: str = "model_compiled.npz"
+#the stages write the final model files to a folder of their run, the trainer copies it to a version folder
+#of final_model and then points the manifest at it, so the files of a version are always served together
+FINAL_MODEL_VERSIONS_DIR_NAME: str = "versions"
+#published versions kept, the served one included, for a server still loading the previous one
+FINAL_MODEL_KEEP_VERSIONS: int = 2
+
+#how often the serving model registry checks the final_model folder for a new version
+MODEL_REGISTRY_POLL_INTERVAL_SECONDS: float = 5.0
+
+"""
+Prediction related constant start with PREDICTION VAR NAME
+"""
+
+PREDICTION_OUTPUT_COLUMN: str = "predicted_column"
+#rows parsed and scored at a time by the streaming prediction route
+PREDICTION_STREAM_CHUNK_SIZE: int = 10000
+#batches up to this many rows are scored by the compiled tree ensemble, larger ones by sklearn
+#which is faster once the per call overhead is spread over enough rows
+PREDICTION_COMPILED_MAX_ROWS: int = 64
+#the records route groups concurrent requests into one model call of up to this many rows,
+#waiting at most this long for the batch to fill up
+PREDICTION_BATCH_MAX_SIZE: int = 256
+PREDICTION_BATCH_MAX_WAIT_MS: float = 5.0
+#predictions of recently scored rows are kept for this long, up to this many distinct rows,
+#and dropped when a new model version is loaded
+PREDICTION_CACHE_MAX_ENTRIES: int = 100000
+PREDICTION_CACHE_TTL_SECONDS: float = 3600.0
+
+"""
+Drift monitor related constant start with DRIFT_MONITOR VAR NAME
+"""
+
+#the serving app counts the feature values of every scored batch in time buckets of this size,
+#and compares the buckets of each rolling window with the drift baseline of the served model
+DRIFT_MONITOR_BUCKET_SECONDS: int = 60
+DRIFT_MONITOR_WINDOWS_SECONDS: tuple = (300, 3600)
+#how often the pending batch counts are folded into the buckets, off the request path
+DRIFT_MONITOR_FOLD_INTERVAL_SECONDS: float = 1.0
+#windows with fewer rows than this are reported without drift flags
+DRIFT_MONITOR_MIN_ROWS: int = 100
+
+"""
+Training job related constant start with TRAINING_JOB VAR NAME
+"""
+
+#trainings run in their own processes, at most this many at the same time, the rest wait in a queue
+TRAINING_JOB_MAX_CONCURRENT: int = 1
+
+"""
+Bulk load related constant start with BULK_LOAD VAR NAME
+"""
+
+#the csv is read this many rows at a time and sent as unordered insert_many batches,
+#with at most BULK_LOAD_MAX_WORKERS batches in flight over one pooled client
+BULK_LOAD_CHUNK_SIZE: int = 50000
+BULK_LOAD_BATCH_SIZE: int = 1000
+BULK_LOAD_MAX_WORKERS: int = 4
+#checkpoints of interrupted loads are kept here under the artifact dir, one per collection
+BULK_LOAD_CHECKPOINT_DIR: str = "bulk_load_checkpoint"
+#loads that have not completed are listed in this collection of the same database,
+#the incremental ingestion does not move its watermark past their lowest _id
+BULK_LOAD_PROGRESS_COLLECTION_NAME: str = "bulk_loads"
+
+"""
+Sync related constant start with SYNC VAR NAME
+"""
+
+#the artifact and final model folders are synced to the bucket in process, with at most this many
+#requests in flight; files from the threshold on go as multipart uploads of parts of this size
+SYNC_MAX_WORKERS: int = 8
+SYNC_MULTIPART_THRESHOLD_BYTES: int = 64 * 1024 * 1024
+SYNC_MULTIPART_PART_SIZE_BYTES: int = 16 * 1024 * 1024
+#every synced prefix gets a manifest of the content hashes of its files and the parent prefix points to
+#the latest one, so unchanged files of the next run are copied in the bucket instead of uploaded
+SYNC_MANIFEST_FILE_NAME: str = ".sync_manifest.json"
+SYNC_LATEST_FILE_NAME: str = ".sync_latest.json"
+#hashes of the local files by size and modification time, kept under the artifact dir
+SYNC_HASH_CACHE_FILE_NAME: str = "sync_hash_cache.json"
 
 
 TRAINING_BUCKET_NAME = 'networksecuritymlopsudemy'
\ No newline at end of file
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 @dataclass
 class DataIngestionArtifact:
@@ -13,12 +14,19 @@ class DataValidationArtifact:
     invalid_train_file_path : str
     invalid_test_file_path: str 
     drift_report_file_path: str 
+    drift_baseline_file_path: str
 
 @dataclass
 class DataTransformationArtifact:
     transformed_train_file_path: str
     transformed_test_file_path: str
     transformed_object_file_path: str 
+    transformed_index_object_file_path: str
+    transformed_train_labels_file_path: str
+    transformed_test_labels_file_path: str
+    #set when the train set was deduplicated, the rows of train.npy are then weighted by this file
+    transformed_train_weights_file_path: Optional[str] = None
+    deduplication_report_file_path: Optional[str] = None
 
 @dataclass
 class ClassificationMetricArtifact:
@@ -30,4 +38,57 @@ class ClassificationMetricArtifact:
 class ModelTrainerArtifact:
     trained_model_file_path: str
     train_metric_artifact: ClassificationMetricArtifact
-    test_metric_artifact: ClassificationMetricArtifact
\ No newline at end of file
+    test_metric_artifact: ClassificationMetricArtifact
+    peak_rss_bytes: int
+    #rows the model was fitted on, and the rows they stand for when the train set was deduplicated
+    train_rows: Optional[int] = None
+    train_weighted_rows: Optional[int] = None
+@dataclass
+class BulkLoadArtifact:
+    file_path: str
+    checkpoint_file_path: str
+    rows_inserted: int
+    rows_duplicate: int
+    rows_resumed: int
+    batches: int
+    elapsed_seconds: float
+    rows_per_second: float
+
+@dataclass
+class ArtifactStoreArtifact:
+    run_dir: str
+    files: int
+    files_stored: int
+    files_deduplicated: int
+    files_not_linked: int
+    bytes: int
+    bytes_stored: int
+    bytes_deduplicated: int
+    elapsed_seconds: float
+
+@dataclass
+class ArtifactGarbageCollectionArtifact:
+    dry_run: bool
+    runs: int
+    runs_retained: int
+    runs_deleted: int
+    blobs_deleted: int
+    stage_cache_records_deleted: int
+    bytes_reclaimed: int
+    elapsed_seconds: float
+
+@dataclass
+class SyncArtifact:
+    source: str
+    destination: str
+    manifest_url: Optional[str]
+    files: int
+    files_transferred: int
+    files_copied: int
+    files_skipped: int
+    bytes_transferred: int
+    bytes_copied: int
+    bytes_skipped: int
+    multipart_uploads: int
+    elapsed_seconds: float
+    bytes_per_second: float
@@ -3,18 +3,26 @@ import os
 
 from networksecurity_project.constant import training_pipeline
 
-print(training_pipeline.PIPELINE_NAME)
-print(training_pipeline.ARTIFACT_DIR)
+
+def out_of_core_enabled() -> bool:
+    return os.getenv("TRAINING_OUT_OF_CORE", str(training_pipeline.OUT_OF_CORE_ENABLED)).lower() in ("1", "true", "yes")
+
+def memory_budget_bytes() -> int:
+    return int(os.getenv("TRAINING_MEMORY_BUDGET_BYTES", training_pipeline.OUT_OF_CORE_MEMORY_BUDGET_BYTES))
 
 
 class TrainingPipelineConfig:
-    def __init__(self,timestamp=datetime.now()):
-        timestamp=timestamp.strftime("%m_%d_%Y_%H_%M_%S")
+    def __init__(self,timestamp=None):
+        #the default is taken per run, a long lived process starts every training in a folder of its own
+        timestamp=(timestamp or datetime.now()).strftime(training_pipeline.ARTIFACT_STORE_RUN_NAME_FORMAT)
         self.pipeline_name = training_pipeline.PIPELINE_NAME
         self.artifact_name = training_pipeline.ARTIFACT_DIR
         self.artifact_dir= os.path.join(self.artifact_name, timestamp)
-        self.model_dir=os.path.join("final_model")
+        self.model_dir=os.path.join(training_pipeline.FINAL_MODEL_DIR)
+        #final model files of this run, published to model_dir by the trainer once they are all there
+        self.staged_model_dir: str = os.path.join(self.artifact_dir, training_pipeline.FINAL_MODEL_DIR)
         self.timestamp: str=timestamp 
+        self.telemetry_file_path: str = os.path.join(self.artifact_dir, training_pipeline.TELEMETRY_FILE_NAME)
 
 
 class DataIngestionConfig:
@@ -26,36 +34,65 @@ class DataIngestionConfig:
         self.feature_store_file_path: str = os.path.join(
             self.data_ingestion_dir, 
             training_pipeline.DATA_INGESTION_FEATURE_STORE_DIR,
-            training_pipeline.FILE_NAME)
+            training_pipeline.FILE_NAME.replace("csv", training_pipeline.DATA_FILE_FORMAT))
         
         self.training_file_path: str = os.path.join(
             self.data_ingestion_dir,
             training_pipeline.DATA_INGESTION_INGESTED_DIR,
-            training_pipeline.TRAIN_FILE_NAME
+            training_pipeline.TRAIN_FILE_NAME.replace("csv", training_pipeline.DATA_FILE_FORMAT)
         )
 
         self.testing_file_path: str = os.path.join(
             self.data_ingestion_dir,
             training_pipeline.DATA_INGESTION_INGESTED_DIR,
-            training_pipeline.TEST_FILE_NAME
+            training_pipeline.TEST_FILE_NAME.replace("csv", training_pipeline.DATA_FILE_FORMAT)
         )
+        self.export_csv: bool = training_pipeline.DATA_EXPORT_CSV
         self.train_test_split_ratio: float = training_pipeline.DATA_INGESTION_TRAIN_TEST_SPLIT_RATIO
         self.collection_name: str = training_pipeline.DATA_INGESTION_COLLECTION_NAME
         self.database_name: str = training_pipeline.DATA_INGESTION_DATABASE_NAME
+        self.incremental: bool = training_pipeline.DATA_INGESTION_INCREMENTAL
+        self.find_batch_size: int = training_pipeline.DATA_INGESTION_FIND_BATCH_SIZE
+        self.compact_dtype: bool = training_pipeline.DATA_COMPACT_DTYPE
+        self.snapshot_dir: str = os.path.join(
+            training_pipeline_config.artifact_name,
+            training_pipeline.DATA_INGESTION_SNAPSHOT_DIR_NAME,
+            f"{self.database_name}.{self.collection_name}"
+        )
+        self.watermark_file_path: str = os.path.join(self.snapshot_dir, training_pipeline.DATA_INGESTION_WATERMARK_FILE_NAME)
+        #out of core mode writes the train and test sets as folders of parquet shards
+        self.out_of_core: bool = out_of_core_enabled()
+        self.memory_budget_bytes: int = memory_budget_bytes()
+        self.bytes_per_cell: int = training_pipeline.OUT_OF_CORE_BYTES_PER_CELL
+        self.train_shard_dir: str = os.path.join(self.data_ingestion_dir, training_pipeline.DATA_INGESTION_INGESTED_DIR,
+                                                 training_pipeline.OUT_OF_CORE_TRAIN_SHARD_DIR_NAME)
+        self.test_shard_dir: str = os.path.join(self.data_ingestion_dir, training_pipeline.DATA_INGESTION_INGESTED_DIR,
+                                                training_pipeline.OUT_OF_CORE_TEST_SHARD_DIR_NAME)
 
 class DataValidationConfig:
     def __init__(self, training_pipeline_config:TrainingPipelineConfig):
         self.data_validation_dir: str= os.path.join(training_pipeline_config.artifact_dir, training_pipeline.DATA_VALIDATION_DIR_NAME)
         self.valid_data_dir: str= os.path.join(self.data_validation_dir,training_pipeline.DATA_VALIDATION_VALID_DIR)
         self.invalid_data_dir: str= os.path.join(self.data_validation_dir, training_pipeline.DATA_VALIDATION_INVALID_DIR)
-        self.valid_train_file_path: str= os.path.join(self.valid_data_dir, training_pipeline.TRAIN_FILE_NAME)
-        self.valid_test_file_path: str= os.path.join(self.valid_data_dir, training_pipeline.TEST_FILE_NAME)
-        self.invalid_train_file_path: str= os.path.join(self.invalid_data_dir, training_pipeline.TRAIN_FILE_NAME)
-        self.invalid_test_file_path: str= os.path.join(self.invalid_data_dir, training_pipeline.TEST_FILE_NAME)
+        self.valid_train_file_path: str= os.path.join(self.valid_data_dir, training_pipeline.TRAIN_FILE_NAME.replace("csv", training_pipeline.DATA_FILE_FORMAT))
+        self.valid_test_file_path: str= os.path.join(self.valid_data_dir, training_pipeline.TEST_FILE_NAME.replace("csv", training_pipeline.DATA_FILE_FORMAT))
+        self.invalid_train_file_path: str= os.path.join(self.invalid_data_dir, training_pipeline.TRAIN_FILE_NAME.replace("csv", training_pipeline.DATA_FILE_FORMAT))
+        self.invalid_test_file_path: str= os.path.join(self.invalid_data_dir, training_pipeline.TEST_FILE_NAME.replace("csv", training_pipeline.DATA_FILE_FORMAT))
+        self.export_csv: bool = training_pipeline.DATA_EXPORT_CSV
+        self.drift_test: str = training_pipeline.DATA_VALIDATION_DRIFT_TEST
+        self.drift_threshold: float = training_pipeline.DATA_VALIDATION_DRIFT_THRESHOLD
         self.drift_report_file_path: str= os.path.join(
             self.data_validation_dir,
             training_pipeline.DATA_VALIDATION_DRIFT_REPORT_DIR,
             training_pipeline.DATA_VALIDATION_DRIFT_REPORT_FILE_NAME)
+        self.drift_baseline_file_path: str = os.path.join(
+            self.data_validation_dir,
+            training_pipeline.DATA_VALIDATION_DRIFT_REPORT_DIR,
+            training_pipeline.DATA_VALIDATION_DRIFT_BASELINE_FILE_NAME)
+        self.final_drift_baseline_file_path: str = os.path.join(training_pipeline_config.staged_model_dir, training_pipeline.FINAL_MODEL_DRIFT_BASELINE_FILE_NAME)
+        self.out_of_core: bool = out_of_core_enabled()
+        self.memory_budget_bytes: int = memory_budget_bytes()
+        self.bytes_per_cell: int = training_pipeline.OUT_OF_CORE_BYTES_PER_CELL
         
 class DataTransformationConfig:
     def __init__(self, training_pipeline_config: TrainingPipelineConfig):
@@ -64,8 +101,27 @@ class DataTransformationConfig:
                                                                     training_pipeline.TRAIN_FILE_NAME.replace("csv", "npy"))
         self.transformed_test_file_path:str = os.path.join(self.data_transformation_dir, training_pipeline.DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,
                                                            training_pipeline.TEST_FILE_NAME.replace("csv", "npy"))
+        self.transformed_train_labels_file_path:str = os.path.join(self.data_transformation_dir, training_pipeline.DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,
+                                                                   training_pipeline.DATA_TRANSFORMATION_TRAIN_LABELS_FILE_NAME)
+        self.transformed_test_labels_file_path:str = os.path.join(self.data_transformation_dir, training_pipeline.DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,
+                                                                  training_pipeline.DATA_TRANSFORMATION_TEST_LABELS_FILE_NAME)
         self.transformed_object_file_path:str = os.path.join(self.data_transformation_dir, training_pipeline.DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR,
                                                              training_pipeline.PREPROCESSING_OBJECT_FILE_NAME)
+        self.transformed_index_object_file_path:str = os.path.join(self.data_transformation_dir, training_pipeline.DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR,
+                                                                   training_pipeline.PREPROCESSING_INDEX_OBJECT_FILE_NAME)
+        self.final_preprocessor_file_path:str = os.path.join(training_pipeline_config.staged_model_dir, training_pipeline.FINAL_MODEL_PREPROCESSOR_FILE_NAME)
+        self.final_preprocessor_index_file_path:str = os.path.join(training_pipeline_config.staged_model_dir, training_pipeline.FINAL_MODEL_PREPROCESSOR_INDEX_FILE_NAME)
+        self.compact_dtype: bool = training_pipeline.DATA_COMPACT_DTYPE
+        self.deduplicate_train: bool = training_pipeline.DATA_TRANSFORMATION_DEDUPLICATE_TRAIN
+        self.transformed_train_weights_file_path: str = os.path.join(self.data_transformation_dir, training_pipeline.DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,
+                                                                     training_pipeline.DATA_TRANSFORMATION_TRAIN_WEIGHTS_FILE_NAME)
+        self.deduplication_report_file_path: str = os.path.join(self.data_transformation_dir,
+                                                                training_pipeline.DATA_TRANSFORMATION_DEDUPLICATION_REPORT_FILE_NAME)
+        self.out_of_core: bool = out_of_core_enabled()
+        self.memory_budget_bytes: int = memory_budget_bytes()
+        self.bytes_per_cell: int = training_pipeline.OUT_OF_CORE_BYTES_PER_CELL
+        self.imputer_sample_rows: int = training_pipeline.OUT_OF_CORE_IMPUTER_SAMPLE_ROWS
+        self.out_of_core_dtype: str = training_pipeline.OUT_OF_CORE_TRANSFORMED_DTYPE
         
 class ModelTrainerConfig:
     def __init__(self, training_pipeline_config: TrainingPipelineConfig):
@@ -73,4 +129,60 @@ class ModelTrainerConfig:
         self.trained_model_file_path: str = os.path.join(self.model_trainer_dir, training_pipeline.MODEL_TRAINER_TRAINED_MODEL_DIR,\
                                                          training_pipeline.MODEL_FILE_NAME)
         self.expected_accuracy: float = training_pipeline.MODEL_TRAINER_EXPECTED_SCORE
-        self.overfitting_underfitting_threshold = training_pipeline.MODEL_TRAINER_OVER_FITTING_UNDER_FITTING_THRESHOLD
\ No newline at end of file
+        self.overfitting_underfitting_threshold = training_pipeline.MODEL_TRAINER_OVER_FITTING_UNDER_FITTING_THRESHOLD
+        self.search_n_jobs: int = training_pipeline.MODEL_TRAINER_SEARCH_N_JOBS
+        self.mmap_mode: str = training_pipeline.MODEL_TRAINER_MMAP_MODE
+        self.model_search_report_file_path: str = os.path.join(self.model_trainer_dir, training_pipeline.MODEL_TRAINER_SEARCH_REPORT_FILE_NAME)
+        self.out_of_core: bool = out_of_core_enabled()
+        self.memory_budget_bytes: int = memory_budget_bytes()
+        self.bytes_per_cell: int = training_pipeline.OUT_OF_CORE_BYTES_PER_CELL
+        self.out_of_core_epochs: int = training_pipeline.OUT_OF_CORE_EPOCHS
+        self.validation_split_ratio: float = training_pipeline.OUT_OF_CORE_VALIDATION_SPLIT_RATIO
+        self.search_cache_dir: str = os.path.join(training_pipeline_config.artifact_name, training_pipeline.MODEL_TRAINER_SEARCH_CACHE_DIR_NAME)
+        self.search_cache_max_size_bytes: int = training_pipeline.MODEL_TRAINER_SEARCH_CACHE_MAX_SIZE_BYTES
+        self.final_model_file_path: str = os.path.join(training_pipeline_config.staged_model_dir, training_pipeline.FINAL_MODEL_FILE_NAME)
+        self.final_compiled_model_file_path: str = os.path.join(training_pipeline_config.staged_model_dir, training_pipeline.FINAL_MODEL_COMPILED_FILE_NAME)
+        self.staged_model_dir: str = training_pipeline_config.staged_model_dir
+        self.model_dir: str = training_pipeline_config.model_dir
+        self.final_model_manifest_file_path: str = os.path.join(training_pipeline_config.model_dir, training_pipeline.FINAL_MODEL_MANIFEST_FILE_NAME)
+        self.keep_model_versions: int = training_pipeline.FINAL_MODEL_KEEP_VERSIONS
+        self.model_version: str = training_pipeline_config.timestamp
+        self.tracking_enabled: bool = os.getenv("MODEL_TRAINER_TRACKING_ENABLED",
+                                                str(training_pipeline.MODEL_TRAINER_TRACKING_ENABLED)).lower() in ("1", "true", "yes")
+        self.tracking_uri: str = os.getenv("MLFLOW_TRACKING_URI", training_pipeline.MODEL_TRAINER_TRACKING_URI)
+        self.dagshub_repo_owner: str = training_pipeline.MODEL_TRAINER_DAGSHUB_REPO_OWNER
+        self.dagshub_repo_name: str = training_pipeline.MODEL_TRAINER_DAGSHUB_REPO_NAME
+        self.tracking_experiment_name: str = training_pipeline.MODEL_TRAINER_TRACKING_EXPERIMENT_NAME
+        self.tracking_spool_dir: str = os.path.join(training_pipeline_config.artifact_name, training_pipeline.MODEL_TRAINER_TRACKING_SPOOL_DIR_NAME)
+        self.tracking_flush_timeout: float = training_pipeline.MODEL_TRAINER_TRACKING_FLUSH_TIMEOUT_SECONDS
+
+class StageCacheConfig:
+    def __init__(self, training_pipeline_config: TrainingPipelineConfig):
+        self.enabled: bool = training_pipeline.STAGE_CACHE_ENABLED
+        self.cache_dir: str = os.path.join(training_pipeline_config.artifact_name, training_pipeline.STAGE_CACHE_DIR_NAME)
+        self.version: int = training_pipeline.STAGE_CACHE_VERSION
+        self.artifact_dir: str = training_pipeline_config.artifact_dir
+
+class ArtifactStoreConfig:
+    def __init__(self, training_pipeline_config: TrainingPipelineConfig):
+        self.enabled: bool = training_pipeline.ARTIFACT_STORE_ENABLED
+        self.artifact_root_dir: str = training_pipeline_config.artifact_name
+        self.store_dir: str = os.path.join(training_pipeline_config.artifact_name, training_pipeline.ARTIFACT_STORE_DIR_NAME)
+        self.run_dir: str = training_pipeline_config.artifact_dir
+        self.run_name_format: str = training_pipeline.ARTIFACT_STORE_RUN_NAME_FORMAT
+        self.keep_last_runs: int = int(os.getenv("ARTIFACT_STORE_KEEP_LAST_RUNS", training_pipeline.ARTIFACT_STORE_KEEP_LAST_RUNS))
+        self.promoted_file_name: str = training_pipeline.ARTIFACT_STORE_PROMOTED_FILE_NAME
+        self.gc_on_run: bool = training_pipeline.ARTIFACT_STORE_GC_ON_RUN
+        self.final_model_manifest_file_path: str = os.path.join(training_pipeline_config.model_dir, training_pipeline.FINAL_MODEL_MANIFEST_FILE_NAME)
+        self.stage_cache_dir: str = os.path.join(training_pipeline_config.artifact_name, training_pipeline.STAGE_CACHE_DIR_NAME)
+        #shared with the sync, a file interned by the store is not hashed again when it is synced
+        self.hash_cache_file_path: str = os.path.join(training_pipeline_config.artifact_name, training_pipeline.SYNC_HASH_CACHE_FILE_NAME)
+
+class SyncConfig:
+    def __init__(self, training_pipeline_config: TrainingPipelineConfig):
+        self.max_workers: int = int(os.getenv("SYNC_MAX_WORKERS", training_pipeline.SYNC_MAX_WORKERS))
+        self.multipart_threshold: int = training_pipeline.SYNC_MULTIPART_THRESHOLD_BYTES
+        self.part_size: int = training_pipeline.SYNC_MULTIPART_PART_SIZE_BYTES
+        self.hash_cache_file_path: str = os.path.join(training_pipeline_config.artifact_name, training_pipeline.SYNC_HASH_CACHE_FILE_NAME)
+        #a local folder stands in for the bucket when set, for offline runs
+        self.local_root = os.getenv("SYNC_LOCAL_ROOT")
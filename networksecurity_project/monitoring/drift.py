@@ -0,0 +1,169 @@
+import sys
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from networksecurity_project.constant.training_pipeline import DATA_COMPACT_MISSING_VALUE
+from networksecurity_project.exception.exception import NetworkSecurityException
+
+## one bin per int8 value, the compact missing value marker is bin 0 and holds the missing values
+N_BINS = 256
+BIN_OFFSET = -DATA_COMPACT_MISSING_VALUE
+MISSING_BIN = 0
+## smoothing of the empty bins in the population stability index
+PSI_EPSILON = 1e-4
+
+
+def to_bins(dataframe: pd.DataFrame):
+    """
+    Bin index of every value of the frame, and the columns that are discrete: integer valued within int8.
+    Missing values, nan or the compact marker, fall in MISSING_BIN.
+    """
+    values = dataframe.to_numpy()
+    if values.dtype == np.int8:
+        return values.astype(np.int16) + BIN_OFFSET, np.ones(values.shape[1], dtype=bool)
+
+    values = dataframe.to_numpy(dtype=np.float64, na_value=np.nan)
+    missing = np.isnan(values) | (values == DATA_COMPACT_MISSING_VALUE)
+    filled = np.where(missing, 0.0, values)
+    discrete = ((filled == np.round(filled)) & (np.abs(filled) < BIN_OFFSET)).all(axis=0)
+    bins = np.where(missing, MISSING_BIN, np.where(discrete, filled, 0.0) + BIN_OFFSET).astype(np.int16)
+    return bins, discrete
+
+
+class DriftHistogram:
+    """
+    Value counts of the discrete columns of a dataset, built for all the columns in one bincount.
+
+    Histograms of chunks of the same dataset can be merged, so a dataset of any size is counted
+    in a streaming pass with constant memory. Columns that are not discrete are kept as raw
+    values for the sample based KS test.
+    """
+    def __init__(self, columns: List[str], counts: np.ndarray, continuous: dict = None):
+        try:
+            self.columns = list(columns)
+            self.counts = counts
+            self.continuous = continuous or {}
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    @classmethod
+    def from_dataframe(cls, dataframe: pd.DataFrame):
+        try:
+            bins, discrete = to_bins(dataframe)
+            n_columns = bins.shape[1]
+            flat_bins = (bins + (np.arange(n_columns, dtype=np.int64) * N_BINS)[np.newaxis, :]).ravel()
+            counts = np.bincount(flat_bins, minlength=n_columns * N_BINS).reshape(n_columns, N_BINS)
+            counts[~discrete] = 0
+            continuous = {column: dataframe[column].dropna().to_numpy(dtype=np.float64)
+                          for column, is_discrete in zip(dataframe.columns, discrete) if not is_discrete}
+            return cls([str(column) for column in dataframe.columns], counts, continuous)
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def merge(self, other: "DriftHistogram") -> "DriftHistogram":
+        if other.columns != self.columns:
+            raise ValueError("Histograms of different columns can not be merged")
+        continuous = {column: np.concatenate([self.continuous.get(column, np.empty(0)), other.continuous.get(column, np.empty(0))])
+                      for column in set(self.continuous) | set(other.continuous)}
+        return DriftHistogram(self.columns, self.counts + other.counts, continuous)
+
+    def update(self, dataframe: pd.DataFrame) -> "DriftHistogram":
+        return self.merge(DriftHistogram.from_dataframe(dataframe[self.columns]))
+
+    def select(self, columns: List[str]) -> "DriftHistogram":
+        positions = [self.columns.index(column) for column in columns]
+        return DriftHistogram(columns, self.counts[positions],
+                              {column: values for column, values in self.continuous.items() if column in columns})
+
+    @property
+    def value_counts(self) -> np.ndarray:
+        """
+        Counts without the missing bin
+        """
+        value_counts = self.counts.copy()
+        value_counts[:, MISSING_BIN] = 0
+        return value_counts
+
+    def to_dict(self) -> dict:
+        ## only the non empty bins, as value: count
+        return {
+            column: {int(b - BIN_OFFSET): int(self.counts[position, b]) for b in np.flatnonzero(self.counts[position])}
+            for position, column in enumerate(self.columns) if column not in self.continuous
+        }
+
+    @classmethod
+    def from_dict(cls, histogram: dict):
+        columns = list(histogram)
+        counts = np.zeros((len(columns), N_BINS), dtype=np.int64)
+        for position, column in enumerate(columns):
+            for value, count in histogram[column].items():
+                counts[position, int(value) + BIN_OFFSET] = count
+        return cls(columns, counts)
+
+
+def drift_statistics(base: DriftHistogram, current: DriftHistogram) -> pd.DataFrame:
+    """
+    Chi square, population stability index and discrete KS of every column, computed from the counts
+    for all the columns at once. Missing values are left out of the comparison.
+
+    The KS statistic is exact for discrete data, the same value as ks_2samp on the raw columns, and its
+    p value comes from the same Smirnov distribution ks_2samp uses for large samples.
+    """
+    try:
+        ## scipy.stats is slow to import, the serving app only needs it once drift scores are asked for
+        from scipy.stats import chi2, kstwo, ks_2samp
+
+        if current.columns != base.columns:
+            raise ValueError(f"Columns differ: {base.columns} and {current.columns}")
+        base_counts = base.value_counts.astype(np.float64)
+        current_counts = current.value_counts.astype(np.float64)
+        n_base = base_counts.sum(axis=1)
+        n_current = current_counts.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            base_p = base_counts / n_base[:, np.newaxis]
+            current_p = current_counts / n_current[:, np.newaxis]
+
+            ## chi square test of homogeneity on the 2 x values contingency table
+            totals = base_counts + current_counts
+            n_total = (n_base + n_current)[:, np.newaxis]
+            expected_base = totals * n_base[:, np.newaxis] / n_total
+            expected_current = totals * n_current[:, np.newaxis] / n_total
+            observed_bins = totals > 0
+            chi2_statistic = np.where(observed_bins, (base_counts - expected_base) ** 2 / expected_base
+                                      + (current_counts - expected_current) ** 2 / expected_current, 0.0).sum(axis=1)
+            dof = np.maximum(observed_bins.sum(axis=1) - 1, 1)
+            chi2_p_value = np.where(observed_bins.sum(axis=1) > 1, chi2.sf(chi2_statistic, dof), 1.0)
+
+            smoothed_base = np.where(observed_bins, np.maximum(base_p, PSI_EPSILON), 1.0)
+            smoothed_current = np.where(observed_bins, np.maximum(current_p, PSI_EPSILON), 1.0)
+            psi = ((smoothed_current - smoothed_base) * np.log(smoothed_current / smoothed_base)).sum(axis=1)
+
+            ks_statistic = np.abs(np.cumsum(base_p, axis=1) - np.cumsum(current_p, axis=1)).max(axis=1)
+            effective_n = np.round(n_base * n_current / (n_base + n_current))
+            ks_p_value = np.where(np.isnan(ks_statistic), np.nan, 1.0)
+            ## identical distributions have a p value of one, the Smirnov distribution is only evaluated for the others
+            differ = ks_statistic > 0
+            ks_p_value[differ] = np.clip(kstwo.sf(ks_statistic[differ], np.maximum(effective_n[differ], 1)), 0, 1)
+
+        statistics = pd.DataFrame({
+            "n_base": n_base.astype(np.int64),
+            "n_current": n_current.astype(np.int64),
+            "chi2_statistic": chi2_statistic,
+            "chi2_p_value": chi2_p_value,
+            "psi": psi,
+            "ks_statistic": ks_statistic,
+            "ks_p_value": ks_p_value
+        }, index=base.columns)
+
+        ## columns that are not discrete fall back to the sample based KS test
+        for column, base_values in base.continuous.items():
+            current_values = current.continuous.get(column, np.empty(0))
+            result = ks_2samp(base_values, current_values)
+            statistics.loc[column, ["n_base", "n_current"]] = [len(base_values), len(current_values)]
+            statistics.loc[column, ["chi2_statistic", "chi2_p_value", "psi"]] = np.nan
+            statistics.loc[column, ["ks_statistic", "ks_p_value"]] = [result.statistic, result.pvalue]
+        return statistics
+    except Exception as e:
+        raise NetworkSecurityException(e, sys) # type: ignore
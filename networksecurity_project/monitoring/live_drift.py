@@ -0,0 +1,219 @@
+import sys, time
+import threading
+from collections import deque
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from networksecurity_project.constant.training_pipeline import (
+    DATA_VALIDATION_DRIFT_TEST,
+    DATA_VALIDATION_DRIFT_THRESHOLD,
+    DRIFT_MONITOR_BUCKET_SECONDS,
+    DRIFT_MONITOR_WINDOWS_SECONDS,
+    DRIFT_MONITOR_FOLD_INTERVAL_SECONDS,
+    DRIFT_MONITOR_MIN_ROWS
+)
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.logging.logger import logging
+from networksecurity_project.monitoring.drift import N_BINS, BIN_OFFSET, MISSING_BIN, DriftHistogram, to_bins, drift_statistics
+from networksecurity_project.monitoring.metrics import DRIFT_WINDOW_ROWS, DRIFT_PSI, DRIFT_P_VALUE, DRIFT_FEATURES_DRIFTED
+
+
+def finite_or_none(value) -> Optional[float]:
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def live_bins(dataframe: pd.DataFrame) -> np.ndarray:
+    """
+    Bin index of every value of a live batch. to_bins puts every value of a column that is not
+    discrete in the bin of the value 0, here only the values off the integer domain of the
+    bins do, and they are counted with the missing values.
+    """
+    bins, discrete = to_bins(dataframe)
+    if not discrete.all():
+        values = dataframe.loc[:, ~discrete].to_numpy(dtype=np.float64, na_value=np.nan)
+        with np.errstate(invalid="ignore"):
+            in_domain = (values == np.round(values)) & (np.abs(values) < BIN_OFFSET)
+        bins[:, ~discrete] = np.where(in_domain, np.where(in_domain, values, 0.0) + BIN_OFFSET, MISSING_BIN)
+    return bins
+
+
+class LiveDriftMonitor:
+    """
+    Rolling value counts of the features of the live prediction traffic, compared with the
+    drift baseline of the served model.
+
+    The request path only turns a scored batch into bin indexes and appends them to a deque,
+    which is thread safe without a lock. A watcher thread folds the pending batches into the
+    counts of their time bucket with one bincount, and the buckets of every rolling window are
+    compared with the baseline when the scores are asked for, on the /drift and /metrics routes.
+    """
+    def __init__(self, get_baseline: Callable[[], Optional[DriftHistogram]],
+                 windows_seconds: tuple = DRIFT_MONITOR_WINDOWS_SECONDS,
+                 bucket_seconds: int = DRIFT_MONITOR_BUCKET_SECONDS,
+                 fold_interval: float = DRIFT_MONITOR_FOLD_INTERVAL_SECONDS,
+                 min_rows: int = DRIFT_MONITOR_MIN_ROWS,
+                 drift_test: str = DATA_VALIDATION_DRIFT_TEST,
+                 threshold: float = DATA_VALIDATION_DRIFT_THRESHOLD):
+        try:
+            self.get_baseline = get_baseline
+            self.windows_seconds = sorted(int(window) for window in windows_seconds)
+            self.bucket_seconds = bucket_seconds
+            self.fold_interval = fold_interval
+            self.min_rows = min_rows
+            self.drift_test = drift_test
+            self.threshold = threshold
+
+            #(bucket, columns, bins) of the batches scored since the last fold
+            self._pending = deque()
+            #only the fold and the readers take the lock, never the request path
+            self._lock = threading.Lock()
+            self._stop_event = threading.Event()
+            self._watcher = None
+
+            self._columns = None
+            self._buckets = {}
+            self.row_count = 0
+            self.batch_count = 0
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def _current_bucket(self) -> int:
+        return int(time.time() // self.bucket_seconds)
+
+    def observe(self, dataframe: pd.DataFrame):
+        """
+        Counts the features of a scored batch. A batch that can not be counted is skipped,
+        the monitor never fails a prediction.
+        """
+        try:
+            baseline = self.get_baseline()
+            if baseline is None or len(dataframe) == 0:
+                return
+            bins = live_bins(dataframe.reindex(columns=baseline.columns))
+            self._pending.append((self._current_bucket(), tuple(baseline.columns), bins.astype(np.uint8)))
+        except Exception as e:
+            logging.info(f"Drift monitor skipped a batch of {len(dataframe)} rows: {e}")
+
+    def fold(self):
+        """
+        Adds the pending batches to the counts of their bucket and drops the buckets
+        that are out of the longest window.
+        """
+        try:
+            with self._lock:
+                pending = {}
+                for _ in range(len(self._pending)):
+                    bucket, columns, bins = self._pending.popleft()
+                    if columns != self._columns:
+                        ## a model with other features was swapped in, the counts start over
+                        self._columns = columns
+                        self._buckets = {}
+                        pending = {}
+                    pending.setdefault(bucket, []).append(bins)
+                    self.batch_count += 1
+
+                if self._columns is not None:
+                    n_columns = len(self._columns)
+                    offsets = np.arange(n_columns, dtype=np.int64) * N_BINS
+                    for bucket, batches in pending.items():
+                        bins = np.concatenate(batches)
+                        counts = np.bincount((bins + offsets).ravel(), minlength=n_columns * N_BINS).reshape(n_columns, N_BINS)
+                        if bucket in self._buckets:
+                            self._buckets[bucket] += counts
+                        else:
+                            self._buckets[bucket] = counts
+                        self.row_count += len(bins)
+
+                oldest = self._current_bucket() - self.windows_seconds[-1] // self.bucket_seconds
+                for bucket in [bucket for bucket in self._buckets if bucket <= oldest]:
+                    del self._buckets[bucket]
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def window_counts(self, window_seconds: int) -> np.ndarray:
+        """
+        Value counts of the buckets in the window, the current bucket included
+        """
+        with self._lock:
+            first = self._current_bucket() - window_seconds // self.bucket_seconds
+            counts = np.zeros((len(self._columns or ()), N_BINS), dtype=np.int64)
+            for bucket, bucket_counts in self._buckets.items():
+                if bucket > first:
+                    counts += bucket_counts
+            return counts
+
+    def _window_scores(self, label: str, baseline: DriftHistogram, counts: np.ndarray) -> dict:
+        ## every row adds one count to every column
+        rows = int(counts[0].sum()) if len(counts) else 0
+        DRIFT_WINDOW_ROWS.labels(window=label).set(rows)
+        scores = {"rows": rows, "drifted_features": [], "features": {}}
+        if rows == 0:
+            return scores
+
+        statistics = drift_statistics(baseline, DriftHistogram(baseline.columns, counts))
+        p_values = statistics[f"{self.drift_test}_p_value"]
+        for position, column in enumerate(baseline.columns):
+            psi = finite_or_none(statistics.at[column, "psi"])
+            p_value = finite_or_none(p_values[column])
+            drifted = rows >= self.min_rows and p_value is not None and p_value < self.threshold
+            if drifted:
+                scores["drifted_features"].append(column)
+            scores["features"][column] = {
+                "psi": psi,
+                "p_value": p_value,
+                #missing values and values off the integer domain of the bins
+                "missing_rate": float(counts[position, MISSING_BIN] / rows),
+                "drift_status": drifted
+            }
+            DRIFT_PSI.labels(window=label, feature=column).set(np.nan if psi is None else psi)
+            DRIFT_P_VALUE.labels(window=label, feature=column).set(np.nan if p_value is None else p_value)
+        DRIFT_FEATURES_DRIFTED.labels(window=label).set(len(scores["drifted_features"]))
+        return scores
+
+    def scores(self) -> dict:
+        """
+        Drift of every rolling window against the baseline, also set on the drift gauges
+        """
+        try:
+            self.fold()
+            baseline = self.get_baseline()
+            result = {
+                "baseline_loaded": baseline is not None,
+                "drift_test": self.drift_test,
+                "threshold": self.threshold,
+                "min_rows": self.min_rows,
+                "row_count": self.row_count,
+                "batch_count": self.batch_count,
+                "pending_batches": len(self._pending),
+                "windows": {}
+            }
+            if baseline is None or self._columns != tuple(baseline.columns):
+                return result
+            for window_seconds in self.windows_seconds:
+                label = f"{window_seconds}s"
+                result["windows"][label] = self._window_scores(label, baseline, self.window_counts(window_seconds))
+            return result
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def _watch(self):
+        while not self._stop_event.wait(self.fold_interval):
+            try:
+                self.fold()
+            except NetworkSecurityException as e:
+                logging.info(f"Drift monitor fold failed: {e}")
+
+    def start_watcher(self):
+        if self._watcher is None or not self._watcher.is_alive():
+            self._stop_event.clear()
+            self._watcher = threading.Thread(target=self._watch, name="drift-monitor-fold", daemon=True)
+            self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop_event.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=self.fold_interval)
+            self._watcher = None
@@ -0,0 +1,91 @@
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+## serving metrics, exposed by the /metrics route of the app in the prometheus text format
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+TRAINING_DURATION_BUCKETS = (10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+PREDICTION_LATENCY_SECONDS = Histogram(
+    "networksecurity_prediction_latency_seconds",
+    "Time to answer a prediction request",
+    ["route"], buckets=LATENCY_BUCKETS
+)
+PREDICTION_ROWS = Histogram(
+    "networksecurity_prediction_rows",
+    "Rows scored per prediction request",
+    ["route"], buckets=BATCH_SIZE_BUCKETS
+)
+PREDICTION_BATCH_ROWS = Histogram(
+    "networksecurity_prediction_batch_rows",
+    "Rows per model call of the records batcher",
+    buckets=BATCH_SIZE_BUCKETS
+)
+PREDICTION_BATCH_REQUESTS = Histogram(
+    "networksecurity_prediction_batch_requests",
+    "Requests grouped into one model call by the records batcher",
+    buckets=BATCH_SIZE_BUCKETS
+)
+PREDICTION_QUEUE_WAIT_SECONDS = Histogram(
+    "networksecurity_prediction_queue_wait_seconds",
+    "Time a records request waits for its batch",
+    buckets=LATENCY_BUCKETS
+)
+MODEL_LOAD_SECONDS = Histogram(
+    "networksecurity_model_load_seconds",
+    "Time to load the final model into the registry",
+    buckets=LATENCY_BUCKETS
+)
+TRAINING_JOB_DURATION_SECONDS = Histogram(
+    "networksecurity_training_job_duration_seconds",
+    "Run time of the training jobs by outcome",
+    ["status"], buckets=TRAINING_DURATION_BUCKETS
+)
+
+## row prediction cache of the served model
+PREDICTION_CACHE_LOOKUPS = Counter(
+    "networksecurity_prediction_cache_lookups",
+    "Distinct rows looked up in the prediction cache by result",
+    ["result"]
+)
+PREDICTION_CACHE_HIT_RATIO = Gauge(
+    "networksecurity_prediction_cache_hit_ratio",
+    "Share of the prediction cache lookups answered from the cache"
+)
+PREDICTION_CACHE_ENTRIES = Gauge(
+    "networksecurity_prediction_cache_entries",
+    "Rows held by the prediction cache"
+)
+PREDICTION_DUPLICATE_ROWS = Counter(
+    "networksecurity_prediction_duplicate_rows",
+    "Rows answered from an identical row of the same batch"
+)
+
+## drift of the live traffic against the baseline of the served model, set when the scores are computed
+DRIFT_WINDOW_ROWS = Gauge(
+    "networksecurity_drift_window_rows",
+    "Rows scored in the rolling drift window",
+    ["window"]
+)
+DRIFT_PSI = Gauge(
+    "networksecurity_drift_psi",
+    "Population stability index of a feature in the window against the drift baseline",
+    ["window", "feature"]
+)
+DRIFT_P_VALUE = Gauge(
+    "networksecurity_drift_p_value",
+    "Drift test p value of a feature in the window against the drift baseline",
+    ["window", "feature"]
+)
+DRIFT_FEATURES_DRIFTED = Gauge(
+    "networksecurity_drift_features_drifted",
+    "Features of the window with a p value under the drift threshold",
+    ["window"]
+)
+
+
+def render_metrics():
+    """
+    Returns the current metrics and their content type
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
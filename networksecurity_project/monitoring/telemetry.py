@@ -0,0 +1,121 @@
+import os, sys, time
+import json
+import resource
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.logging.logger import logging
+from networksecurity_project.utils.main_utils.utils import reset_peak_rss, get_peak_rss_bytes
+from networksecurity_project.utils.main_utils.shards import shard_schema
+
+
+def read_process_io() -> dict:
+    """
+    Bytes read and written by the current process so far, files and sockets alike.
+    Zeros where /proc is not available.
+    """
+    io = {"rchar": 0, "wchar": 0}
+    try:
+        with open("/proc/self/io", "r") as file_obj:
+            for line in file_obj:
+                name, value = line.split(":")
+                if name in io:
+                    io[name] = int(value)
+    except OSError:
+        pass
+    return io
+
+
+def get_cpu_time() -> float:
+    """
+    CPU time of the current process and of its children that were already waited for
+    """
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def count_rows(*file_paths: str):
+    """
+    Number of rows in parquet and npy files and in folders of parquet shards, read from their metadata.
+    None if a file is of another kind.
+    """
+    rows = 0
+    for file_path in file_paths:
+        if file_path is not None and os.path.isdir(file_path):
+            rows += shard_schema(file_path)[0]
+            continue
+        if file_path is None or not os.path.isfile(file_path):
+            return None
+        if file_path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            rows += pq.ParquetFile(file_path).metadata.num_rows
+        elif file_path.endswith(".npy"):
+            rows += len(np.load(file_path, mmap_mode="r"))
+        else:
+            return None
+    return rows
+
+
+class PipelineTelemetry:
+    """
+    Structured measurements of one training run: wall time, CPU time, peak RSS, rows in and out
+    and bytes read and written for every stage, plus the model search candidates.
+    Saved as a json artifact of the run.
+    """
+    def __init__(self, run_id: str):
+        try:
+            self.run = {
+                "run_id": run_id,
+                "started_at": datetime.now().isoformat(),
+                "stages": [],
+                "candidates": []
+            }
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Measures the block as the stage name. The block can add its own fields, like rows_in and rows_out,
+        to the record it gets.
+        """
+        record = {"stage": name, "status": "running"}
+        io_start = read_process_io()
+        cpu_start = get_cpu_time()
+        reset_peak_rss()
+        start = time.perf_counter()
+        try:
+            yield record
+            record["status"] = "succeeded"
+        except BaseException:
+            record["status"] = "failed"
+            raise
+        finally:
+            io_end = read_process_io()
+            record.update(
+                wall_time_seconds=time.perf_counter() - start,
+                cpu_time_seconds=get_cpu_time() - cpu_start,
+                peak_rss_bytes=get_peak_rss_bytes(),
+                bytes_read=io_end["rchar"] - io_start["rchar"],
+                bytes_written=io_end["wchar"] - io_start["wchar"]
+            )
+            self.run["stages"].append(record)
+            logging.info(f"Stage {name} {record['status']} in {record['wall_time_seconds']:.2f} seconds, "
+                         f"{record['cpu_time_seconds']:.2f} seconds of cpu, peak rss {record['peak_rss_bytes'] / 2**20:.1f} MiB")
+
+    def add_candidate(self, record: dict):
+        self.run["candidates"].append(record)
+
+    def save(self, file_path: str):
+        try:
+            self.run["finished_at"] = datetime.now().isoformat()
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            tmp_file_path = f"{file_path}.{os.getpid()}.tmp"
+            with open(tmp_file_path, "w") as file_obj:
+                json.dump(self.run, file_obj, indent=2, default=str)
+            os.replace(tmp_file_path, file_path)
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
@@ -0,0 +1,278 @@
+import os, sys, time
+import fcntl
+import json
+import queue
+import shutil
+import functools
+import threading
+import uuid
+
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.logging.logger import logging
+from networksecurity_project.utils.main_utils.utils import save_object
+
+## mlflow accepts at most this many metrics and params in one log_batch call
+LOG_BATCH_MAX_METRICS = 1000
+LOG_BATCH_MAX_PARAMS = 100
+RUN_FILE_NAME = "run.json"
+LOCK_FILE_NAME = "run.lock"
+ARTIFACTS_DIR_NAME = "artifacts"
+
+
+@functools.lru_cache(maxsize=None)
+def get_mlflow(tracking_uri: str, repo_owner: str, repo_name: str):
+    """
+    Imports mlflow and points it at the dagshub repo, once per process on the first upload,
+    so importing the trainer needs neither the tracking packages nor the network
+    """
+    import mlflow
+    import dagshub
+    dagshub.init(repo_owner=repo_owner, repo_name=repo_name, mlflow=True)
+    mlflow.set_tracking_uri(tracking_uri)
+    return mlflow
+
+
+def save_model_artifact(model, dir_path: str):
+    """
+    Saves the model in the mlflow sklearn format, or as a plain pickle where mlflow is not installed
+    """
+    try:
+        import mlflow.sklearn
+        mlflow.sklearn.save_model(model, path=dir_path)
+    except ImportError:
+        save_object(os.path.join(dir_path, "model.pkl"), model)
+
+
+def write_run_file(run_dir: str, run: dict):
+    """
+    Writes the run.json of a spooled run to a temporary file renamed over the old one,
+    a crash leaves either of the two
+    """
+    tmp_file_path = os.path.join(run_dir, f"{RUN_FILE_NAME}.{os.getpid()}.tmp")
+    with open(tmp_file_path, "w") as file_obj:
+        json.dump(run, file_obj, default=str)
+    os.replace(tmp_file_path, os.path.join(run_dir, RUN_FILE_NAME))
+
+
+class ExperimentTracker:
+    """
+    Experiment tracking that never makes the trainer wait on the tracking server.
+
+    Params, metrics and models are queued to a worker thread, which writes every run to a
+    local spool folder first: a run.json with the params and metrics, and the models saved
+    once under artifacts/. When the run ends, the worker sends its params and metrics in
+    log_batch calls and uploads the artifacts. A run that can not be sent, or is cut off by
+    the end of the process, stays in the spool and is sent by the next tracker that starts.
+    The worker holds the lock file of its open run: a run that was never ended is closed when
+    the next one starts, and one whose process is gone is closed by the next flush.
+    The progress of every run is kept in its run.json, so a retry never creates a second
+    remote run or sends the same metrics twice.
+    """
+    def __init__(self, spool_dir: str, tracking_uri: str, repo_owner: str, repo_name: str,
+                 experiment_name: str = "Default", enabled: bool = True):
+        try:
+            self.spool_dir = spool_dir
+            self.tracking_uri = tracking_uri
+            self.repo_owner = repo_owner
+            self.repo_name = repo_name
+            self.experiment_name = experiment_name
+            self.enabled = enabled
+
+            self._queue = queue.Queue()
+            self._worker = None
+            self._run_dir = None
+            self._run = None
+            #lock file of the open run, held until the run is closed
+            self._run_lock = None
+            #set by the worker once the current run was sent or spooled
+            self._run_done = threading.Event()
+
+            self.uploaded_runs = 0
+            self.last_error = None
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def start_run(self, run_name: str):
+        if not self.enabled:
+            return
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._work, name="experiment-tracker", daemon=True)
+            self._worker.start()
+        self._run_done.clear()
+        self._queue.put(("start", run_name))
+
+    def log_params(self, params: dict):
+        if self.enabled:
+            self._queue.put(("params", dict(params)))
+
+    def log_metrics(self, metrics: dict, step: int = 0):
+        if self.enabled:
+            self._queue.put(("metrics", {"values": dict(metrics), "timestamp": int(time.time() * 1000), "step": step}))
+
+    def log_model(self, model, artifact_path: str):
+        if self.enabled:
+            self._queue.put(("model", (model, artifact_path)))
+
+    def end_run(self, timeout: float = None) -> bool:
+        """
+        Ends the run and waits at most timeout seconds for it to be sent.
+
+        Returns:
+            True if the run was handled, sent or spooled, within the timeout
+        """
+        if not self.enabled or self._worker is None:
+            return True
+        self._queue.put(("end", None))
+        done = self._run_done.wait(timeout)
+        if not done:
+            logging.info(f"Experiment tracking goes on in the background, unsent runs stay in {self.spool_dir}")
+        return done
+
+    ## worker side, only the tracker thread runs the methods below
+
+    def _save_run(self):
+        write_run_file(self._run_dir, self._run)
+
+    def _close_run(self):
+        """
+        Marks the open run finished and releases its lock, a flush can send it from then on
+        """
+        self._run["finished"] = True
+        self._run["end_time"] = int(time.time() * 1000)
+        self._save_run()
+        self._run_lock.close()
+        self._run, self._run_dir, self._run_lock = None, None, None
+
+    def _handle(self, kind: str, payload):
+        if kind == "start":
+            if self._run is not None:
+                logging.info(f"Tracked run {self._run['run_name']} was never ended, it is closed as it is")
+                self._close_run()
+            self._run_dir = os.path.join(self.spool_dir, f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}")
+            os.makedirs(os.path.join(self._run_dir, ARTIFACTS_DIR_NAME), exist_ok=True)
+            ## taken before the run file exists, a flush never sees the run unlocked while it is open
+            self._run_lock = open(os.path.join(self._run_dir, LOCK_FILE_NAME), "w")
+            fcntl.flock(self._run_lock, fcntl.LOCK_EX)
+            self._run = {"run_name": payload, "start_time": int(time.time() * 1000), "finished": False,
+                         "params": {}, "metrics": [], "artifacts": [],
+                         "run_id": None, "batches_sent": False, "artifacts_uploaded": []}
+        elif self._run is None:
+            logging.info(f"Tracking {kind} outside of a run is ignored")
+            return
+        elif kind == "params":
+            self._run["params"].update({name: str(value) for name, value in payload.items()})
+        elif kind == "metrics":
+            self._run["metrics"].extend({"key": name, "value": float(value), "timestamp": payload["timestamp"],
+                                         "step": payload["step"]} for name, value in payload["values"].items())
+        elif kind == "model":
+            model, artifact_path = payload
+            if artifact_path not in self._run["artifacts"]:
+                save_model_artifact(model, os.path.join(self._run_dir, ARTIFACTS_DIR_NAME, artifact_path))
+                self._run["artifacts"].append(artifact_path)
+        elif kind == "end":
+            self._close_run()
+            self.flush()
+            self._run_done.set()
+            return
+        self._save_run()
+
+    def _work(self):
+        ## runs left over by earlier processes go first
+        self.flush()
+        while True:
+            kind, payload = self._queue.get()
+            try:
+                self._handle(kind, payload)
+            except Exception as e:
+                self.last_error = str(e)
+                logging.info(f"Experiment tracking could not handle {kind}: {e}")
+                if kind == "end":
+                    self._run_done.set()
+
+    def _upload(self, run_dir: str):
+        run_file_path = os.path.join(run_dir, RUN_FILE_NAME)
+        with open(run_file_path, "r") as file_obj:
+            run = json.load(file_obj)
+
+        def save():
+            write_run_file(run_dir, run)
+
+        if not run["finished"]:
+            ## its lock is free, the process that opened the run ended without ending it
+            logging.info(f"Tracked run {run_dir} was left open, it is closed as it is")
+            run["finished"] = True
+            run["end_time"] = int(os.path.getmtime(run_file_path) * 1000)
+            save()
+
+        mlflow = get_mlflow(self.tracking_uri, self.repo_owner, self.repo_name)
+        from mlflow.entities import Metric, Param
+        client = mlflow.tracking.MlflowClient()
+
+        if run["run_id"] is None:
+            experiment = client.get_experiment_by_name(self.experiment_name)
+            experiment_id = experiment.experiment_id if experiment is not None else client.create_experiment(self.experiment_name)
+            run["run_id"] = client.create_run(experiment_id, start_time=run["start_time"], run_name=run["run_name"]).info.run_id
+            save()
+
+        if not run["batches_sent"]:
+            metrics = [Metric(m["key"], m["value"], m["timestamp"], m["step"]) for m in run["metrics"]]
+            params = [Param(name, value) for name, value in run["params"].items()]
+            for start in range(0, len(metrics), LOG_BATCH_MAX_METRICS):
+                client.log_batch(run["run_id"], metrics=metrics[start:start + LOG_BATCH_MAX_METRICS])
+            for start in range(0, len(params), LOG_BATCH_MAX_PARAMS):
+                client.log_batch(run["run_id"], params=params[start:start + LOG_BATCH_MAX_PARAMS])
+            run["batches_sent"] = True
+            save()
+
+        for artifact_path in run["artifacts"]:
+            if artifact_path not in run["artifacts_uploaded"]:
+                client.log_artifacts(run["run_id"], os.path.join(run_dir, ARTIFACTS_DIR_NAME, artifact_path), artifact_path=artifact_path)
+                run["artifacts_uploaded"].append(artifact_path)
+                save()
+
+        client.set_terminated(run["run_id"], end_time=run.get("end_time"))
+        shutil.rmtree(run_dir)
+
+    def pending_runs(self) -> list:
+        """
+        Spool folders of the runs that were not sent yet, oldest first. The open ones are
+        listed too, flush skips those whose lock is held.
+        """
+        if not os.path.isdir(self.spool_dir):
+            return []
+        return [os.path.join(self.spool_dir, name) for name in sorted(os.listdir(self.spool_dir))
+                if os.path.isfile(os.path.join(self.spool_dir, name, RUN_FILE_NAME))]
+
+    def flush(self) -> int:
+        """
+        Sends the spooled runs, stops at the first failure since the server is most likely unreachable.
+
+        Returns:
+            the number of runs sent
+        """
+        sent = 0
+        for run_dir in self.pending_runs():
+            start = time.perf_counter()
+            ## a run is sent by one process at a time, the lock goes away with the process that holds it
+            try:
+                lock_file = open(os.path.join(run_dir, LOCK_FILE_NAME), "w")
+            except FileNotFoundError:
+                continue
+            with lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                ## sent by another process since the spool was listed
+                if not os.path.exists(os.path.join(run_dir, RUN_FILE_NAME)):
+                    continue
+                try:
+                    self._upload(run_dir)
+                except Exception as e:
+                    self.last_error = str(e)
+                    logging.info(f"Tracking server unreachable, {run_dir} stays spooled: {e}")
+                    break
+            sent += 1
+            self.uploaded_runs += 1
+            logging.info(f"Sent the tracked run {run_dir} in {time.perf_counter() - start:.2f} seconds")
+        return sent
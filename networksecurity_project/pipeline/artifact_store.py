@@ -0,0 +1,357 @@
+import os, sys, time
+import stat
+import shutil
+import uuid
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from networksecurity_project.cloud.s3_syncer import FileHashCache
+from networksecurity_project.entity.config_entity import ArtifactStoreConfig
+from networksecurity_project.entity.artifact_entity import ArtifactStoreArtifact, ArtifactGarbageCollectionArtifact
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.logging.logger import logging
+from networksecurity_project.utils.main_utils.utils import read_yaml_file, write_yaml_file
+
+BLOBS_DIR_NAME = "blobs"
+
+
+class ArtifactStore:
+    """
+    Content addressed store of the run folders under Artifacts.
+
+    Every file of a run is hardlinked to a blob named after its sha256, a file whose content is
+    already stored is replaced by a link to the existing blob. The run folders keep their layout,
+    so the stages read them as before, but identical files of different stages and runs share
+    their disk blocks. Blobs are made read only, the writers of the pipeline replace files instead
+    of writing into them, so a new file never changes a blob.
+
+    The link count of a blob is its reference count: once the runs linking to it are deleted it
+    only has the link of the store, and the garbage collection removes it. Runs are kept by the
+    retention policy: the last keep_last_runs runs, the run of the served model and the runs
+    marked as promoted.
+    """
+    def __init__(self, artifact_store_config: ArtifactStoreConfig):
+        try:
+            self.artifact_store_config = artifact_store_config
+            self.enabled = artifact_store_config.enabled
+            self.blobs_dir = os.path.join(artifact_store_config.store_dir, BLOBS_DIR_NAME)
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blobs_dir, digest[:2], digest)
+
+    @staticmethod
+    def _files(folder: str) -> List[str]:
+        file_paths = []
+        for dir_path, _, file_names in os.walk(folder):
+            for file_name in sorted(file_names):
+                file_path = os.path.join(dir_path, file_name)
+                if not file_name.endswith(".tmp") and not os.path.islink(file_path):
+                    file_paths.append(file_path)
+        return file_paths
+
+    @staticmethod
+    def _replace_with_link(source_path: str, file_path: str):
+        ## linked next to the file and swapped in, readers see the old or the new file, never none
+        tmp_file_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+        os.link(source_path, tmp_file_path)
+        try:
+            os.replace(tmp_file_path, file_path)
+        finally:
+            if os.path.exists(tmp_file_path):
+                os.remove(tmp_file_path)
+
+    def _intern_file(self, file_path: str, hash_cache: FileHashCache) -> str:
+        """
+        Links the file to the blob of its content, returns stored, deduplicated or not_linked
+        """
+        file_stat = os.stat(file_path)
+        digest = hash_cache.sha256(file_path)
+        blob_path = self._blob_path(digest)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        try:
+            blob_stat = os.stat(blob_path)
+        except FileNotFoundError:
+            blob_stat = None
+
+        if blob_stat is not None and (blob_stat.st_dev, blob_stat.st_ino) == (file_stat.st_dev, file_stat.st_ino):
+            return "deduplicated" if blob_stat.st_nlink > 2 else "stored"
+        if blob_stat is None:
+            try:
+                ## the file becomes the blob
+                os.link(file_path, blob_path)
+                os.chmod(blob_path, stat.S_IMODE(file_stat.st_mode) & ~0o222)
+                return "stored"
+            except FileExistsError:
+                blob_stat = os.stat(blob_path)
+            except OSError as e:
+                logging.info(f"Can not link {file_path} into the artifact store, keeping a copy: {e}")
+                return "not_linked"
+        if blob_stat.st_size != file_stat.st_size:
+            logging.info(f"Blob {blob_path} does not match the size of {file_path}, keeping a copy")
+            return "not_linked"
+        try:
+            self._replace_with_link(blob_path, file_path)
+        except FileNotFoundError:
+            ## the blob was collected in between, the file is stored again
+            return self._intern_file(file_path, hash_cache)
+        except OSError as e:
+            logging.info(f"Can not link {file_path} into the artifact store, keeping a copy: {e}")
+            return "not_linked"
+        hash_cache.remember(file_path, digest)
+        return "deduplicated"
+
+    def intern_run(self, run_dir: str = None) -> ArtifactStoreArtifact:
+        """
+        Links every file of the run folder, the current run by default, to the store
+        """
+        try:
+            start = time.perf_counter()
+            run_dir = run_dir or self.artifact_store_config.run_dir
+            counts = {"stored": [0, 0], "deduplicated": [0, 0], "not_linked": [0, 0]}
+            if self.enabled and os.path.isdir(run_dir):
+                hash_cache = FileHashCache(self.artifact_store_config.hash_cache_file_path)
+                for file_path in self._files(run_dir):
+                    outcome = self._intern_file(file_path, hash_cache)
+                    counts[outcome][0] += 1
+                    counts[outcome][1] += os.path.getsize(file_path)
+                hash_cache.save()
+
+            artifact = ArtifactStoreArtifact(
+                run_dir=run_dir,
+                files=sum(files for files, _ in counts.values()),
+                files_stored=counts["stored"][0],
+                files_deduplicated=counts["deduplicated"][0],
+                files_not_linked=counts["not_linked"][0],
+                bytes=sum(size for _, size in counts.values()),
+                bytes_stored=counts["stored"][1],
+                bytes_deduplicated=counts["deduplicated"][1],
+                elapsed_seconds=time.perf_counter() - start
+            )
+            logging.info(f"Interned {artifact.files} files of {run_dir}, {artifact.bytes_deduplicated} bytes were already stored")
+            return artifact
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def link(self, source_path: str, file_path: str):
+        """
+        Puts the content of source_path at file_path without copying it, a copy is the fallback
+        when the file system has no hardlinks
+        """
+        try:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            try:
+                self._replace_with_link(source_path, file_path)
+            except OSError:
+                tmp_file_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+                shutil.copy2(source_path, tmp_file_path)
+                os.replace(tmp_file_path, file_path)
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def relocate(self, artifact: dict, source_dir: str, target_dir: str) -> dict:
+        """
+        Links the files of an artifact of the source run into the target run, returns the artifact
+        with the new paths. Paths outside of the source run are kept as they are, folders are linked
+        file by file.
+        """
+        try:
+            source_dir = os.path.normpath(source_dir)
+            relocated = {}
+            for name, value in artifact.items():
+                if isinstance(value, str) and os.path.exists(value) and \
+                        os.path.commonpath([os.path.normpath(value), source_dir]) == source_dir:
+                    target_path = os.path.join(target_dir, os.path.relpath(value, source_dir))
+                    if os.path.isdir(value):
+                        for file_name in sorted(os.listdir(value)):
+                            if os.path.isfile(os.path.join(value, file_name)):
+                                self.link(os.path.join(value, file_name), os.path.join(target_path, file_name))
+                    else:
+                        self.link(value, target_path)
+                    value = target_path
+                relocated[name] = value
+            return relocated
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def runs(self) -> List[str]:
+        """
+        Names of the run folders, oldest first
+        """
+        root_dir = self.artifact_store_config.artifact_root_dir
+        if not os.path.isdir(root_dir):
+            return []
+        runs = []
+        for name in os.listdir(root_dir):
+            if not os.path.isdir(os.path.join(root_dir, name)):
+                continue
+            try:
+                runs.append((datetime.strptime(name, self.artifact_store_config.run_name_format), name))
+            except ValueError:
+                continue
+        return [name for _, name in sorted(runs)]
+
+    def run_dir(self, run: str) -> str:
+        return os.path.join(self.artifact_store_config.artifact_root_dir, run)
+
+    def served_run(self) -> Optional[str]:
+        """
+        Run of the model in the final model folder, from its manifest
+        """
+        manifest_file_path = self.artifact_store_config.final_model_manifest_file_path
+        if not os.path.exists(manifest_file_path):
+            return None
+        manifest = read_yaml_file(manifest_file_path) or {}
+        return str(manifest["version"]) if "version" in manifest else None
+
+    def promoted_runs(self) -> List[str]:
+        return [run for run in self.runs()
+                if os.path.exists(os.path.join(self.run_dir(run), self.artifact_store_config.promoted_file_name))]
+
+    def promote(self, run: str, note: str = None):
+        """
+        Marks the run to be kept by the retention policy
+        """
+        try:
+            if run not in self.runs():
+                raise Exception(f"No run {run} in {self.artifact_store_config.artifact_root_dir}")
+            write_yaml_file(os.path.join(self.run_dir(run), self.artifact_store_config.promoted_file_name),
+                            content={"promoted_at": datetime.now().isoformat(), "note": note}, replace=True)
+            logging.info(f"Promoted the run {run}")
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def demote(self, run: str):
+        try:
+            promoted_file_path = os.path.join(self.run_dir(run), self.artifact_store_config.promoted_file_name)
+            if os.path.exists(promoted_file_path):
+                os.remove(promoted_file_path)
+                logging.info(f"Demoted the run {run}")
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def retained_runs(self, keep_last: int = None, protect: Iterable[str] = ()) -> List[str]:
+        keep_last = self.artifact_store_config.keep_last_runs if keep_last is None else keep_last
+        runs = self.runs()
+        retained = set(runs[-keep_last:] if keep_last > 0 else [])
+        retained.update(self.promoted_runs())
+        retained.update(protect)
+        served_run = self.served_run()
+        if served_run is not None:
+            retained.add(served_run)
+        return [run for run in runs if run in retained]
+
+    def _blobs(self) -> List[str]:
+        return self._files(self.blobs_dir) if os.path.isdir(self.blobs_dir) else []
+
+    def _stage_cache_records(self, runs: Iterable[str]) -> List[str]:
+        """
+        Stage cache records of artifacts made by the runs
+        """
+        run_dirs = {os.path.normpath(self.run_dir(run)) for run in runs}
+        record_paths = []
+        for record_path in self._files(self.artifact_store_config.stage_cache_dir):
+            if not record_path.endswith(".yaml"):
+                continue
+            record = read_yaml_file(record_path) or {}
+            if os.path.normpath(str(record.get("artifact_dir"))) in run_dirs:
+                record_paths.append(record_path)
+        return record_paths
+
+    @staticmethod
+    def _freed_bytes(file_paths: Iterable[str]) -> int:
+        """
+        Bytes freed by deleting the files: the size of every inode all of whose links are among them
+        """
+        inodes = {}
+        for file_path in file_paths:
+            file_stat = os.stat(file_path)
+            links = inodes.setdefault((file_stat.st_dev, file_stat.st_ino), [0, file_stat.st_nlink, file_stat.st_size])
+            links[0] += 1
+        return sum(size for count, nlink, size in inodes.values() if count >= nlink)
+
+    def collect_garbage(self, keep_last: int = None, protect: Iterable[str] = (), dry_run: bool = False) -> ArtifactGarbageCollectionArtifact:
+        """
+        Deletes the runs the retention policy does not keep, their stage cache records and the
+        blobs no run links to anymore. A dry run only reports what would be deleted.
+        """
+        try:
+            start = time.perf_counter()
+            runs = self.runs()
+            retained = set(self.retained_runs(keep_last=keep_last, protect=protect))
+            expired = [run for run in runs if run not in retained]
+
+            expired_files = [file_path for run in expired for file_path in self._files(self.run_dir(run))]
+            blobs = self._blobs()
+            bytes_reclaimed = self._freed_bytes(expired_files + blobs)
+            stage_cache_records = self._stage_cache_records(expired)
+
+            if dry_run:
+                expired_inodes = {}
+                for file_path in expired_files:
+                    file_stat = os.stat(file_path)
+                    key = (file_stat.st_dev, file_stat.st_ino)
+                    expired_inodes[key] = expired_inodes.get(key, 0) + 1
+                blobs_deleted = 0
+                for blob_path in blobs:
+                    blob_stat = os.stat(blob_path)
+                    if blob_stat.st_nlink - expired_inodes.get((blob_stat.st_dev, blob_stat.st_ino), 0) <= 1:
+                        blobs_deleted += 1
+            else:
+                for run in expired:
+                    logging.info(f"Deleting the run {run}, it is not retained")
+                    shutil.rmtree(self.run_dir(run))
+                for record_path in stage_cache_records:
+                    os.remove(record_path)
+                blobs_deleted = 0
+                ## a blob whose only link is the one of the store is not used by any run
+                for blob_path in blobs:
+                    if os.stat(blob_path).st_nlink == 1:
+                        os.remove(blob_path)
+                        blobs_deleted += 1
+                for dir_name in os.listdir(self.blobs_dir) if os.path.isdir(self.blobs_dir) else []:
+                    dir_path = os.path.join(self.blobs_dir, dir_name)
+                    if os.path.isdir(dir_path) and not os.listdir(dir_path):
+                        os.rmdir(dir_path)
+
+            artifact = ArtifactGarbageCollectionArtifact(
+                dry_run=dry_run,
+                runs=len(runs),
+                runs_retained=len(runs) - len(expired),
+                runs_deleted=len(expired),
+                blobs_deleted=blobs_deleted,
+                stage_cache_records_deleted=len(stage_cache_records),
+                bytes_reclaimed=bytes_reclaimed,
+                elapsed_seconds=time.perf_counter() - start
+            )
+            logging.info(f"Artifact garbage collection: {artifact}")
+            return artifact
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def status(self) -> dict:
+        """
+        Runs, blobs and disk usage of the Artifacts folder: apparent_bytes counts every file of
+        every run, disk_bytes counts every stored content once
+        """
+        try:
+            runs = self.runs()
+            run_files = [file_path for run in runs for file_path in self._files(self.run_dir(run))]
+            blobs = self._blobs()
+            inodes = {}
+            for file_path in run_files + blobs:
+                file_stat = os.stat(file_path)
+                inodes[(file_stat.st_dev, file_stat.st_ino)] = file_stat.st_size
+            return {
+                "runs": len(runs),
+                "retained_runs": self.retained_runs(),
+                "promoted_runs": self.promoted_runs(),
+                "served_run": self.served_run(),
+                "files": len(run_files),
+                "blobs": len(blobs),
+                "apparent_bytes": sum(os.path.getsize(file_path) for file_path in run_files),
+                "disk_bytes": sum(inodes.values())
+            }
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
@@ -0,0 +1,52 @@
+import sys
+from typing import Callable, Iterator, Optional
+
+import pandas as pd
+
+from networksecurity_project.constant.training_pipeline import PREDICTION_OUTPUT_COLUMN, PREDICTION_STREAM_CHUNK_SIZE
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.logging.logger import logging
+from networksecurity_project.utils.ml_utils.model.estimator import NetworkModel
+
+
+class BatchPrediction:
+    """
+    Scores a csv file in fixed size chunks, so memory stays bounded by the chunk size
+    and the first predictions are available before the whole file is parsed.
+    Every chunk is handed to observe, if given, before it is scored.
+    """
+    def __init__(self, network_model: NetworkModel, chunk_size: int = PREDICTION_STREAM_CHUNK_SIZE,
+                 observe: Optional[Callable[[pd.DataFrame], None]] = None):
+        try:
+            self.network_model = network_model
+            self.observe = observe
+            self.chunk_size = chunk_size
+            self.row_count = 0
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def predict_chunks(self, file_obj) -> Iterator[pd.DataFrame]:
+        """
+        Yields every chunk of the csv file with the prediction column added.
+        """
+        try:
+            for chunk in pd.read_csv(file_obj, chunksize=self.chunk_size):
+                if self.observe is not None:
+                    self.observe(chunk)
+                chunk[PREDICTION_OUTPUT_COLUMN] = self.network_model.predict(chunk)
+                self.row_count += len(chunk)
+                yield chunk
+            logging.info(f"Batch prediction scored {self.row_count} rows")
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def stream_csv(self, file_obj) -> Iterator[bytes]:
+        for i, chunk in enumerate(self.predict_chunks(file_obj)):
+            yield chunk.to_csv(index=False, header=(i == 0)).encode("utf-8")
+
+    def stream_ndjson(self, file_obj) -> Iterator[bytes]:
+        for chunk in self.predict_chunks(file_obj):
+            lines = chunk.to_json(orient="records", lines=True)
+            if not lines.endswith("\n"):
+                lines += "\n"
+            yield lines.encode("utf-8")
@@ -0,0 +1,313 @@
+import os, sys, time
+import secrets
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterator, List
+
+import numpy as np
+import pandas as pd
+import pymongo
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from networksecurity_project.constant.training_pipeline import (
+    BULK_LOAD_CHUNK_SIZE,
+    BULK_LOAD_BATCH_SIZE,
+    BULK_LOAD_MAX_WORKERS,
+    BULK_LOAD_PROGRESS_COLLECTION_NAME
+)
+from networksecurity_project.entity.artifact_entity import BulkLoadArtifact
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.logging.logger import logging
+from networksecurity_project.utils.main_utils.utils import read_yaml_file, write_yaml_file
+
+## server error code of a duplicate _id, what a resumed batch gets for the rows it already inserted
+DUPLICATE_KEY_ERROR_CODE = 11000
+
+
+def get_mongo_collection(mongo_db_url: str, database: str, collection: str, max_pool_size: int = BULK_LOAD_MAX_WORKERS):
+    """
+    Collection on a client whose connection pool fits the concurrent writers of the loader
+    """
+    mongo_client = pymongo.MongoClient(mongo_db_url, maxPoolSize=max_pool_size)
+    return mongo_client[database][collection]
+
+
+def row_object_id(timestamp: int, token: int, row: int) -> ObjectId:
+    """
+    Deterministic _id of a csv row: load start time, load token and row number.
+    The rows of a load are written out of order by concurrent batches, and a resumed load keeps its
+    start time, so these ids alone do not keep the order the incremental ingestion relies on: see
+    in_progress_load_floor.
+    """
+    return ObjectId(timestamp.to_bytes(4, "big") + token.to_bytes(4, "big") + row.to_bytes(4, "big"))
+
+
+def load_progress_collection(collection):
+    """
+    Collection of the in progress load markers, next to the loaded collection, None when the
+    collection has no database to hold it
+    """
+    database = getattr(collection, "database", None)
+    return None if database is None else database[BULK_LOAD_PROGRESS_COLLECTION_NAME]
+
+
+def in_progress_load_floor(collection):
+    """
+    Lowest _id of the loads into the collection that have not completed, None when there are none.
+    The incremental ingestion keeps its watermark below it: until a load completes, rows of it may
+    still be written under a lower _id than the ones already visible.
+    """
+    progress_collection = load_progress_collection(collection)
+    if progress_collection is None:
+        return None
+    markers = list(progress_collection.find({"namespace": collection.full_name}, projection={"first_id": 1}))
+    return min((marker["first_id"] for marker in markers), default=None)
+
+
+def column_values(series: pd.Series) -> list:
+    """
+    Values of a column as python objects ready for bson, None for the missing values
+    """
+    missing = series.isna().to_numpy()
+    if pd.api.types.is_integer_dtype(series.dtype):
+        values = series.to_numpy(dtype=np.int64, na_value=0).tolist()
+    else:
+        values = series.to_numpy().tolist()
+    for position in np.flatnonzero(missing):
+        values[position] = None
+    return values
+
+
+def chunk_documents(chunk: pd.DataFrame, ids: List[ObjectId]) -> list:
+    """
+    Documents of a csv chunk built column by column, without going through json
+    """
+    names = ["_id"] + [str(column) for column in chunk.columns]
+    columns = [column_values(chunk[column]) for column in chunk.columns]
+    return [dict(zip(names, row)) for row in zip(ids, *columns)]
+
+
+class MongoBulkLoader:
+    """
+    Streams a csv file into a MongoDB collection.
+
+    The file is read chunk_size rows at a time and sent as unordered insert_many batches of
+    batch_size rows, with at most max_workers batches in flight over the pooled client of the
+    collection. An InMemoryCollection can stand in for the collection.
+
+    Every row gets a deterministic _id, and the checkpoint file records the batches the server
+    acknowledged, so an interrupted load resumes after them. A batch that was in flight when the
+    load stopped is sent again and its already inserted rows are rejected as duplicates.
+
+    Until the load completes, a marker with its lowest _id stays in the progress collection of the
+    database, and the incremental ingestion does not move its watermark past it.
+    """
+    def __init__(self, collection, checkpoint_file_path: str, batch_size: int = BULK_LOAD_BATCH_SIZE,
+                 max_workers: int = BULK_LOAD_MAX_WORKERS, chunk_size: int = BULK_LOAD_CHUNK_SIZE,
+                 dtypes: dict = None):
+        try:
+            self.collection = collection
+            self.checkpoint_file_path = checkpoint_file_path
+            self.batch_size = batch_size
+            self.max_workers = max_workers
+            self.chunk_size = chunk_size
+            self.dtypes = dtypes
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def _source(self, file_path: str) -> dict:
+        stat = os.stat(file_path)
+        return {
+            "file_path": os.path.abspath(file_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "namespace": getattr(self.collection, "full_name", None)
+        }
+
+    def _read_checkpoint(self, source: dict):
+        """
+        Returns the checkpoint of an earlier load of the same file into the same collection, or None
+        """
+        if not os.path.exists(self.checkpoint_file_path):
+            return None
+        checkpoint = read_yaml_file(self.checkpoint_file_path)
+        if not checkpoint or checkpoint.get("source") != source:
+            logging.info(f"Checkpoint {self.checkpoint_file_path} belongs to another load, starting over")
+            return None
+        return checkpoint
+
+    def _write_checkpoint(self, checkpoint: dict):
+        #written to a temporary file and renamed over the old one, a crash leaves one of the two
+        write_yaml_file(self.checkpoint_file_path, checkpoint)
+
+    def _marker_id(self, checkpoint: dict) -> str:
+        return f"{checkpoint['source']['namespace']}:{checkpoint['id_timestamp']}:{checkpoint['id_token']}"
+
+    def _mark_in_progress(self, checkpoint: dict):
+        """
+        Records the load as in progress before any of its rows is written
+        """
+        progress_collection = load_progress_collection(self.collection)
+        if progress_collection is None:
+            return
+        marker = {
+            "_id": self._marker_id(checkpoint),
+            "namespace": checkpoint["source"]["namespace"],
+            "file_path": checkpoint["source"]["file_path"],
+            "first_id": row_object_id(checkpoint["id_timestamp"], checkpoint["id_token"], 0),
+            "started_at": checkpoint["id_timestamp"]
+        }
+        progress_collection.replace_one({"_id": marker["_id"]}, marker, upsert=True)
+
+    def _clear_in_progress(self, checkpoint: dict):
+        progress_collection = load_progress_collection(self.collection)
+        if progress_collection is not None:
+            progress_collection.delete_one({"_id": self._marker_id(checkpoint)})
+
+    def _abandon_checkpoint(self):
+        """
+        Clears the marker of the load recorded in the checkpoint file, before starting over
+        """
+        if not os.path.exists(self.checkpoint_file_path):
+            return
+        checkpoint = read_yaml_file(self.checkpoint_file_path)
+        if checkpoint and not checkpoint.get("completed") and \
+                checkpoint["source"].get("namespace") == getattr(self.collection, "full_name", None):
+            logging.info(f"Abandoning the unfinished load of {checkpoint['source']['file_path']}")
+            self._clear_in_progress(checkpoint)
+
+    def _read_chunks(self, file_path: str, start_row: int) -> Iterator[pd.DataFrame]:
+        #chunks are whole batches, so the batch boundaries are the same on every run
+        chunk_size = max(1, self.chunk_size // self.batch_size) * self.batch_size
+        skiprows = range(1, start_row + 1) if start_row else None
+        dtypes = None
+        if self.dtypes:
+            dtypes = {column: "Int64" if dtype.startswith("int") else dtype for column, dtype in self.dtypes.items()}
+        return pd.read_csv(file_path, chunksize=chunk_size, skiprows=skiprows, dtype=dtypes, na_values=["na"])
+
+    def _insert_batch(self, batch_index: int, documents: list):
+        try:
+            result = self.collection.insert_many(documents, ordered=False)
+            return batch_index, len(result.inserted_ids), 0
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            if e.details.get("writeConcernErrors") or \
+                    any(error.get("code") != DUPLICATE_KEY_ERROR_CODE for error in write_errors):
+                raise
+            return batch_index, e.details.get("nInserted", len(documents) - len(write_errors)), len(write_errors)
+
+    def load(self, file_path: str, restart: bool = False) -> BulkLoadArtifact:
+        """
+        Loads the csv file, resuming from the checkpoint unless restart is set.
+        """
+        try:
+            start = time.perf_counter()
+            source = self._source(file_path)
+            checkpoint = None if restart else self._read_checkpoint(source)
+            if checkpoint is None:
+                self._abandon_checkpoint()
+                checkpoint = {
+                    "source": source,
+                    "batch_size": self.batch_size,
+                    "id_timestamp": int(time.time()),
+                    "id_token": secrets.randbits(32),
+                    "rows_committed": 0,
+                    "committed_batches": {},
+                    "completed": False
+                }
+                self._write_checkpoint(checkpoint)
+            elif checkpoint["completed"]:
+                logging.info(f"{file_path} was already loaded, see {self.checkpoint_file_path}")
+            else:
+                logging.info(f"Resuming the load of {file_path} after row {checkpoint['rows_committed']}")
+            ## the batch layout of a resumed load is the one of the checkpoint
+            self.batch_size = checkpoint["batch_size"]
+
+            rows_resumed = checkpoint["rows_committed"] + sum(checkpoint["committed_batches"].values())
+            stats = {"rows_inserted": 0, "rows_duplicate": 0, "batches": 0}
+            if not checkpoint["completed"]:
+                self._mark_in_progress(checkpoint)
+                self._run(file_path, checkpoint, stats)
+                checkpoint["completed"] = True
+                self._write_checkpoint(checkpoint)
+                self._clear_in_progress(checkpoint)
+
+            elapsed = time.perf_counter() - start
+            rows_per_second = stats["rows_inserted"] / elapsed if elapsed else 0.0
+            logging.info(f"Loaded {stats['rows_inserted']} rows of {file_path} in {elapsed:.2f} seconds, "
+                         f"{rows_per_second:.0f} rows/s, {stats['rows_duplicate']} duplicates")
+            return BulkLoadArtifact(
+                file_path=file_path,
+                checkpoint_file_path=self.checkpoint_file_path,
+                rows_inserted=stats["rows_inserted"],
+                rows_duplicate=stats["rows_duplicate"],
+                rows_resumed=rows_resumed,
+                batches=stats["batches"],
+                elapsed_seconds=elapsed,
+                rows_per_second=rows_per_second
+            )
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def _commit(self, checkpoint: dict, batch_index: int, n_rows: int):
+        """
+        Records an acknowledged batch and moves rows_committed over the batches done in a row,
+        only the batches acknowledged out of order stay listed in the checkpoint
+        """
+        committed = checkpoint["committed_batches"]
+        committed[batch_index] = n_rows
+        rows_committed = checkpoint["rows_committed"]
+        #a partial batch is the last one of the file, nothing can follow it
+        while rows_committed % self.batch_size == 0 and rows_committed // self.batch_size in committed:
+            rows_committed += committed.pop(rows_committed // self.batch_size)
+        checkpoint["rows_committed"] = rows_committed
+        self._write_checkpoint(checkpoint)
+
+    def _run(self, file_path: str, checkpoint: dict, stats: dict):
+        skipped_batches = set(checkpoint["committed_batches"])
+        max_in_flight = self.max_workers * 2
+        in_flight = set()
+        row = checkpoint["rows_committed"]
+        last_report = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bulk-loader")
+        try:
+            def collect(done):
+                #the acknowledged batches are committed even when one of them failed
+                error = None
+                for future in done:
+                    if future.exception() is not None:
+                        error = error or future.exception()
+                        continue
+                    batch_index, n_inserted, n_duplicate = future.result()
+                    stats["rows_inserted"] += n_inserted
+                    stats["rows_duplicate"] += n_duplicate
+                    stats["batches"] += 1
+                    self._commit(checkpoint, batch_index, n_inserted + n_duplicate)
+                if error is not None:
+                    raise error
+
+            for chunk in self._read_chunks(file_path, row):
+                for offset in range(0, len(chunk), self.batch_size):
+                    batch = chunk.iloc[offset:offset + self.batch_size]
+                    batch_row = row + offset
+                    batch_index = batch_row // self.batch_size
+                    if batch_index in skipped_batches:
+                        continue
+                    ids = [row_object_id(checkpoint["id_timestamp"], checkpoint["id_token"], batch_row + position)
+                           for position in range(len(batch))]
+                    documents = chunk_documents(batch, ids)
+                    #bounded queue of batches, the reader waits for the writers instead of buffering the file
+                    while len(in_flight) >= max_in_flight:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    in_flight.add(executor.submit(self._insert_batch, batch_index, documents))
+                row += len(chunk)
+
+                if time.perf_counter() - last_report >= 5:
+                    last_report = time.perf_counter()
+                    logging.info(f"Bulk load read {row} rows, {stats['rows_inserted']} inserted")
+
+            done, in_flight = wait(in_flight)
+            collect(done)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
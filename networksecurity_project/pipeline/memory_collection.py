@@ -0,0 +1,117 @@
+import copy
+from types import SimpleNamespace
+
+from pymongo.errors import BulkWriteError
+
+from networksecurity_project.pipeline.bulk_loader import DUPLICATE_KEY_ERROR_CODE
+
+
+def _matches(document: dict, query: dict) -> bool:
+    """
+    Equality and the $gt/$gte/$lt/$lte comparisons, the query operators the pipeline uses
+    """
+    for key, condition in query.items():
+        if key not in document:
+            return False
+        value = document[key]
+        if isinstance(condition, dict):
+            for operator, operand in condition.items():
+                if operator == "$gt" and not value > operand:
+                    return False
+                if operator == "$gte" and not value >= operand:
+                    return False
+                if operator == "$lt" and not value < operand:
+                    return False
+                if operator == "$lte" and not value <= operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(document: dict, projection: dict) -> dict:
+    if not projection:
+        return copy.deepcopy(document)
+    included = [key for key, flag in projection.items() if flag and key != "_id"]
+    if included:
+        keys = included + ([] if projection.get("_id", 1) == 0 else ["_id"])
+        return {key: copy.deepcopy(document[key]) for key in keys if key in document}
+    return {key: copy.deepcopy(value) for key, value in document.items() if projection.get(key, 1)}
+
+
+class InMemoryDatabase:
+    """
+    Collections by name, created on first use like the ones of a MongoDB database
+    """
+    def __init__(self, name: str = "test"):
+        self.name = name
+        self.collections = {}
+
+    def __getitem__(self, collection_name: str) -> "InMemoryCollection":
+        if collection_name not in self.collections:
+            self.collections[collection_name] = InMemoryCollection(collection_name, database=self)
+        return self.collections[collection_name]
+
+
+class InMemoryCollection:
+    """
+    In memory stand-in for the parts of a pymongo collection the bulk loader and the ingestion use.
+
+    Documents are unique by _id: insert_many rejects the duplicates with the BulkWriteError of the
+    server, and with ordered=False the other documents of the batch are still inserted.
+    """
+    def __init__(self, name: str = "collection", database: InMemoryDatabase = None):
+        self.name = name
+        self.database = database if database is not None else InMemoryDatabase()
+        self.database.collections.setdefault(name, self)
+        self.documents = {}
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.database.name}.{self.name}"
+
+    def insert_many(self, documents: list, ordered: bool = True):
+        inserted_ids, write_errors = [], []
+        for index, document in enumerate(documents):
+            if document["_id"] in self.documents:
+                write_errors.append({"index": index, "code": DUPLICATE_KEY_ERROR_CODE,
+                                     "errmsg": f"E11000 duplicate key error, _id {document['_id']}"})
+                if ordered:
+                    break
+                continue
+            self.documents[document["_id"]] = copy.deepcopy(document)
+            inserted_ids.append(document["_id"])
+        if write_errors:
+            raise BulkWriteError({"writeErrors": write_errors, "writeConcernErrors": [],
+                                  "nInserted": len(inserted_ids)})
+        return SimpleNamespace(inserted_ids=inserted_ids)
+
+    def replace_one(self, query: dict, document: dict, upsert: bool = False):
+        matched = [key for key, stored in self.documents.items() if _matches(stored, query)]
+        if matched:
+            document = dict(document, _id=matched[0])
+        elif not upsert:
+            return SimpleNamespace(matched_count=0)
+        else:
+            document = dict(document, _id=document.get("_id", query.get("_id")))
+        self.documents[document["_id"]] = copy.deepcopy(document)
+        return SimpleNamespace(matched_count=len(matched[:1]))
+
+    def delete_one(self, query: dict):
+        for key, stored in self.documents.items():
+            if _matches(stored, query):
+                del self.documents[key]
+                return SimpleNamespace(deleted_count=1)
+        return SimpleNamespace(deleted_count=0)
+
+    def find(self, filter: dict = None, projection: dict = None, sort: list = None, batch_size: int = None):
+        documents = [document for document in self.documents.values() if _matches(document, filter or {})]
+        for key, direction in reversed(sort or []):
+            documents.sort(key=lambda document: document[key], reverse=direction < 0)
+        return iter([_project(document, projection) for document in documents])
+
+    def find_one(self, filter: dict = None, projection: dict = None, sort: list = None):
+        return next(self.find(filter, projection=projection, sort=sort), None)
+
+    def estimated_document_count(self) -> int:
+        return len(self.documents)
@@ -0,0 +1,210 @@
+import sys, time
+import asyncio
+from typing import Callable, List, Optional
+
+import pandas as pd
+
+from networksecurity_project.constant.training_pipeline import PREDICTION_BATCH_MAX_SIZE, PREDICTION_BATCH_MAX_WAIT_MS
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.logging.logger import logging
+from networksecurity_project.monitoring.metrics import (
+    PREDICTION_BATCH_ROWS,
+    PREDICTION_BATCH_REQUESTS,
+    PREDICTION_QUEUE_WAIT_SECONDS
+)
+from networksecurity_project.utils.ml_utils.model.estimator import NetworkModel
+
+
+class InvalidRecordsError(Exception):
+    """
+    Records whose fields are not the features of the served model, one error per bad record
+    """
+    def __init__(self, errors: List[dict]):
+        super().__init__(f"{len(errors)} records do not match the model features")
+        self.errors = errors
+
+
+def validate_records(records: List[dict], feature_names) -> List[dict]:
+    """
+    Errors of the records with fields the model does not know or without some of its features.
+    A feature that is present with a null value is a missing value for the imputer.
+    """
+    expected = set(feature_names)
+    errors = []
+    for position, record in enumerate(records):
+        unknown_fields = [name for name in record if name not in expected]
+        missing_fields = [name for name in feature_names if name not in record]
+        if unknown_fields or missing_fields:
+            errors.append({"record": position, "unknown_fields": unknown_fields, "missing_fields": missing_fields})
+    return errors
+
+
+class PredictionBatcher:
+    """
+    Dynamic micro batching for small prediction requests.
+
+    Concurrent requests are queued and collected until the batch holds max_batch_size rows
+    or max_wait_ms passed since the first request of the batch, then a single vectorized
+    NetworkModel.predict call scores the whole batch and every caller gets its own rows back.
+    A request is never split, so a batch can go over max_batch_size by one request.
+    The features of every batch are handed to observe, if given, before they are scored.
+
+    The records of a request are checked against the model features before they are queued.
+    When a batch fails its requests are scored one by one, so a bad request only fails itself.
+    The model is always resolved in a worker thread, a reload never blocks the event loop.
+    """
+    def __init__(self, get_model: Callable[[], NetworkModel], max_batch_size: int = PREDICTION_BATCH_MAX_SIZE,
+                 max_wait_ms: float = PREDICTION_BATCH_MAX_WAIT_MS, observe: Optional[Callable[[pd.DataFrame], None]] = None):
+        try:
+            self.get_model = get_model
+            self.observe = observe
+            self.max_batch_size = max_batch_size
+            self.max_wait = max_wait_ms / 1000.0
+
+            self._queue = None
+            self._worker = None
+
+            self.batch_count = 0
+            self.row_count = 0
+            self.request_count = 0
+            self.max_batch_rows = 0
+            self.last_batch_rows = 0
+            self.total_queue_wait = 0.0
+            self.max_queue_wait = 0.0
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    async def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def predict(self, records: List[dict]) -> list:
+        """
+        Queue the records for the next batch and wait for their predictions.
+        """
+        if self._worker is None:
+            raise NetworkSecurityException(Exception("Prediction batcher is not running"), sys) # type: ignore
+        loop = asyncio.get_running_loop()
+        network_model = await loop.run_in_executor(None, self.get_model)
+        feature_names = getattr(network_model.preprocessor, "feature_names_in_", None)
+        if feature_names is not None:
+            errors = validate_records(records, [str(name) for name in feature_names])
+            if errors:
+                raise InvalidRecordsError(errors)
+        future = loop.create_future()
+        await self._queue.put((records, future, time.perf_counter()))
+        return await future
+
+    async def _collect_batch(self) -> list:
+        batch = [await self._queue.get()]
+        n_rows = len(batch[0][0])
+        ## the wait is counted from the arrival of the oldest request in the batch
+        deadline = batch[0][2] + self.max_wait
+        while n_rows < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                ## past the deadline only the requests that are already queued are taken
+                if timeout <= 0:
+                    item = self._queue.get_nowait()
+                else:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            batch.append(item)
+            n_rows += len(item[0])
+        return batch
+
+    def _predict_records(self, network_model: NetworkModel, records: List[dict]) -> list:
+        dataframe = pd.DataFrame.from_records(records)
+        ## the records were validated, this only puts the columns in the order of the training features
+        feature_names = getattr(network_model.preprocessor, "feature_names_in_", None)
+        if feature_names is not None:
+            dataframe = dataframe.reindex(columns=list(feature_names))
+        if self.observe is not None:
+            self.observe(dataframe)
+        return network_model.predict(dataframe).tolist()
+
+    def _predict_batch(self, requests: List[List[dict]]) -> list:
+        """
+        Predictions of every request of the batch, or the exception of the requests that failed
+        """
+        network_model = self.get_model()
+        try:
+            predictions = self._predict_records(network_model, [record for records in requests for record in records])
+        except Exception as e:
+            logging.info(f"Prediction batch of {len(requests)} requests failed, scoring them one by one: {e}")
+        else:
+            offset, results = 0, []
+            for records in requests:
+                results.append(predictions[offset: offset + len(records)])
+                offset += len(records)
+            return results
+
+        results = []
+        for records in requests:
+            try:
+                results.append(self._predict_records(network_model, records))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            started = time.perf_counter()
+            records = [record for item in batch for record in item[0]]
+
+            queue_waits = [started - enqueued for _, _, enqueued in batch]
+            self.batch_count += 1
+            self.request_count += len(batch)
+            self.row_count += len(records)
+            self.last_batch_rows = len(records)
+            self.max_batch_rows = max(self.max_batch_rows, len(records))
+            self.total_queue_wait += sum(queue_waits)
+            self.max_queue_wait = max(self.max_queue_wait, max(queue_waits))
+            PREDICTION_BATCH_ROWS.observe(len(records))
+            PREDICTION_BATCH_REQUESTS.observe(len(batch))
+            for queue_wait in queue_waits:
+                PREDICTION_QUEUE_WAIT_SECONDS.observe(queue_wait)
+
+            try:
+                ## the model call runs in a thread so the event loop keeps accepting requests
+                results = await loop.run_in_executor(None, self._predict_batch, [item[0] for item in batch])
+            except Exception as e:
+                ## the model could not be loaded, no request of the batch can be scored
+                logging.info(f"Prediction batch of {len(records)} rows failed: {e}")
+                results = [e] * len(batch)
+
+            for (_, future, _), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def status(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_size": self._queue.qsize() if self._queue is not None else 0,
+            "batch_count": self.batch_count,
+            "request_count": self.request_count,
+            "row_count": self.row_count,
+            "last_batch_rows": self.last_batch_rows,
+            "max_batch_rows": self.max_batch_rows,
+            "mean_batch_rows": self.row_count / self.batch_count if self.batch_count else 0.0,
+            "mean_queue_wait_ms": 1000.0 * self.total_queue_wait / self.request_count if self.request_count else 0.0,
+            "max_queue_wait_ms": 1000.0 * self.max_queue_wait
+        }
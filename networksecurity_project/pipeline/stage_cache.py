@@ -0,0 +1,148 @@
+import os, sys
+import json
+import hashlib
+from dataclasses import asdict
+from datetime import datetime
+from typing import List, Optional
+
+from networksecurity_project.constant import training_pipeline
+from networksecurity_project.entity.config_entity import StageCacheConfig
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.logging.logger import logging
+from networksecurity_project.utils.main_utils.utils import read_yaml_file, write_yaml_file
+
+## constants every stage depends on, on top of the constants named after the stage
+COMMON_CONSTANTS = ["TARGET_COLUMN", "DATA_FILE_FORMAT", "DATA_EXPORT_CSV", "DATA_COMPACT_DTYPE",
+                    "DATA_COMPACT_MISSING_VALUE", "SCHEMA_FILE_PATH", "STAGE_CACHE_VERSION"]
+STAGE_CONSTANT_PREFIXES = {
+    "ingestion": ["DATA_INGESTION_", "OUT_OF_CORE_"],
+    "validation": ["DATA_VALIDATION_", "OUT_OF_CORE_"],
+    "transformation": ["DATA_TRANSFORMATION_", "PREPROCESSING_", "OUT_OF_CORE_"]
+}
+
+
+def file_digest(file_path: str) -> str:
+    """
+    sha256 of a file, or of the names and contents of the files of a folder, the shards of the out of core mode
+    """
+    digest = hashlib.sha256()
+    if os.path.isdir(file_path):
+        for name in sorted(os.listdir(file_path)):
+            digest.update(name.encode("utf-8"))
+            digest.update(file_digest(os.path.join(file_path, name)).encode("utf-8"))
+        return digest.hexdigest()
+    with open(file_path, "rb") as file_obj:
+        for block in iter(lambda: file_obj.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class StageCache:
+    """
+    Content addressed cache of the pipeline stage artifacts.
+
+    The key of a stage is a hash of its input files, its config object and the constants it
+    depends on. The paths of the config are taken relative to the run folder, so two runs
+    with the same inputs get the same key. A hit returns the artifact of the earlier run,
+    as long as all the files it points to are still there with the same size.
+
+    With an artifact store the files of a hit are linked into the current run and the record
+    is moved to it, so every run folder holds all its artifacts and older runs can be deleted
+    by the retention policy without breaking the cache.
+    """
+    def __init__(self, stage_cache_config: StageCacheConfig, artifact_store=None):
+        try:
+            self.stage_cache_config = stage_cache_config
+            self.artifact_store = artifact_store
+            self.enabled = stage_cache_config.enabled
+            self.cache_dir = stage_cache_config.cache_dir
+            #stages served from the cache in this run
+            self.hits = []
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def _config_values(self, config) -> dict:
+        values = {}
+        for name, value in sorted(vars(config).items()):
+            if isinstance(value, str):
+                value = value.replace(self.stage_cache_config.artifact_dir, "{artifact_dir}")
+            values[name] = value
+        return values
+
+    @staticmethod
+    def _constant_values(stage: str) -> dict:
+        prefixes = tuple(STAGE_CONSTANT_PREFIXES.get(stage, []))
+        return {name: value for name, value in sorted(vars(training_pipeline).items())
+                if name.isupper() and (name in COMMON_CONSTANTS or (prefixes and name.startswith(prefixes)))}
+
+    def fingerprint(self, stage: str, config, input_file_paths: List[str] = (), source: Optional[dict] = None) -> str:
+        try:
+            key = {
+                "stage": stage,
+                "config": self._config_values(config),
+                "constants": self._constant_values(stage),
+                "inputs": [file_digest(file_path) for file_path in input_file_paths],
+                "source": source
+            }
+            return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def _record_path(self, stage: str, fingerprint: str) -> str:
+        return os.path.join(self.cache_dir, stage, f"{fingerprint}.yaml")
+
+    @staticmethod
+    def _output_files(artifact) -> dict:
+        outputs = {}
+        for value in asdict(artifact).values():
+            if not isinstance(value, str):
+                continue
+            if os.path.isfile(value):
+                outputs[value] = os.path.getsize(value)
+            elif os.path.isdir(value):
+                ## the shard folders of the out of core mode, every shard is checked on a hit
+                for name in sorted(os.listdir(value)):
+                    file_path = os.path.join(value, name)
+                    if os.path.isfile(file_path):
+                        outputs[file_path] = os.path.getsize(file_path)
+        return outputs
+
+    def get(self, stage: str, fingerprint: str, artifact_class):
+        """
+        Returns the cached artifact of the stage, or None on a miss
+        """
+        try:
+            if not self.enabled:
+                return None
+            record_path = self._record_path(stage, fingerprint)
+            if not os.path.exists(record_path):
+                return None
+            record = read_yaml_file(record_path)
+            for file_path, size in record["outputs"].items():
+                if not os.path.isfile(file_path) or os.path.getsize(file_path) != size:
+                    logging.info(f"Cached {stage} artifact is missing {file_path}, running the stage")
+                    return None
+            logging.info(f"Reusing the {stage} artifact of {record['artifact_dir']}")
+            self.hits.append(stage)
+            artifact = record["artifact"]
+            if self.artifact_store is not None and self.artifact_store.enabled and \
+                    os.path.normpath(record["artifact_dir"]) != os.path.normpath(self.stage_cache_config.artifact_dir):
+                artifact = self.artifact_store.relocate(artifact, record["artifact_dir"], self.stage_cache_config.artifact_dir)
+                self.put(stage, fingerprint, artifact_class(**artifact))
+            return artifact_class(**artifact)
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def put(self, stage: str, fingerprint: str, artifact):
+        try:
+            if not self.enabled:
+                return
+            write_yaml_file(self._record_path(stage, fingerprint), content={
+                "stage": stage,
+                "artifact_dir": self.stage_cache_config.artifact_dir,
+                "created_at": datetime.now().isoformat(),
+                "artifact": asdict(artifact),
+                "outputs": StageCache._output_files(artifact)
+            }, replace=True)
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
@@ -0,0 +1,258 @@
+import os, sys, time
+import signal
+import uuid
+import queue
+import threading
+import multiprocessing
+from dataclasses import dataclass, field, asdict
+from typing import Callable, List, Optional
+
+from networksecurity_project.constant.training_pipeline import TRAINING_JOB_MAX_CONCURRENT
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.logging.logger import logging
+from networksecurity_project.monitoring.metrics import TRAINING_JOB_DURATION_SECONDS
+
+TRAINING_STAGES = ["ingestion", "validation", "transformation", "trainer", "artifact_store", "sync"]
+
+
+def run_training_job(job_id: str, events):
+    """
+    Entry point of the training process. Runs the training pipeline and reports the stages
+    and the outcome back to the server through the events queue.
+    """
+    try:
+        from networksecurity_project.pipeline.training_pipeline import TrainingPipeline
+
+        train_pipeline = TrainingPipeline(progress_callback=lambda stage: events.put((job_id, "stage", stage)))
+        model_trainer_artifact = train_pipeline.run_pipeline()
+        events.put((job_id, "succeeded", {
+            "trained_model_file_path": model_trainer_artifact.trained_model_file_path,
+            "train_f1_score": float(model_trainer_artifact.train_metric_artifact.f1_score),
+            "test_f1_score": float(model_trainer_artifact.test_metric_artifact.f1_score)
+        }))
+    except Exception as e:
+        events.put((job_id, "failed", str(e)))
+
+
+def run_in_process_group(job_target: Callable, job_id: str, events):
+    """
+    Runs the job as the leader of a process group of its own, so a cancel reaches the worker
+    processes of the model search too and never the server
+    """
+    os.setsid()
+    job_target(job_id, events)
+
+
+def signal_process_group(process, sig: int):
+    """
+    Sends the signal to the process group of a training process, or to the process alone when
+    it did not make its group yet, before any worker of it was started
+    """
+    try:
+        os.killpg(process.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        if process.is_alive():
+            os.kill(process.pid, sig)
+
+
+@dataclass
+class TrainingJob:
+    job_id: str
+    status: str = "pending"
+    stage: Optional[str] = None
+    stages_completed: List[str] = field(default_factory=list)
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    result: Optional[dict] = None
+
+
+class TrainingJobManager:
+    """
+    Runs training pipelines in separate processes so the serving event loop is never blocked.
+
+    Submitted jobs wait in a queue until one of the max_concurrent slots is free. A monitor
+    thread collects the stage events sent by the training processes, notices processes that
+    finished and starts the next queued job.
+
+    The training processes are not daemonic, so the model search can start its own worker
+    processes. Every training runs in a process group of its own, which cancel and stop
+    terminate as a whole, workers included, before joining the training process. The lock only guards the job
+    state: the joins and the success callback run after it is released, so submit and cancel
+    never wait on them.
+    """
+    def __init__(self, max_concurrent: int = TRAINING_JOB_MAX_CONCURRENT, on_success: Callable[[], None] = None,
+                 job_target: Callable = run_training_job):
+        try:
+            self.max_concurrent = max_concurrent
+            self.on_success = on_success
+            self.job_target = job_target
+
+            #spawn gives the training a clean interpreter, forking a threaded server is not safe
+            self._context = multiprocessing.get_context("spawn")
+            self._events = None
+            self._lock = threading.Lock()
+            self._stop_event = threading.Event()
+            self._monitor = None
+
+            self.jobs = {}
+            self._pending = []
+            self._processes = {}
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def start(self):
+        if self._monitor is None or not self._monitor.is_alive():
+            self._events = self._context.Queue()
+            self._stop_event.clear()
+            self._monitor = threading.Thread(target=self._watch, name="training-job-monitor", daemon=True)
+            self._monitor.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._monitor is not None:
+            self._monitor.join(timeout=5)
+            self._monitor = None
+        with self._lock:
+            processes = [self._terminate(job_id, "cancelled", "Server shut down") for job_id in list(self._processes)]
+        self._join(processes)
+
+    def submit(self) -> TrainingJob:
+        try:
+            job = TrainingJob(job_id=uuid.uuid4().hex)
+            with self._lock:
+                self.jobs[job.job_id] = job
+                self._pending.append(job.job_id)
+                self._start_pending()
+            logging.info(f"Training job {job.job_id} submitted")
+            return job
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def get(self, job_id: str) -> Optional[TrainingJob]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[TrainingJob]:
+        processes = []
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status == "pending":
+                self._pending.remove(job_id)
+                job.status = "cancelled"
+                job.finished_at = time.time()
+            elif job.status == "running":
+                processes.append(self._terminate(job_id, "cancelled", None))
+                self._start_pending()
+        self._join(processes)
+        return job
+
+    def status(self, job_id: str) -> Optional[dict]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        job_status = asdict(job)
+        job_status["stages"] = TRAINING_STAGES
+        job_status["progress"] = len(job.stages_completed) / len(TRAINING_STAGES)
+        return job_status
+
+    def _start_pending(self):
+        while self._pending and len(self._processes) < self.max_concurrent:
+            job_id = self._pending.pop(0)
+            process = self._context.Process(target=run_in_process_group, args=(self.job_target, job_id, self._events),
+                                            name=f"training-job-{job_id}", daemon=False)
+            process.start()
+            self._processes[job_id] = process
+            job = self.jobs[job_id]
+            job.status = "running"
+            job.started_at = time.time()
+            logging.info(f"Training job {job_id} started in process {process.pid}")
+
+    def _terminate(self, job_id: str, status: str, error: Optional[str]):
+        """
+        Sends SIGTERM to the process group of the training and closes its job, the caller joins
+        the returned process once the lock is released
+        """
+        process = self._processes.pop(job_id)
+        if process.is_alive():
+            signal_process_group(process, signal.SIGTERM)
+        self._finish(self.jobs[job_id], status, error=error)
+        return process
+
+    @staticmethod
+    def _join(processes):
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                signal_process_group(process, signal.SIGKILL)
+                process.join()
+
+    def _finish(self, job: TrainingJob, status: str, error: Optional[str] = None, result: Optional[dict] = None):
+        if job.status in ("succeeded", "failed", "cancelled"):
+            return
+        if status == "succeeded" and job.stage is not None and job.stage not in job.stages_completed:
+            job.stages_completed.append(job.stage)
+        job.status = status
+        job.error = error
+        job.result = result
+        job.finished_at = time.time()
+        if job.started_at is not None:
+            TRAINING_JOB_DURATION_SECONDS.labels(status=status).observe(job.finished_at - job.started_at)
+        logging.info(f"Training job {job.job_id} {status}")
+
+    def _handle_event(self, job_id: str, event: str, payload) -> List[str]:
+        """
+        Updates the job, returns the ids of the jobs that succeeded so the caller runs the
+        success callback outside of the lock
+        """
+        job = self.jobs.get(job_id)
+        if job is None or job.status != "running":
+            return []
+        if event == "stage":
+            if job.stage is not None:
+                job.stages_completed.append(job.stage)
+            job.stage = payload
+        elif event == "succeeded":
+            self._finish(job, "succeeded", result=payload)
+            return [job_id]
+        elif event == "failed":
+            self._finish(job, "failed", error=payload)
+        return []
+
+    def _run_success_callbacks(self, job_ids: List[str]):
+        if self.on_success is None:
+            return
+        for job_id in job_ids:
+            try:
+                self.on_success()
+            except Exception as e:
+                logging.info(f"Training job {job_id} success callback failed: {e}")
+
+    def _watch(self):
+        while not self._stop_event.is_set():
+            succeeded, exited = [], []
+            try:
+                job_id, event, payload = self._events.get(timeout=0.5)
+                with self._lock:
+                    succeeded += self._handle_event(job_id, event, payload)
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                for job_id, process in list(self._processes.items()):
+                    if process.is_alive():
+                        continue
+                    #drain what the process sent before it exited, then close the job
+                    try:
+                        while True:
+                            succeeded += self._handle_event(*self._events.get_nowait())
+                    except queue.Empty:
+                        pass
+                    exited.append(self._processes.pop(job_id))
+                    self._finish(self.jobs[job_id], "failed", error=f"Training process exited with code {process.exitcode}")
+                self._start_pending()
+
+            self._join(exited)
+            self._run_success_callbacks(succeeded)
@@ -1,4 +1,6 @@
 import os, sys
+import shutil
+from dataclasses import asdict
 
 from networksecurity_project.exception.exception import NetworkSecurityException
 from networksecurity_project.logging.logger import logging
@@ -13,30 +15,59 @@ from networksecurity_project.entity.config_entity import (
     DataIngestionConfig,
     DataValidationConfig,
     DataTransformationConfig,
-    ModelTrainerConfig
+    ModelTrainerConfig,
+    StageCacheConfig,
+    SyncConfig,
+    ArtifactStoreConfig
 )
 
 from networksecurity_project.entity.artifact_entity import (
     DataIngestionArtifact,
     DataValidationArtifact,
     DataTransformationArtifact,
-    ModelTrainerArtifact
+    ModelTrainerArtifact,
+    SyncArtifact
 )
 
-from networksecurity_project.constant.training_pipeline import TRAINING_BUCKET_NAME
+from networksecurity_project.constant.training_pipeline import TRAINING_BUCKET_NAME, SCHEMA_FILE_PATH
+from networksecurity_project.cloud.object_store import get_object_store
 from networksecurity_project.cloud.s3_syncer import S3Sync
+from networksecurity_project.pipeline.stage_cache import StageCache
+from networksecurity_project.pipeline.artifact_store import ArtifactStore
+from networksecurity_project.monitoring.telemetry import PipelineTelemetry, count_rows
+from networksecurity_project.utils.main_utils.utils import load_object, save_object
 
 class TrainingPipeline:
-    def __init__(self):
+    def __init__(self, progress_callback=None):
         self.training_pipeline_config = TrainingPipelineConfig()
-        self.s3_sync = S3Sync()
+        sync_config = SyncConfig(self.training_pipeline_config)
+        self.s3_sync = S3Sync(store=get_object_store(sync_config.local_root), max_workers=sync_config.max_workers,
+                              multipart_threshold=sync_config.multipart_threshold, part_size=sync_config.part_size,
+                              hash_cache_file_path=sync_config.hash_cache_file_path)
+        self.artifact_store_config = ArtifactStoreConfig(self.training_pipeline_config)
+        self.artifact_store = ArtifactStore(self.artifact_store_config)
+        self.stage_cache = StageCache(StageCacheConfig(self.training_pipeline_config), artifact_store=self.artifact_store)
+        self.telemetry = PipelineTelemetry(run_id=self.training_pipeline_config.timestamp)
+        self.ingestion_source = None
+        #called with the stage name before each stage starts, used to report job progress
+        self.progress_callback = progress_callback
+
+    def report_stage(self, stage: str):
+        if self.progress_callback is not None:
+            self.progress_callback(stage)
 
     def start_data_ingestion(self):
         try:
             self.data_ingestion_config = DataIngestionConfig(training_pipeline_config=self.training_pipeline_config)
             logging.info("Start data Ingestion")
             data_ingestion= DataIngestion(data_ingestion_config=self.data_ingestion_config)
-            data_ingestion_artifact = data_ingestion.initiate_data_ingestion()
+            self.ingestion_source = data_ingestion.source_fingerprint()
+            fingerprint = self.stage_cache.fingerprint("ingestion", self.data_ingestion_config, [SCHEMA_FILE_PATH],
+                                                       source=self.ingestion_source)
+            data_ingestion_artifact = self.stage_cache.get("ingestion", fingerprint, DataIngestionArtifact)
+            if data_ingestion_artifact is None:
+                data_ingestion_artifact = data_ingestion.initiate_data_ingestion()
+                self.stage_cache.put("ingestion", fingerprint, data_ingestion_artifact)
             logging.info(f"Data Ingestion completed and artifact: {data_ingestion_artifact}")
             return data_ingestion_artifact
 
@@ -47,8 +78,17 @@ class TrainingPipeline:
         try:
             self.data_validation_config = DataValidationConfig(self.training_pipeline_config)
             logging.info("Start data validation")
-            data_validation = DataValidation(data_ingestion_artifact=data_ingestion_artifact, data_validation_config=self.data_validation_config)
-            data_validation_artifact = data_validation.initiate_data_validation()
+            fingerprint = self.stage_cache.fingerprint("validation", self.data_validation_config, [
+                SCHEMA_FILE_PATH, data_ingestion_artifact.trained_file_path, data_ingestion_artifact.test_file_path])
+            data_validation_artifact = self.stage_cache.get("validation", fingerprint, DataValidationArtifact)
+            if data_validation_artifact is None:
+                data_validation = DataValidation(data_ingestion_artifact=data_ingestion_artifact, data_validation_config=self.data_validation_config)
+                data_validation_artifact = data_validation.initiate_data_validation()
+                self.stage_cache.put("validation", fingerprint, data_validation_artifact)
+            else:
+                ## the served model is compared with the drift baseline of its own train split
+                os.makedirs(os.path.dirname(self.data_validation_config.final_drift_baseline_file_path), exist_ok=True)
+                shutil.copyfile(data_validation_artifact.drift_baseline_file_path, self.data_validation_config.final_drift_baseline_file_path)
             logging.info(f"Data Validation Completed and artifact: {data_validation_artifact}")
             return data_validation_artifact
         
@@ -59,8 +99,20 @@ class TrainingPipeline:
         try:
             self.data_transformation_config = DataTransformationConfig(self.training_pipeline_config)
             logging.info("Start data transformation")
-            data_transformation = DataTransformation(data_validation_artifact=data_validation_artifact, data_transformation_config=self.data_transformation_config)
-            data_transformation_artifact = data_transformation.initiate_data_transformation()
+            fingerprint = self.stage_cache.fingerprint("transformation", self.data_transformation_config, [
+                SCHEMA_FILE_PATH, data_validation_artifact.valid_train_file_path, data_validation_artifact.valid_test_file_path])
+            data_transformation_artifact = self.stage_cache.get("transformation", fingerprint, DataTransformationArtifact)
+            if data_transformation_artifact is None:
+                data_transformation = DataTransformation(data_validation_artifact=data_validation_artifact, data_transformation_config=self.data_transformation_config)
+                data_transformation_artifact = data_transformation.initiate_data_transformation()
+                self.stage_cache.put("transformation", fingerprint, data_transformation_artifact)
+            else:
+                ## the final model folder must get the preprocessor the trainer is about to be paired with
+                save_object(self.data_transformation_config.final_preprocessor_file_path,
+                            load_object(data_transformation_artifact.transformed_object_file_path))
+                if os.path.exists(data_transformation_artifact.transformed_index_object_file_path):
+                    save_object(self.data_transformation_config.final_preprocessor_index_file_path,
+                                load_object(data_transformation_artifact.transformed_index_object_file_path))
             logging.info(f"Data transformation Completed and artifact: {data_transformation_artifact}")
             return data_transformation_artifact
         
@@ -73,7 +125,8 @@ class TrainingPipeline:
 
             logging.info("Start model trainer")
             model_trainer = ModelTrainer(
-                data_transformation_artifact = data_transformation_artifact, model_trainer_config=self.model_trainer_config
+                data_transformation_artifact = data_transformation_artifact, model_trainer_config=self.model_trainer_config,
+                telemetry=self.telemetry
             )
 
             model_trainer_artifact = model_trainer.initiate_model_trainer()
@@ -84,32 +137,70 @@ class TrainingPipeline:
             raise NetworkSecurityException(e, sys) # type: ignore
 
      ## local artifact is going to s3 bucket    
-    def sync_artifact_dir_to_s3(self):
+    def sync_artifact_dir_to_s3(self) -> SyncArtifact:
         try:
             aws_bucket_url = f"s3://{TRAINING_BUCKET_NAME}/artifact/{self.training_pipeline_config.timestamp}"
-            self.s3_sync.sync_folder_to_s3(folder = self.training_pipeline_config.artifact_dir,aws_bucket_url=aws_bucket_url)
+            return self.s3_sync.sync_folder_to_s3(folder = self.training_pipeline_config.artifact_dir,aws_bucket_url=aws_bucket_url)
         except Exception as e:
             raise NetworkSecurityException(e,sys) # type: ignore
         
     ## local final model is going to s3 bucket 
-    def sync_saved_model_dir_to_s3(self):
+    def sync_saved_model_dir_to_s3(self) -> SyncArtifact:
         try:
             aws_bucket_url = f"s3://{TRAINING_BUCKET_NAME}/final_model/{self.training_pipeline_config.timestamp}"
-            self.s3_sync.sync_folder_to_s3(folder = self.training_pipeline_config.model_dir,aws_bucket_url=aws_bucket_url)
+            return self.s3_sync.sync_folder_to_s3(folder = self.training_pipeline_config.model_dir,aws_bucket_url=aws_bucket_url)
         except Exception as e:
             raise NetworkSecurityException(e,sys) # type: ignore
 
+    def stage(self, stage: str):
+        """
+        Reports the stage and measures it, the record is saved with the run telemetry
+        """
+        self.report_stage(stage)
+        return self.telemetry.stage(stage)
+
     def run_pipeline(self):
         try:
-            data_ingestion_artifact = self.start_data_ingestion()
-            data_validation_artifact = self.start_data_validation(data_ingestion_artifact=data_ingestion_artifact)
-            data_transformation_artifact = self.start_data_transformation(data_validation_artifact=data_validation_artifact)
-            model_trainer_artifact = self.start_model_trainer(data_transformation_artifact=data_transformation_artifact)
-            
-            self.sync_artifact_dir_to_s3()
-            self.sync_saved_model_dir_to_s3()
+            with self.stage("ingestion") as record:
+                data_ingestion_artifact = self.start_data_ingestion()
+                record.update(rows_in=self.ingestion_source["count"] if self.ingestion_source else None,
+                              rows_out=count_rows(data_ingestion_artifact.trained_file_path, data_ingestion_artifact.test_file_path),
+                              cached="ingestion" in self.stage_cache.hits)
+            with self.stage("validation") as record:
+                data_validation_artifact = self.start_data_validation(data_ingestion_artifact=data_ingestion_artifact)
+                record.update(rows_in=count_rows(data_ingestion_artifact.trained_file_path, data_ingestion_artifact.test_file_path),
+                              rows_out=count_rows(data_validation_artifact.valid_train_file_path, data_validation_artifact.valid_test_file_path),
+                              cached="validation" in self.stage_cache.hits)
+            with self.stage("transformation") as record:
+                data_transformation_artifact = self.start_data_transformation(data_validation_artifact=data_validation_artifact)
+                record.update(rows_in=count_rows(data_validation_artifact.valid_train_file_path, data_validation_artifact.valid_test_file_path),
+                              rows_out=count_rows(data_transformation_artifact.transformed_train_file_path,
+                                                  data_transformation_artifact.transformed_test_file_path),
+                              cached="transformation" in self.stage_cache.hits)
+            with self.stage("trainer") as record:
+                model_trainer_artifact = self.start_model_trainer(data_transformation_artifact=data_transformation_artifact)
+                record.update(rows_in=count_rows(data_transformation_artifact.transformed_train_file_path,
+                                                 data_transformation_artifact.transformed_test_file_path),
+                              cached=False)
+
+            ## identical files of this run and the earlier ones are stored once before the run is synced
+            with self.stage("artifact_store") as record:
+                artifact_store_artifact = self.artifact_store.intern_run()
+                record.update(**asdict(artifact_store_artifact))
+                if self.artifact_store.enabled and self.artifact_store_config.gc_on_run:
+                    garbage_collection_artifact = self.artifact_store.collect_garbage(protect=[self.training_pipeline_config.timestamp])
+                    record.update(garbage_collection=asdict(garbage_collection_artifact))
+
+            with self.stage("sync") as record:
+                artifact_sync_artifact = self.sync_artifact_dir_to_s3()
+                model_sync_artifact = self.sync_saved_model_dir_to_s3()
+                record.update(syncs=[asdict(artifact_sync_artifact), asdict(model_sync_artifact)],
+                              bytes_transferred=artifact_sync_artifact.bytes_transferred + model_sync_artifact.bytes_transferred)
             
             return model_trainer_artifact
 
         except Exception as e:
-            raise NetworkSecurityException(e, sys) # type: ignore
\ No newline at end of file
+            raise NetworkSecurityException(e, sys) # type: ignore
+        finally:
+            ## the telemetry is kept for failed runs too
+            self.telemetry.save(self.training_pipeline_config.telemetry_file_path)
\ No newline at end of file
@@ -0,0 +1,179 @@
+import os, sys
+import glob
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.utils.main_utils.utils import save_dataframe, restore_integer_dtypes
+
+## rows are assigned to the test set by the low bits of their hash
+SPLIT_HASH_BUCKETS = 1 << 20
+
+
+def chunk_rows_for_budget(memory_budget_bytes: int, n_columns: int, bytes_per_cell: int) -> int:
+    """
+    Rows of a chunk that fit the memory budget when every cell takes bytes_per_cell while it is processed
+    """
+    return max(1, memory_budget_bytes // (bytes_per_cell * max(1, n_columns)))
+
+
+def list_shards(shard_dir: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(shard_dir, "*.parquet")))
+
+
+def shard_schema(shard_dir: str) -> Tuple[int, List[str]]:
+    """
+    Rows of all the shards of the folder and their columns, read from the parquet metadata
+    """
+    import pyarrow.parquet as pq
+    shard_files = [pq.ParquetFile(shard_file_path) for shard_file_path in list_shards(shard_dir)]
+    if not shard_files:
+        return 0, []
+    return sum(shard_file.metadata.num_rows for shard_file in shard_files), list(shard_files[0].schema_arrow.names)
+
+
+def iter_dataframe_chunks(file_path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """
+    The rows of a parquet or csv file, or of all the parquet shards of a folder, as dataframes of at most
+    chunk_rows rows, with the dtypes load_dataframe gives
+    """
+    try:
+        if os.path.isdir(file_path):
+            for shard_file_path in list_shards(file_path):
+                yield from iter_dataframe_chunks(shard_file_path, chunk_rows)
+            return
+        if not file_path.endswith(".parquet"):
+            yield from pd.read_csv(file_path, chunksize=chunk_rows)
+            return
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_rows):
+            yield restore_integer_dtypes(batch.to_pandas())
+    except Exception as e:
+        raise NetworkSecurityException(e, sys) # type: ignore
+
+
+def hash_split(dataframe: pd.DataFrame, test_ratio: float) -> np.ndarray:
+    """
+    True for the rows that go to the test set. The split is decided by a hash of the row, so it does not
+    depend on the order or the chunking of the stream, and identical rows always land on the same side.
+    """
+    hashes = pd.util.hash_pandas_object(dataframe, index=False).to_numpy()
+    return (hashes % SPLIT_HASH_BUCKETS) < int(test_ratio * SPLIT_HASH_BUCKETS)
+
+
+def reservoir_sample(chunks: Iterable[np.ndarray], sample_rows: int, seed: int = 0) -> np.ndarray:
+    """
+    Uniform sample of at most sample_rows rows of a stream of 2d arrays, in one pass and sample_rows memory
+    """
+    rng = np.random.default_rng(seed)
+    sample, seen = None, 0
+    for chunk in chunks:
+        if sample is None:
+            sample = np.empty((sample_rows, chunk.shape[1]), dtype=chunk.dtype)
+        n_fill = min(len(chunk), max(0, sample_rows - seen))
+        sample[seen:seen + n_fill] = chunk[:n_fill]
+        rest = chunk[n_fill:]
+        if len(rest):
+            ## row i of the stream replaces a random sample row with probability sample_rows / (i + 1)
+            positions = rng.integers(0, np.arange(seen + n_fill, seen + len(chunk)) + 1)
+            kept = positions < sample_rows
+            sample[positions[kept]] = rest[kept]
+        seen += len(chunk)
+    if sample is None:
+        return np.empty((0, 0))
+    return sample[:min(seen, sample_rows)]
+
+
+class ShardWriter:
+    """
+    Writes a stream of dataframes as parquet shards of chunk_rows rows, prefix00000.parquet and on
+    """
+    def __init__(self, shard_dir: str, chunk_rows: int, schema_dtypes: dict = None, prefix: str = "part_"):
+        try:
+            self.shard_dir = shard_dir
+            self.chunk_rows = chunk_rows
+            self.schema_dtypes = schema_dtypes
+            self.prefix = prefix
+            self.rows = 0
+            self.shard_file_paths = []
+            self._frames = []
+            self._buffered_rows = 0
+            os.makedirs(shard_dir, exist_ok=True)
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def write(self, dataframe: pd.DataFrame):
+        try:
+            if not len(dataframe):
+                return
+            self._frames.append(dataframe)
+            self._buffered_rows += len(dataframe)
+            while self._buffered_rows >= self.chunk_rows:
+                buffered = pd.concat(self._frames, ignore_index=True)
+                self._save(buffered.iloc[:self.chunk_rows])
+                rest = buffered.iloc[self.chunk_rows:]
+                self._frames = [rest] if len(rest) else []
+                self._buffered_rows = len(rest)
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def _save(self, dataframe: pd.DataFrame):
+        shard_file_path = os.path.join(self.shard_dir, f"{self.prefix}{len(self.shard_file_paths):05d}.parquet")
+        save_dataframe(shard_file_path, dataframe, schema_dtypes=self.schema_dtypes)
+        self.shard_file_paths.append(shard_file_path)
+        self.rows += len(dataframe)
+
+    def close(self) -> List[str]:
+        try:
+            if self._buffered_rows:
+                self._save(pd.concat(self._frames, ignore_index=True))
+                self._frames, self._buffered_rows = [], 0
+            return self.shard_file_paths
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+
+class NumpyArrayWriter:
+    """
+    Writes a .npy file of a known shape chunk by chunk, without the whole array in memory.
+    The file is written next to its path and moved in place by close, once every row is there.
+    """
+    def __init__(self, file_path: str, shape: Tuple[int, ...], dtype):
+        try:
+            self.file_path = file_path
+            self.shape = tuple(shape)
+            self.dtype = np.dtype(dtype)
+            self.rows = 0
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            self._tmp_file_path = f"{file_path}.{os.getpid()}.tmp"
+            self._file_obj = open(self._tmp_file_path, "wb")
+            np.lib.format.write_array_header_1_0(self._file_obj, {
+                "descr": np.lib.format.dtype_to_descr(self.dtype),
+                "fortran_order": False,
+                "shape": self.shape
+            })
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def write(self, array: np.ndarray):
+        try:
+            array = np.ascontiguousarray(array, dtype=self.dtype)
+            if array.shape[1:] != self.shape[1:] or self.rows + len(array) > self.shape[0]:
+                raise ValueError(f"Can not write {array.shape} rows at row {self.rows} of an array of shape {self.shape}")
+            self._file_obj.write(array.tobytes())
+            self.rows += len(array)
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def close(self) -> str:
+        try:
+            self._file_obj.close()
+            if self.rows != self.shape[0]:
+                os.remove(self._tmp_file_path)
+                raise ValueError(f"{self.file_path} got {self.rows} rows of {self.shape[0]}")
+            os.replace(self._tmp_file_path, self.file_path)
+            return self.file_path
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
@@ -1,12 +1,17 @@
 import yaml
 from networksecurity_project.exception.exception import NetworkSecurityException
 from networksecurity_project.logging.logger import logging
-import os, sys
+from networksecurity_project.constant.training_pipeline import DATA_COMPACT_MISSING_VALUE
+import os, sys, time
 import numpy as np
+import pandas as pd
 # import dill
 import pickle 
-from sklearn.model_selection import GridSearchCV
-from sklearn.metrics import r2_score
+from typing import TYPE_CHECKING
+
+## the model search pulls in sklearn, it is imported by evaluate_models so the serving path does not pay for it
+if TYPE_CHECKING:
+    from networksecurity_project.utils.ml_utils.model.search_cache import SearchResultCache
 
 def read_yaml_file(file_path: str)-> dict:
     try:
@@ -17,15 +22,170 @@ def read_yaml_file(file_path: str)-> dict:
 
 def write_yaml_file(file_path: str, content:object, replace:bool = False)-> None:
     try:
-        if replace:
-            if os.path.exists(file_path):
-                os.remove(file_path)
+        #the temporary file is renamed over an existing one, replace does not need to delete it first
         os.makedirs(os.path.dirname(file_path),exist_ok=True)
-        with open(file_path,"w") as file:
+        tmp_file_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp_file_path,"w") as file:
             yaml.dump(content, file )
+        os.replace(tmp_file_path, file_path)
     except Exception as e:
         raise NetworkSecurityException(e,sys)
     
+def get_schema_dtypes(schema_file_path: str) -> dict:
+    """
+    Returns the column name to dtype mapping declared in the columns section of the schema file
+    """
+    try:
+        schema = read_yaml_file(schema_file_path)
+        schema_dtypes = {}
+        for column in schema["columns"]:
+            schema_dtypes.update({str(name).strip(): str(dtype).strip() for name, dtype in column.items()})
+        return schema_dtypes
+    except Exception as e:
+        raise NetworkSecurityException(e,sys)
+
+def save_dataframe(file_path: str, dataframe: pd.DataFrame, schema_dtypes: dict = None, export_csv: bool = False) -> None:
+    """
+    Save a dataframe as a typed parquet file
+    file_path: str location of the parquet file
+    schema_dtypes: dict column dtypes from the schema, integer columns are stored as nullable integers
+    export_csv: bool also write a csv copy next to the parquet file
+    """
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        typed_dataframe = dataframe
+        if schema_dtypes:
+            typed_dataframe = dataframe.copy()
+            for column, dtype in schema_dtypes.items():
+                if column not in typed_dataframe.columns:
+                    continue
+                values = pd.to_numeric(typed_dataframe[column])
+                if dtype.startswith("int") and not pd.api.types.is_integer_dtype(values):
+                    #nullable integers keep the missing values without falling back to float
+                    values = values.astype(dtype.capitalize())
+                typed_dataframe[column] = values
+        tmp_file_path = f"{file_path}.{os.getpid()}.tmp"
+        typed_dataframe.to_parquet(tmp_file_path, index=False)
+        os.replace(tmp_file_path, file_path)
+
+        if export_csv:
+            csv_file_path = os.path.splitext(file_path)[0] + ".csv"
+            dataframe.to_csv(f"{csv_file_path}.{os.getpid()}.tmp", index=False, header=True)
+            os.replace(f"{csv_file_path}.{os.getpid()}.tmp", csv_file_path)
+    except Exception as e:
+        raise NetworkSecurityException(e,sys)
+
+def load_dataframe(file_path: str) -> pd.DataFrame:
+    """
+    Load a dataframe saved by save_dataframe, or a csv file.
+    Nullable integer columns come back as int64, or as float64 with nan when they have missing values,
+    the same dtypes pandas gives for a csv file.
+    """
+    try:
+        if not file_path.endswith(".parquet"):
+            return pd.read_csv(file_path)
+        return restore_integer_dtypes(pd.read_parquet(file_path))
+    except Exception as e:
+        raise NetworkSecurityException(e,sys)
+
+def restore_integer_dtypes(dataframe: pd.DataFrame) -> pd.DataFrame:
+    """
+    Nullable integer columns of a parquet file as int64, or as float64 with nan when they have missing values
+    """
+    for column in dataframe.columns:
+        if isinstance(dataframe[column].dtype, pd.api.extensions.ExtensionDtype) and pd.api.types.is_integer_dtype(dataframe[column].dtype):
+            if dataframe[column].isna().any():
+                dataframe[column] = dataframe[column].astype("float64")
+            else:
+                dataframe[column] = dataframe[column].astype(dataframe[column].dtype.numpy_dtype)
+    return dataframe
+    
+def to_compact_dataframe(dataframe: pd.DataFrame, schema_dtypes: dict) -> pd.DataFrame:
+    """
+    Store the integer columns of the schema as int8, with DATA_COMPACT_MISSING_VALUE for the missing values.
+    Columns with values that do not fit in int8 are left as they are.
+    """
+    try:
+        for column, dtype in schema_dtypes.items():
+            if column not in dataframe.columns or not dtype.startswith("int") or dataframe[column].dtype == np.int8:
+                continue
+            values = pd.to_numeric(dataframe[column])
+            present = values.dropna()
+            if not ((present > DATA_COMPACT_MISSING_VALUE) & (present <= 127) & (present == present.round())).all():
+                logging.info(f"Column {column} does not fit in int8, keeping {values.dtype}")
+                continue
+            dataframe[column] = values.fillna(DATA_COMPACT_MISSING_VALUE).astype(np.int8)
+        return dataframe
+    except Exception as e:
+        raise NetworkSecurityException(e,sys)
+
+def from_compact_dataframe(dataframe: pd.DataFrame) -> pd.DataFrame:
+    """
+    float64 copy of a compact dataframe with nan for the missing values, the input expected by the models
+    """
+    try:
+        compact_columns = [column for column in dataframe.columns if dataframe[column].dtype == np.int8]
+        if not compact_columns:
+            return dataframe
+        dataframe = dataframe.copy()
+        for column in compact_columns:
+            values = dataframe[column].to_numpy()
+            dataframe[column] = np.where(values == DATA_COMPACT_MISSING_VALUE, np.nan, values.astype(np.float64))
+        return dataframe
+    except Exception as e:
+        raise NetworkSecurityException(e,sys)
+
+def to_compact_array(array: np.array) -> np.array:
+    """
+    int8 copy of an array that holds only small integers, the array itself when it can not be stored in int8 without loss
+    """
+    try:
+        if array.dtype == np.int8 or array.size == 0:
+            return array
+        if np.isnan(array).any() or array.min() <= DATA_COMPACT_MISSING_VALUE or array.max() > 127:
+            return array
+        compact_array = array.astype(np.int8)
+        if not np.array_equal(compact_array, array):
+            return array
+        return compact_array
+    except Exception as e:
+        raise NetworkSecurityException(e,sys)
+
+def deduplicate_rows(X: np.array, y: np.array):
+    """
+    Collapses the identical (features, label) rows into one row each, kept in the order they first appear
+    X: np.array features
+    y: np.array labels
+
+    Returns:
+        the unique features, their labels, the number of rows every unique row stands for, and a report
+        of the reduction and of the feature rows that appear with more than one label
+    """
+    try:
+        X = np.asarray(X)
+        y = np.asarray(y)
+        rows = np.column_stack([X, y.astype(X.dtype, copy=False)]) if len(X) else np.empty((0, X.shape[1] + 1), dtype=X.dtype)
+        _, first_positions, counts = np.unique(rows, axis=0, return_index=True, return_counts=True)
+        order = np.argsort(first_positions, kind="stable")
+        first_positions, counts = first_positions[order], counts[order]
+        X_unique, y_unique = X[first_positions], y[first_positions]
+
+        ## unique feature rows that still appear more than once carry more than one label
+        _, feature_groups, feature_counts = np.unique(X_unique, axis=0, return_inverse=True, return_counts=True)
+        conflicting = feature_counts[feature_groups.ravel()] > 1
+        report = {
+            "rows_in": int(len(X)),
+            "rows_out": int(len(X_unique)),
+            "row_reduction": float(1 - len(X_unique) / len(X)) if len(X) else 0.0,
+            "duplicate_rows": int(len(X) - len(X_unique)),
+            "max_count": int(counts.max(initial=0)),
+            "conflicting_feature_rows": int(np.count_nonzero(feature_counts > 1)),
+            "conflicting_rows": int(counts[conflicting].sum())
+        }
+        return X_unique, y_unique, counts, report
+    except Exception as e:
+        raise NetworkSecurityException(e,sys)
+
 def save_numpy_array_data(file_path: str, array: np.array):
     """
     Save numpy array data to file
@@ -35,8 +195,11 @@ def save_numpy_array_data(file_path: str, array: np.array):
     try:
         dir_path= os.path.dirname(file_path)
         os.makedirs(dir_path, exist_ok=True)
-        with open(file_path, "wb") as file_obj:
+        #replaced rather than written into, the file may be a link to a blob of the artifact store
+        tmp_file_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp_file_path, "wb") as file_obj:
             np.save(file_obj, array)
+        os.replace(tmp_file_path, file_path)
     except Exception as e:
         raise NetworkSecurityException(e,sys)
     
@@ -44,8 +207,11 @@ def save_object(file_path: str, obj: object) -> None:
     try:
         logging.info("Entered the save object method of MainUtils class")
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path,"wb") as file_obj:
+        #write to a temporary file first and swap it in, so readers never see a half written pickle
+        tmp_file_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp_file_path,"wb") as file_obj:
             pickle.dump(obj, file_obj)
+        os.replace(tmp_file_path, file_path)
 
         logging.info("Exited the save_object method of MainUtils class")
     except Exception as e:
@@ -61,42 +227,100 @@ def load_object(file_path: str) -> object:
     except Exception as e:
         raise NetworkSecurityException(e,sys)
     
-def load_numpy_array_data(file_path: str)-> np.array:
+def load_numpy_array_data(file_path: str, mmap_mode: str = None)-> np.array:
     """
     load numpy array data from file
     file_path: str location of the file to load
+    mmap_mode: str memory map the file instead of reading it, "r" gives a read only view of the file
     return: np.array data loaded
     """
 
     try:
+        if mmap_mode is not None:
+            return np.load(file_path, mmap_mode=mmap_mode)
         with open(file_path, "rb") as file_obj:
             return np.load(file_obj)
     except Exception as e:
         raise NetworkSecurityException(e, sys)
-    
-def evaluate_models(X_train, y_train, X_test, y_test, models, params):
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the peak resident memory of the current process, so the next get_peak_rss_bytes call
+    only covers what happens from now on. Only possible on linux.
+    return: bool True if the peak was reset
+    """
     try:
-        report={}
+        with open("/proc/self/clear_refs", "w") as file_obj:
+            file_obj.write("5")
+        return True
+    except OSError:
+        return False
 
-        for i in range(len(list(models))):
-            model= list(models.values())[i]
-            param= params[list(models.keys())[i]]
+def get_peak_rss_bytes() -> int:
+    """
+    Peak resident memory of the current process in bytes
+    """
+    try:
+        with open("/proc/self/status", "r") as file_obj:
+            for line in file_obj:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #ru_maxrss is in bytes on macos and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+    
+def evaluate_models(X_train, y_train, X_test, y_test, models, params, n_jobs: int = -1, search_report_file_path: str = None,
+                    search_cache: "SearchResultCache" = None, telemetry=None, sample_weight=None):
+    """
+    Grid search every model in parallel, refit it with its best params and score it on the test set.
+    The fitted estimators are stored back into the models dict.
+    n_jobs: int number of worker processes for the search, -1 uses all the cores
+    search_report_file_path: str optional location of the per task timings report
+    search_cache: SearchResultCache optional memo of fold scores, cells already in it are not evaluated again
+    telemetry: PipelineTelemetry optional run telemetry that gets one record per candidate model
+    sample_weight: np.array optional number of rows every training row stands for, of a deduplicated training set
+    """
+    try:
+        from networksecurity_project.utils.ml_utils.model.model_search import ParallelModelSearch
+        from sklearn.metrics import r2_score
 
-            gs = GridSearchCV(model, param, cv=3)
-            gs.fit(X_train, y_train)
+        report={}
 
-            model.set_params(**gs.best_params_)
-            model.fit(X_train, y_train)
+        model_search = ParallelModelSearch(n_jobs=n_jobs, cv=3, cache=search_cache)
+        model_search.search(X_train, y_train, models=models, params=params, sample_weight=sample_weight)
 
+        for model_name, model in models.items():
+            start = time.perf_counter()
             y_train_pred = model.predict(X_train)
             y_test_pred = model.predict(X_test)
+            predict_time = time.perf_counter() - start
 
-            train_model_score = r2_score(y_train, y_train_pred)
+            train_model_score = r2_score(y_train, y_train_pred, sample_weight=sample_weight)
             test_model_score = r2_score(y_test, y_test_pred)
 
-            report[list(models.keys())[i]]=test_model_score 
+            report[model_name]=test_model_score 
+
+            if telemetry is not None:
+                candidate = model_search.candidate_summary(model_name)
+                ## the search scores (parameter combination, fold) cells, not rows, so there is no rows_out
+                candidate.update(
+                    rows_in=len(X_train),
+                    fold_cells=candidate["n_tasks"] + candidate["n_cached_tasks"],
+                    predict_time_seconds=predict_time,
+                    train_score=float(train_model_score),
+                    test_score=float(test_model_score)
+                )
+                telemetry.add_candidate(candidate)
+
+        if search_report_file_path is not None:
+            search_report = model_search.summary()
+            if search_cache is not None:
+                search_report["cache"] = search_cache.stats()
+            write_yaml_file(search_report_file_path, content=search_report)
 
         return report
     except Exception as e:
         raise NetworkSecurityException(e, sys)
-    
\ No newline at end of file
@@ -1,12 +1,15 @@
+import sys
+import numpy as np
+
 from networksecurity_project.entity.artifact_entity import ClassificationMetricArtifact
 from networksecurity_project.exception.exception import NetworkSecurityException
 from sklearn.metrics import f1_score, precision_score, recall_score
 
-def get_classification_score(y_true, y_pred)-> ClassificationMetricArtifact:
+def get_classification_score(y_true, y_pred, sample_weight=None)-> ClassificationMetricArtifact:
     try:
-        model_f1_score = f1_score(y_true, y_pred)
-        model_recall_score = recall_score(y_true, y_pred)
-        model_precision_score = precision_score(y_true, y_pred)
+        model_f1_score = f1_score(y_true, y_pred, sample_weight=sample_weight)
+        model_recall_score = recall_score(y_true, y_pred, sample_weight=sample_weight)
+        model_precision_score = precision_score(y_true, y_pred, sample_weight=sample_weight)
 
         classification_metric = ClassificationMetricArtifact(f1_score= model_f1_score,
                                                              precision_score=model_precision_score,
@@ -14,3 +17,30 @@ def get_classification_score(y_true, y_pred)-> ClassificationMetricArtifact:
         return classification_metric
     except Exception as e:
         raise NetworkSecurityException(e,sys)
+
+
+class StreamingClassificationScore:
+    """
+    Confusion counts of the positive class summed chunk by chunk, gives the scores of get_classification_score
+    without all the labels in memory. A score with a zero denominator is 0, as in sklearn.
+    """
+    def __init__(self):
+        self.true_positives = 0
+        self.false_positives = 0
+        self.false_negatives = 0
+
+    def update(self, y_true, y_pred):
+        try:
+            y_true = np.asarray(y_true) == 1
+            y_pred = np.asarray(y_pred) == 1
+            self.true_positives += int(np.count_nonzero(y_true & y_pred))
+            self.false_positives += int(np.count_nonzero(~y_true & y_pred))
+            self.false_negatives += int(np.count_nonzero(y_true & ~y_pred))
+        except Exception as e:
+            raise NetworkSecurityException(e,sys)
+
+    def result(self) -> ClassificationMetricArtifact:
+        tp, fp, fn = self.true_positives, self.false_positives, self.false_negatives
+        return ClassificationMetricArtifact(f1_score=2 * tp / (2 * tp + fp + fn) if tp + fp + fn else 0.0,
+                                            precision_score=tp / (tp + fp) if tp + fp else 0.0,
+                                            recall_score=tp / (tp + fn) if tp + fn else 0.0)
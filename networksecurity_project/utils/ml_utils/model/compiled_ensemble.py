@@ -0,0 +1,225 @@
+import sys
+import hashlib
+
+import numpy as np
+
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.logging.logger import logging
+
+## children_left of a leaf in sklearn trees
+TREE_LEAF = -1
+
+
+def get_trees(model):
+    """
+    The fitted sklearn trees of the model in the order their outputs are summed, and the kind
+    of ensemble, or (None, None) if the model is not supported.
+    """
+    from sklearn.dummy import DummyClassifier
+    from sklearn.ensemble import GradientBoostingClassifier
+    from sklearn.ensemble._forest import ForestClassifier
+    from sklearn.tree import DecisionTreeClassifier
+
+    if getattr(model, "n_outputs_", 1) != 1 or not hasattr(model, "classes_") or model.classes_.dtype == object:
+        return None, None
+    if isinstance(model, DecisionTreeClassifier):
+        return [model.tree_], "tree"
+    if isinstance(model, ForestClassifier):
+        return [estimator.tree_ for estimator in model.estimators_], "forest"
+    if isinstance(model, GradientBoostingClassifier):
+        ## an init estimator that looks at X can not be folded into a constant
+        if not (model.init_ == "zero" or (isinstance(model.init_, DummyClassifier) and model.init_.strategy == "prior")):
+            return None, None
+        return [estimator.tree_ for estimator in model.estimators_.ravel()], "boosting"
+    return None, None
+
+
+class CompiledTreeEnsemble:
+    """
+    A fitted sklearn tree, random forest or gradient boosting classifier flattened into NumPy node
+    arrays: feature, threshold, left and right children and leaf values of all the trees.
+
+    All the (tree, row) pairs of a batch are walked down together, one vectorized step per tree
+    level, and only the pairs that did not reach a leaf yet are carried to the next level. The
+    inputs are cast to float32 and compared with the float64 thresholds like sklearn does, and the
+    tree outputs are summed in the same order, so the predictions are identical to model.predict
+    without the per call validation and dispatch overhead of sklearn.
+    """
+    def __init__(self, kind: str, classes: np.ndarray, n_features: int, roots: np.ndarray, feature: np.ndarray,
+                 threshold: np.ndarray, children: np.ndarray, missing_left: np.ndarray, value: np.ndarray,
+                 init_raw: np.ndarray, n_outputs_per_stage: int, max_depth: int, digest: str):
+        try:
+            self.kind = kind
+            self.classes = classes
+            self.n_features = n_features
+            self.roots = roots
+            self.feature = feature
+            self.threshold = threshold
+            #left and right child of every node next to each other, a leaf is its own child
+            self.children = children
+            self.is_leaf = children[0::2] == np.arange(len(feature), dtype=children.dtype)
+            self.missing_left = missing_left
+            #class probabilities of the nodes for trees and forests, scaled leaf values for boosting
+            self.value = value
+            self.init_raw = init_raw
+            self.n_outputs_per_stage = n_outputs_per_stage
+            self.max_depth = max_depth
+            self.digest = digest
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    @staticmethod
+    def tree_digest(trees) -> str:
+        """
+        Fingerprint of the structure and thresholds of the trees
+        """
+        digest = hashlib.sha1()
+        for tree in trees:
+            digest.update(np.ascontiguousarray(tree.feature).tobytes())
+            digest.update(np.ascontiguousarray(tree.threshold).tobytes())
+            digest.update(np.ascontiguousarray(tree.value).tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def is_supported(model) -> bool:
+        return get_trees(model)[0] is not None
+
+    def matches(self, model) -> bool:
+        """
+        Checks that the arrays were compiled from this model.
+        """
+        trees, kind = get_trees(model)
+        return trees is not None and kind == self.kind and len(trees) == len(self.roots) \
+            and CompiledTreeEnsemble.tree_digest(trees) == self.digest
+
+    @classmethod
+    def from_model(cls, model):
+        """
+        Returns the compiled model, or None if the model is not supported.
+        """
+        try:
+            trees, kind = get_trees(model)
+            if trees is None:
+                return None
+
+            node_counts = np.array([tree.node_count for tree in trees], dtype=np.int64)
+            roots = np.concatenate([[0], np.cumsum(node_counts)[:-1]])
+            ## the children are moved to the global node numbering, a leaf points to itself so the rows
+            ## that reached their leaf can go on walking without moving
+            nodes = np.arange(node_counts.sum(), dtype=np.int64)
+            left = np.concatenate([tree.children_left + root for tree, root in zip(trees, roots)])
+            right = np.concatenate([tree.children_right + root for tree, root in zip(trees, roots)])
+            leaf = np.concatenate([tree.children_left == TREE_LEAF for tree in trees])
+            children = np.stack([np.where(leaf, nodes, left), np.where(leaf, nodes, right)], axis=1).ravel().astype(np.int32)
+            feature = np.where(leaf, 0, np.concatenate([tree.feature for tree in trees])).astype(np.int32)
+            threshold = np.concatenate([tree.threshold for tree in trees])
+            missing_left = np.concatenate([np.asarray(getattr(tree, "missing_go_to_left", np.zeros(tree.node_count)), dtype=bool)
+                                           for tree in trees])
+
+            if kind == "boosting":
+                ## the same scale * value product predict_stages adds to the raw predictions
+                value = model.learning_rate * np.concatenate([tree.value[:, 0, 0] for tree in trees])
+                init_raw = model._raw_predict_init(np.zeros((1, model.n_features_in_), dtype=np.float32))[0]
+                n_outputs_per_stage = model.estimators_.shape[1]
+            else:
+                value = np.concatenate([tree.value[:, 0, :len(model.classes_)] for tree in trees])
+                init_raw = np.zeros(0)
+                n_outputs_per_stage = 1
+
+            compiled = cls(kind=kind, classes=np.asarray(model.classes_), n_features=int(model.n_features_in_),
+                           roots=roots.astype(np.int32), feature=feature, threshold=threshold, children=children,
+                           missing_left=missing_left, value=value, init_raw=np.asarray(init_raw, dtype=np.float64),
+                           n_outputs_per_stage=n_outputs_per_stage, max_depth=max(tree.max_depth for tree in trees),
+                           digest=CompiledTreeEnsemble.tree_digest(trees))
+            logging.info(f"Compiled {len(trees)} trees with {len(feature)} nodes of the {kind} model")
+            return compiled
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def save(self, file_path: str):
+        try:
+            with open(file_path, "wb") as file_obj:
+                np.savez(file_obj, kind=np.array(self.kind), classes=self.classes, n_features=np.array(self.n_features),
+                         roots=self.roots, feature=self.feature, threshold=self.threshold, children=self.children,
+                         missing_left=self.missing_left, value=self.value, init_raw=self.init_raw,
+                         n_outputs_per_stage=np.array(self.n_outputs_per_stage), max_depth=np.array(self.max_depth),
+                         digest=np.array(self.digest))
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    @classmethod
+    def load(cls, file_path: str):
+        try:
+            with np.load(file_path, allow_pickle=False) as arrays:
+                return cls(kind=str(arrays["kind"]), classes=arrays["classes"], n_features=int(arrays["n_features"]),
+                           roots=arrays["roots"], feature=arrays["feature"], threshold=arrays["threshold"],
+                           children=arrays["children"], missing_left=arrays["missing_left"], value=arrays["value"],
+                           init_raw=arrays["init_raw"], n_outputs_per_stage=int(arrays["n_outputs_per_stage"]),
+                           max_depth=int(arrays["max_depth"]), digest=str(arrays["digest"]))
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """
+        Leaf reached by every row in every tree, as global node numbers of shape (n_trees, n_rows)
+        """
+        n_rows = X.shape[0]
+        X_flat = X.ravel()
+        check_missing = bool(np.isnan(X_flat).any())
+        leaves = np.repeat(self.roots, n_rows)
+        current = leaves.copy()
+        row_offsets = np.tile(np.arange(n_rows, dtype=np.int64) * self.n_features, len(self.roots))
+        #positions in leaves of the pairs still walking, None while it is all of them
+        positions = None
+
+        for _ in range(self.max_depth):
+            values = X_flat[row_offsets + self.feature[current]]
+            go_right = ~(values <= self.threshold[current])
+            if check_missing:
+                go_right &= ~(np.isnan(values) & self.missing_left[current])
+            current = self.children[2 * current + go_right]
+
+            ## the pairs in a leaf are put aside once they are a third of the walk
+            done = self.is_leaf[current]
+            n_done = np.count_nonzero(done)
+            if n_done * 3 >= len(current):
+                if positions is None:
+                    positions = np.arange(len(current))
+                leaves[positions[done]] = current[done]
+                walking = ~done
+                current, row_offsets, positions = current[walking], row_offsets[walking], positions[walking]
+                if not len(current):
+                    break
+
+        if positions is None:
+            return current.reshape(len(self.roots), n_rows)
+        leaves[positions] = current
+        return leaves.reshape(len(self.roots), n_rows)
+
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        """
+        Class probabilities for trees and forests, raw predictions for boosting
+        """
+        try:
+            X = np.ascontiguousarray(X, dtype=np.float32)
+            if X.ndim != 2 or X.shape[1] != self.n_features:
+                raise ValueError(f"Expected {self.n_features} features, got an array of shape {X.shape}")
+            leaf_values = self.value[self.apply(X)]
+
+            if self.kind == "boosting":
+                ## the stages are added one after the other onto the init predictions, like predict_stages does
+                stages = leaf_values.reshape(-1, self.n_outputs_per_stage, X.shape[0])
+                init = np.broadcast_to(self.init_raw[np.newaxis, :, np.newaxis], (1, self.n_outputs_per_stage, X.shape[0]))
+                return np.cumsum(np.concatenate([init, stages]), axis=0)[-1].T
+            if self.kind == "forest":
+                ## the tree probabilities are summed in tree order and averaged, like ForestClassifier.predict_proba
+                return np.cumsum(leaf_values, axis=0)[-1] / len(self.roots)
+            return leaf_values[0]
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        scores = self.decision_function(X)
+        if self.kind == "boosting" and self.n_outputs_per_stage == 1:
+            return self.classes[(scores[:, 0] >= 0).astype(int)]
+        return self.classes.take(np.argmax(scores, axis=1), axis=0)
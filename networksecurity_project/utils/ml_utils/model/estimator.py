@@ -1,22 +1,45 @@
-from networksecurity_project.constant.training_pipeline import SAVED_MODEL_DIR, MODEL_FILE_NAME
+from networksecurity_project.constant.training_pipeline import SAVED_MODEL_DIR, MODEL_FILE_NAME, PREDICTION_COMPILED_MAX_ROWS
 
 import os,sys
 
 from networksecurity_project.exception.exception import NetworkSecurityException
 from networksecurity_project.logging.logger import logging
+from networksecurity_project.utils.ml_utils.model.prediction_cache import pack_rows, predict_deduplicated
 
 class NetworkModel:
-    def __init__(self, preprocessor, model):
+    def __init__(self, preprocessor, model, compiled_model=None, compiled_max_rows: int = PREDICTION_COMPILED_MAX_ROWS,
+                 prediction_cache=None, cache_generation: int = 0):
         try:
             self.preprocessor = preprocessor
             self.model = model 
+            #optional CompiledTreeEnsemble of the model, used for the small batches
+            self.compiled_model = compiled_model
+            self.compiled_max_rows = compiled_max_rows
+            #optional PredictionCache shared by the versions of the served model, and the generation of this one
+            self.prediction_cache = prediction_cache
+            self.cache_generation = cache_generation
         except Exception as e:
             raise NetworkSecurityException(e, sys)
         
+    def predict_rows(self, x):
+        """
+        Predictions of all the rows of x, without deduplication
+        """
+        x_transform = self.preprocessor.transform(x)
+        ## models pickled before the compiled path existed have no compiled model
+        compiled_model = getattr(self, "compiled_model", None)
+        if compiled_model is not None and len(x_transform) <= self.compiled_max_rows:
+            return compiled_model.predict(x_transform)
+        y_hat = self.model.predict(x_transform)
+        return y_hat
+
     def predict(self, x):
         try:
-            x_transform = self.preprocessor.transform(x)
-            y_hat = self.model.predict(x_transform)
-            return y_hat 
+            ## identical rows are scored once and recently scored rows come from the cache
+            keys = pack_rows(x, getattr(self.preprocessor, "feature_names_in_", None)) if len(x) else None
+            if keys is None:
+                return self.predict_rows(x)
+            return predict_deduplicated(self.predict_rows, x, keys, cache=getattr(self, "prediction_cache", None),
+                                        generation=getattr(self, "cache_generation", 0))
         except Exception as e:
             raise NetworkSecurityException(e, sys)
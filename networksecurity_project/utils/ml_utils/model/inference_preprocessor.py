@@ -0,0 +1,235 @@
+import sys
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.logging.logger import logging
+
+
+def get_knn_imputer(preprocessor):
+    """
+    Returns the KNNImputer if the preprocessor is a bare KNNImputer or a pipeline made of a single one,
+    otherwise None.
+    """
+    ## sklearn is imported on first use, it is already loaded by then with the unpickled preprocessor
+    from sklearn.impute import KNNImputer
+    from sklearn.pipeline import Pipeline
+
+    if isinstance(preprocessor, KNNImputer):
+        return preprocessor
+    if isinstance(preprocessor, Pipeline) and len(preprocessor.steps) == 1 and isinstance(preprocessor.steps[0][1], KNNImputer):
+        return preprocessor.steps[0][1]
+    return None
+
+
+class KNNImputerIndex:
+    """
+    Precomputed neighbor index for a fitted KNNImputer.
+
+    The training rows are packed into their unique (value, missing pattern) rows, so the
+    nan euclidean distances are computed once per unique row and scattered back to the
+    full training set with an index lookup. The imputed values are then picked exactly
+    like KNNImputer does. All the arithmetic is exact for integer valued features, which
+    makes the output identical to KNNImputer.transform, so the index is only built for
+    integer valued training data.
+    """
+    def __init__(self, imputer: "KNNImputer"):
+        try:
+            from sklearn.impute import KNNImputer
+
+            fit_X = imputer._fit_X
+            mask_fit_X = imputer._mask_fit_X
+
+            self.n_features_in_ = imputer.n_features_in_
+            self.feature_names_in_ = getattr(imputer, "feature_names_in_", None)
+            self.valid_mask = imputer._valid_mask
+            self.keep_empty_features = imputer.keep_empty_features
+            self.n_neighbors = imputer.n_neighbors
+            ## only the parameters used by KNNImputer._calc_impute are needed to pick the donors
+            self._donor_picker = KNNImputer(n_neighbors=imputer.n_neighbors, weights=imputer.weights)
+
+            fit_X_zeroed = np.where(mask_fit_X, 0.0, fit_X)
+            packed_rows = np.c_[fit_X_zeroed, mask_fit_X]
+            unique_rows, inverse = np.unique(packed_rows, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+
+            n_features = fit_X.shape[1]
+            self.unique_X = np.ascontiguousarray(unique_rows[:, :n_features])
+            self.unique_missing = np.ascontiguousarray(unique_rows[:, n_features:])
+            self.unique_present = 1.0 - self.unique_missing
+            self.unique_squared = self.unique_X * self.unique_X
+            self.unique_row_norms = self.unique_squared.sum(axis=1)
+            self.n_train_rows = fit_X.shape[0]
+            self.fit_X_digest = KNNImputerIndex.digest(fit_X)
+
+            self.donor_unique_idx = {}
+            self.donor_values = {}
+            self.col_means = {}
+            non_missing_fit_X = np.logical_not(mask_fit_X)
+            for col in range(n_features):
+                if not self.valid_mask[col]:
+                    continue
+                (potential_donors_idx,) = np.nonzero(non_missing_fit_X[:, col])
+                self.donor_unique_idx[col] = inverse[potential_donors_idx].astype(np.int32)
+                self.donor_values[col] = fit_X[potential_donors_idx, col]
+                self.col_means[col] = np.ma.array(fit_X[:, col], mask=mask_fit_X[:, col]).mean()
+
+            logging.info(f"Built KNN imputer index with {len(self.unique_X)} unique rows out of {self.n_train_rows}")
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    @staticmethod
+    def is_supported(imputer: "KNNImputer") -> bool:
+        if imputer is None or imputer.metric != "nan_euclidean" or imputer.add_indicator:
+            return False
+        if not (isinstance(imputer.missing_values, float) and np.isnan(imputer.missing_values)):
+            return False
+        fit_X = imputer._fit_X
+        values = fit_X[~imputer._mask_fit_X]
+        return bool(np.all(values == np.round(values)) and (values.size == 0 or np.abs(values).max() < 2**20))
+
+    @staticmethod
+    def digest(fit_X: np.ndarray) -> str:
+        return hashlib.sha1(np.ascontiguousarray(fit_X).tobytes()).hexdigest()
+
+    def matches(self, preprocessor) -> bool:
+        """
+        Checks that the index was built from this preprocessor's training data.
+        """
+        imputer = get_knn_imputer(preprocessor)
+        return imputer is not None and imputer._fit_X.shape[0] == self.n_train_rows \
+            and KNNImputerIndex.digest(imputer._fit_X) == self.fit_X_digest
+
+    @classmethod
+    def from_preprocessor(cls, preprocessor):
+        """
+        Returns the index for the preprocessor, or None if the preprocessor is not supported.
+        """
+        imputer = get_knn_imputer(preprocessor)
+        if not cls.is_supported(imputer):
+            return None
+        return cls(imputer)
+
+    def _distances(self, X: np.ndarray) -> np.ndarray:
+        """
+        nan euclidean distances between X and the unique training rows, computed with the same
+        operations as sklearn.metrics.pairwise.nan_euclidean_distances.
+        """
+        missing_X = np.isnan(X)
+        X_zeroed = np.where(missing_X, 0.0, X)
+        X_squared = X_zeroed * X_zeroed
+
+        distances = -2 * np.dot(X_zeroed, self.unique_X.T)
+        distances += X_squared.sum(axis=1)[:, np.newaxis]
+        distances += self.unique_row_norms[np.newaxis, :]
+        np.maximum(distances, 0, out=distances)
+
+        distances -= np.dot(X_squared, self.unique_missing.T)
+        distances -= np.dot(missing_X.astype(np.float64), self.unique_squared.T)
+        np.clip(distances, 0, None, out=distances)
+
+        present_count = np.dot(1.0 - missing_X, self.unique_present.T)
+        distances[present_count == 0] = np.nan
+        np.maximum(1, present_count, out=present_count)
+        distances /= present_count
+        distances *= X.shape[1]
+        np.sqrt(distances, out=distances)
+        return distances
+
+    def impute(self, X: np.ndarray, mask: np.ndarray) -> None:
+        """
+        Impute the missing values of X in place.
+        """
+        row_missing_idx = np.flatnonzero(mask[:, self.valid_mask].any(axis=1))
+        X_missing = X[row_missing_idx]
+        mask_missing = mask[row_missing_idx]
+        unique_distances = self._distances(X_missing)
+
+        for col, donor_unique_idx in self.donor_unique_idx.items():
+            receivers = np.flatnonzero(mask_missing[:, col])
+            if not receivers.size:
+                continue
+
+            dist_subset = unique_distances[receivers][:, donor_unique_idx]
+
+            all_nan_dist_mask = np.isnan(dist_subset).all(axis=1)
+            if np.any(all_nan_dist_mask):
+                X[row_missing_idx[receivers[all_nan_dist_mask]], col] = self.col_means[col]
+                if np.all(all_nan_dist_mask):
+                    continue
+                receivers = receivers[~all_nan_dist_mask]
+                dist_subset = dist_subset[~all_nan_dist_mask]
+
+            n_neighbors = min(self.n_neighbors, len(donor_unique_idx))
+            value = self._donor_picker._calc_impute(
+                dist_subset,
+                n_neighbors,
+                self.donor_values[col],
+                np.zeros(len(donor_unique_idx), dtype=bool)
+            )
+            X[row_missing_idx[receivers], col] = value
+
+
+class InferencePreprocessor:
+    """
+    Serving side replacement for the fitted preprocessor, with the same transform output.
+
+    Batches without missing values skip the imputer entirely, rows with missing values go
+    through the KNNImputerIndex. Anything the index can not reproduce exactly is handed to
+    the original preprocessor.
+    """
+    def __init__(self, preprocessor, index: KNNImputerIndex = None):
+        try:
+            self.preprocessor = preprocessor
+            self.index = index
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    @property
+    def feature_names_in_(self):
+        return getattr(self.preprocessor, "feature_names_in_", None)
+
+    def _to_array(self, x):
+        """
+        Returns x as a float64 array, or None if it does not look like the training input.
+        """
+        if isinstance(x, pd.DataFrame):
+            if self.index.feature_names_in_ is None or list(x.columns) != list(self.index.feature_names_in_):
+                return None
+            X = x.to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+        else:
+            X = np.array(x, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.index.n_features_in_ or np.isinf(X).any():
+            return None
+        return X
+
+    def _select_valid(self, X):
+        if self.index.keep_empty_features:
+            X[:, ~self.index.valid_mask] = 0
+            return X
+        return X[:, self.index.valid_mask]
+
+    def transform(self, x):
+        try:
+            if self.index is None:
+                return self.preprocessor.transform(x)
+
+            X = self._to_array(x)
+            if X is None:
+                return self.preprocessor.transform(x)
+
+            mask = np.isnan(X)
+            ## fast path, nothing to impute
+            if not mask[:, self.index.valid_mask].any():
+                return self._select_valid(X)
+
+            values = X[~mask]
+            if not np.all(values == np.round(values)) or np.abs(values).max(initial=0) >= 2**20:
+                return self.preprocessor.transform(x)
+
+            self.index.impute(X, mask)
+            return self._select_valid(X)
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
@@ -0,0 +1,298 @@
+import os, sys, time
+import resource
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.base import clone, is_classifier
+from sklearn.model_selection import ParameterGrid, check_cv
+from sklearn.utils.validation import has_fit_parameter
+from threadpoolctl import threadpool_limits
+
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.logging.logger import logging
+from networksecurity_project.utils.ml_utils.model.search_cache import SearchResultCache, data_fingerprint
+
+## training data of the current worker process, memory mapped from the files written by the parent
+_worker_data = {}
+
+
+def _init_worker(X_file_path: str, y_file_path: str, w_file_path: str, cv: int, limit_threads: bool):
+    if limit_threads:
+        #one task per core, so every worker keeps blas to a single thread
+        threadpool_limits(1)
+    _worker_data["X"] = np.load(X_file_path, mmap_mode="r")
+    _worker_data["y"] = np.load(y_file_path, mmap_mode="r")
+    _worker_data["w"] = np.load(w_file_path, mmap_mode="r") if w_file_path is not None else None
+    _worker_data["cv"] = cv
+    _worker_data["folds"] = {}
+
+
+def _npy_file_path(array):
+    """
+    Returns the .npy file an array is memory mapped from when the array covers that whole file,
+    so the workers can map the same file instead of a new copy. Returns None otherwise.
+    """
+    if not isinstance(array, np.memmap) or not array.filename or not str(array.filename).endswith(".npy"):
+        return None
+    try:
+        mapped = np.load(array.filename, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if mapped.shape == array.shape and mapped.dtype == array.dtype and mapped.offset == array.offset \
+            and array.flags.c_contiguous:
+        return str(array.filename)
+    return None
+
+
+def _get_folds(estimator) -> list:
+    classifier = is_classifier(estimator)
+    folds = _worker_data["folds"]
+    if classifier not in folds:
+        cv = check_cv(_worker_data["cv"], _worker_data["y"], classifier=classifier)
+        folds[classifier] = list(cv.split(_worker_data["X"], _worker_data["y"]))
+    return folds[classifier]
+
+
+def _fit(estimator, X, y, sample_weight):
+    """
+    Fits the estimator on rows weighted by the number of rows they stand for
+    """
+    if sample_weight is None:
+        return estimator.fit(X, y)
+    if has_fit_parameter(estimator, "sample_weight"):
+        return estimator.fit(X, y, sample_weight=np.asarray(sample_weight))
+    ## estimators without sample_weight get every row repeated as often as it was counted
+    rows = np.repeat(np.arange(len(y)), np.asarray(sample_weight, dtype=np.int64))
+    return estimator.fit(X[rows], y[rows])
+
+
+def _fit_and_score(model_name: str, estimator, params: dict, param_index: int, fold_index: int) -> dict:
+    """
+    Fits one (model, parameter combination, fold) cell of the grid and scores it on the held out fold.
+    """
+    X, y, w = _worker_data["X"], _worker_data["y"], _worker_data["w"]
+    train_idx, test_idx = _get_folds(estimator)[fold_index]
+
+    estimator = clone(estimator).set_params(**params)
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    _fit(estimator, X[train_idx], y[train_idx], w[train_idx] if w is not None else None)
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    score = estimator.score(X[test_idx], y[test_idx], sample_weight=w[test_idx] if w is not None else None)
+    score_time = time.perf_counter() - start
+    cpu_time = time.process_time() - cpu_start
+
+    return {
+        "model": model_name,
+        "param_index": param_index,
+        "params": params,
+        "fold": fold_index,
+        "score": float(score),
+        "fit_time": fit_time,
+        "score_time": score_time,
+        "cpu_time": cpu_time,
+        "rows": len(train_idx),
+        #ru_maxrss is in bytes on macos and in kilobytes elsewhere
+        "worker_peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024),
+        "pid": os.getpid()
+    }
+
+
+def _refit(model_name: str, estimator, params: dict):
+    X, y, w = _worker_data["X"], _worker_data["y"], _worker_data["w"]
+    estimator = clone(estimator).set_params(**params)
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    _fit(estimator, np.asarray(X), np.asarray(y), w)
+    return model_name, estimator, time.perf_counter() - start, time.process_time() - cpu_start
+
+
+class ParallelModelSearch:
+    """
+    Grid search over several model families at once, the equivalent of running
+    GridSearchCV(model, param, cv=cv) for every model followed by a refit with the best params.
+
+    Every (model, parameter combination, fold) cell is a separate task for a process pool.
+    The training matrix is memory mapped by the workers, from its own .npy file when it is
+    already a memory map or from a temporary copy, so the tasks only carry the estimator and
+    its parameters. n_jobs follows the sklearn
+    convention, -1 uses all the cores and 1 runs everything in the current process.
+    With a cache, the fold scores of cells already evaluated on the same data are reused
+    and only the new cells are run. A deduplicated training set is searched with its row
+    counts as sample_weight, in the fits and in the fold scores.
+    """
+    def __init__(self, n_jobs: int = -1, cv: int = 3, cache: SearchResultCache = None):
+        try:
+            self.n_jobs = n_jobs
+            self.cv = cv
+            self.cache = cache
+            self.task_timings = []
+            self.refit_timings = {}
+            self.refit_cpu_times = {}
+            self.best_params = {}
+            self.wall_time = None
+            self.rows = None
+            self.weighted_rows = None
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def _n_workers(self, n_tasks: int) -> int:
+        n_jobs = self.n_jobs if self.n_jobs is not None else 1
+        if n_jobs < 0:
+            n_jobs = max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+        return max(1, min(n_jobs, n_tasks))
+
+    def search(self, X_train, y_train, models: dict, params: dict, sample_weight=None) -> dict:
+        """
+        Finds the best parameters of every model, refits it on the whole training set
+        and stores the fitted estimator back into the models dict.
+        sample_weight: optional number of rows every training row stands for
+
+        Returns:
+            dict of model name to the best parameters
+        """
+        try:
+            start = time.perf_counter()
+            self.rows = len(X_train)
+            self.weighted_rows = int(np.sum(sample_weight)) if sample_weight is not None else len(X_train)
+            grids = {name: list(ParameterGrid(params[name])) for name in models}
+            tasks = [(name, models[name], grid_params, param_index, fold_index)
+                     for name, grid in grids.items()
+                     for param_index, grid_params in enumerate(grid)
+                     for fold_index in range(self.cv)]
+
+            cached_timings, task_keys = [], []
+            if self.cache is not None:
+                fingerprint = data_fingerprint(X_train, y_train) if sample_weight is None \
+                    else data_fingerprint(X_train, y_train, sample_weight)
+                remaining_tasks = []
+                for task in tasks:
+                    name, estimator, grid_params, param_index, fold_index = task
+                    key = SearchResultCache.cell_key(fingerprint, estimator, grid_params, self.cv, fold_index)
+                    cached = self.cache.get(key)
+                    if cached is None:
+                        remaining_tasks.append(task)
+                        task_keys.append(key)
+                    else:
+                        cached.update(model=name, param_index=param_index, params=grid_params, fold=fold_index, cached=True)
+                        cached_timings.append(cached)
+                tasks = remaining_tasks
+
+            n_workers = self._n_workers(len(tasks) or len(models))
+            logging.info(f"Model search of {len(tasks)} tasks on {n_workers} workers, {len(cached_timings)} cells from the cache")
+
+            data_dir = tempfile.mkdtemp(prefix="model_search_")
+            try:
+                X_file_path = _npy_file_path(X_train)
+                if X_file_path is None:
+                    X_file_path = os.path.join(data_dir, "X_train.npy")
+                    np.save(X_file_path, np.ascontiguousarray(X_train))
+                y_file_path = _npy_file_path(y_train)
+                if y_file_path is None:
+                    y_file_path = os.path.join(data_dir, "y_train.npy")
+                    np.save(y_file_path, np.ascontiguousarray(y_train))
+                w_file_path = None
+                if sample_weight is not None:
+                    w_file_path = _npy_file_path(sample_weight)
+                    if w_file_path is None:
+                        w_file_path = os.path.join(data_dir, "w_train.npy")
+                        np.save(w_file_path, np.ascontiguousarray(sample_weight))
+                init_args = (X_file_path, y_file_path, w_file_path, self.cv, n_workers > 1)
+
+                if n_workers == 1:
+                    _init_worker(*init_args[:4], False)
+                    self.task_timings = [_fit_and_score(*task) for task in tasks]
+                    self._store(task_keys, cached_timings)
+                    best_params = self._best_params(grids)
+                    refits = [_refit(name, models[name], best_params[name]) for name in models]
+                else:
+                    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker, initargs=init_args) as executor:
+                        self.task_timings = list(executor.map(_fit_and_score, *zip(*tasks))) if tasks else []
+                        self._store(task_keys, cached_timings)
+                        best_params = self._best_params(grids)
+                        refits = list(executor.map(_refit, list(models), [models[name] for name in models],
+                                                   [best_params[name] for name in models]))
+            finally:
+                _worker_data.clear()
+                shutil.rmtree(data_dir, ignore_errors=True)
+
+            for name, estimator, refit_time, refit_cpu_time in refits:
+                models[name] = estimator
+                self.refit_timings[name] = refit_time
+                self.refit_cpu_times[name] = refit_cpu_time
+            self.best_params = best_params
+
+            self.wall_time = time.perf_counter() - start
+            summary = self.summary()
+            logging.info(f"Model search finished in {self.wall_time:.2f} seconds, "
+                         f"{summary['task_time_seconds']:.2f} seconds of task time on {n_workers} workers")
+            return best_params
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def _store(self, task_keys: list, cached_timings: list):
+        """
+        Saves the freshly computed cells to the cache and adds the cached ones to the timings.
+        """
+        if self.cache is not None:
+            for key, timing in zip(task_keys, self.task_timings):
+                self.cache.put(key, {"score": timing["score"], "fit_time": timing["fit_time"],
+                                     "score_time": timing["score_time"], "cpu_time": timing["cpu_time"],
+                                     "pid": timing["pid"]})
+            self.cache.evict()
+        self.task_timings = self.task_timings + cached_timings
+
+    def _best_params(self, grids: dict) -> dict:
+        """
+        Best parameter combination of every model by mean fold score, ties going to the
+        first combination of the grid like GridSearchCV.
+        """
+        best_params = {}
+        for name, grid in grids.items():
+            scores = np.zeros((len(grid), self.cv))
+            for timing in self.task_timings:
+                if timing["model"] == name:
+                    scores[timing["param_index"], timing["fold"]] = timing["score"]
+            best_params[name] = grid[int(np.argmax(scores.mean(axis=1)))]
+        return best_params
+
+    def candidate_summary(self, name: str) -> dict:
+        """
+        Totals of the search tasks and the refit of one model
+        """
+        timings = [timing for timing in self.task_timings if timing["model"] == name]
+        run_timings = [timing for timing in timings if not timing.get("cached")]
+        return {
+            "model": name,
+            "best_params": self.best_params.get(name),
+            "n_tasks": len(run_timings),
+            "n_cached_tasks": len(timings) - len(run_timings),
+            "fit_time_seconds": sum(timing["fit_time"] for timing in run_timings),
+            "score_time_seconds": sum(timing["score_time"] for timing in run_timings),
+            "cpu_time_seconds": sum(timing.get("cpu_time", 0.0) for timing in run_timings) + self.refit_cpu_times.get(name, 0.0),
+            "refit_time_seconds": self.refit_timings.get(name),
+            "worker_peak_rss_bytes": max((timing.get("worker_peak_rss_bytes", 0) for timing in run_timings), default=None)
+        }
+
+    def summary(self) -> dict:
+        run_timings = [timing for timing in self.task_timings if not timing.get("cached")]
+        task_time = sum(timing["fit_time"] + timing["score_time"] for timing in run_timings)
+        return {
+            "n_jobs": self.n_jobs,
+            "n_workers": len({timing["pid"] for timing in run_timings}),
+            "n_tasks": len(run_timings),
+            "n_cached_tasks": len(self.task_timings) - len(run_timings),
+            "rows": self.rows,
+            "weighted_rows": self.weighted_rows,
+            "wall_time_seconds": self.wall_time,
+            "task_time_seconds": task_time,
+            "speedup": task_time / self.wall_time if self.wall_time else None,
+            "refit_time_seconds": self.refit_timings,
+            "tasks": self.task_timings
+        }
@@ -0,0 +1,191 @@
+import sys, time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from networksecurity_project.constant.training_pipeline import PREDICTION_CACHE_MAX_ENTRIES, PREDICTION_CACHE_TTL_SECONDS
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.monitoring.metrics import (
+    PREDICTION_CACHE_LOOKUPS,
+    PREDICTION_CACHE_HIT_RATIO,
+    PREDICTION_CACHE_ENTRIES,
+    PREDICTION_DUPLICATE_ROWS
+)
+
+## every feature takes two bits of the key: -1, 0 and 1 are the digits 0, 1 and 2, a missing value is 3
+BITS_PER_FEATURE = 2
+MISSING_DIGIT = 3
+## the keys stay positive int64, rows that can not be packed get a negative key of their own
+MAX_PACKED_FEATURES = 31
+
+
+def pack_rows(x, feature_names=None):
+    """
+    One int64 key per row of x that holds the whole row, or None when x can not be keyed:
+    other columns than the model was trained on, or too many features to fit in the key.
+
+    Rows with a value outside of -1, 0, 1 and missing get the key -1 - position, so they never
+    match another row or a cache entry.
+    """
+    if isinstance(x, pd.DataFrame):
+        if feature_names is not None and list(x.columns) != list(feature_names):
+            return None
+        X = x.to_numpy(dtype=np.float64, na_value=np.nan)
+    else:
+        X = np.asarray(x, dtype=np.float64)
+    if X.ndim != 2 or X.shape[1] > MAX_PACKED_FEATURES:
+        return None
+
+    missing = np.isnan(X)
+    ternary = missing | (X == -1) | (X == 0) | (X == 1)
+    digits = np.where(missing | ~ternary, MISSING_DIGIT, X + 1).astype(np.int64)
+    shifts = np.arange(X.shape[1], dtype=np.int64) * BITS_PER_FEATURE
+    keys = np.bitwise_or.reduce(digits << shifts, axis=1) if X.shape[1] else np.zeros(len(X), dtype=np.int64)
+    packed = ternary.all(axis=1)
+    return np.where(packed, keys, -1 - np.arange(len(X), dtype=np.int64))
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of the predictions of recently scored rows, keyed by their packed features.
+
+    Entries expire ttl_seconds after they were stored. The registry invalidates the cache when it
+    swaps in a new model version, which starts a new generation: a model only reads and stores the
+    entries of the generation it was loaded with, so a request that still holds the previous model
+    can not put its predictions in front of the new one.
+    """
+    def __init__(self, max_entries: int = PREDICTION_CACHE_MAX_ENTRIES, ttl_seconds: float = PREDICTION_CACHE_TTL_SECONDS):
+        try:
+            self.max_entries = max_entries
+            self.ttl_seconds = ttl_seconds
+
+            self._lock = threading.Lock()
+            #key: (prediction, expiry time), least recently used first
+            self._entries = OrderedDict()
+            self.generation = 0
+
+            self.hits = 0
+            self.misses = 0
+            self.duplicate_rows = 0
+            self.invalidations = 0
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def invalidate(self) -> int:
+        """
+        Drops all the entries, returns the generation of the new model
+        """
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+            self.invalidations += 1
+            PREDICTION_CACHE_ENTRIES.set(0)
+            return self.generation
+
+    def get(self, keys: np.ndarray, generation: int) -> list:
+        """
+        Cached prediction of every key, None for the keys that are not cached
+        """
+        found = [None] * len(keys)
+        if not self.enabled:
+            return found
+        now = time.monotonic()
+        with self._lock:
+            if generation == self.generation:
+                for position, key in enumerate(keys.tolist()):
+                    entry = self._entries.get(key)
+                    if entry is None:
+                        continue
+                    if entry[1] <= now:
+                        del self._entries[key]
+                        continue
+                    self._entries.move_to_end(key)
+                    found[position] = entry[0]
+            PREDICTION_CACHE_ENTRIES.set(len(self._entries))
+        return found
+
+    def put(self, keys: np.ndarray, predictions: np.ndarray, generation: int):
+        if not self.enabled:
+            return
+        expires = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            if generation != self.generation:
+                return
+            for key, prediction in zip(keys.tolist(), predictions):
+                if key >= 0:
+                    self._entries[key] = (prediction, expires)
+                    self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            PREDICTION_CACHE_ENTRIES.set(len(self._entries))
+
+    def record(self, hits: int, misses: int, duplicate_rows: int):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.duplicate_rows += duplicate_rows
+        PREDICTION_CACHE_LOOKUPS.labels(result="hit").inc(hits)
+        PREDICTION_CACHE_LOOKUPS.labels(result="miss").inc(misses)
+        PREDICTION_DUPLICATE_ROWS.inc(duplicate_rows)
+        PREDICTION_CACHE_HIT_RATIO.set(self.hit_rate)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "entries": len(self._entries),
+            "generation": self.generation,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "duplicate_rows": self.duplicate_rows,
+            "invalidations": self.invalidations
+        }
+
+
+def predict_deduplicated(predict, x, keys: np.ndarray, cache: PredictionCache = None, generation: int = 0) -> np.ndarray:
+    """
+    Scores every distinct row of x once: the rows are grouped by key, the cached keys are answered
+    from the cache, predict is called on the first row of every other key and the predictions are
+    scattered back to all the rows of the key.
+    """
+    try:
+        unique_keys, first_positions, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        cached = cache.get(unique_keys, generation) if cache is not None else [None] * len(unique_keys)
+        missed = np.array([position for position, prediction in enumerate(cached) if prediction is None], dtype=np.int64)
+
+        if len(missed):
+            rows = first_positions[missed]
+            y_missed = np.asarray(predict(x.iloc[rows] if isinstance(x, pd.DataFrame) else np.asarray(x)[rows]))
+            if cache is not None:
+                cache.put(unique_keys[missed], y_missed, generation)
+            y_unique = np.empty(len(unique_keys), dtype=y_missed.dtype)
+            y_unique[missed] = y_missed
+        else:
+            y_unique = np.empty(len(unique_keys), dtype=np.asarray(cached[0]).dtype)
+        if len(missed) < len(unique_keys):
+            hit = np.ones(len(unique_keys), dtype=bool)
+            hit[missed] = False
+            y_unique[hit] = [prediction for prediction in cached if prediction is not None]
+
+        if cache is not None:
+            ## only the keys that could have been cached count as lookups
+            packed = unique_keys >= 0
+            n_missed_packed = int(np.count_nonzero(packed[missed])) if len(missed) else 0
+            cache.record(hits=len(unique_keys) - len(missed), misses=n_missed_packed,
+                         duplicate_rows=len(keys) - len(unique_keys))
+        return y_unique[inverse.ravel()]
+    except Exception as e:
+        raise NetworkSecurityException(e, sys) # type: ignore
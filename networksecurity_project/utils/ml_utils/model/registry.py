@@ -0,0 +1,264 @@
+import os, sys, time
+import shutil
+import threading
+
+from networksecurity_project.constant.training_pipeline import (
+    FINAL_MODEL_DIR,
+    FINAL_MODEL_PREPROCESSOR_FILE_NAME,
+    FINAL_MODEL_PREPROCESSOR_INDEX_FILE_NAME,
+    FINAL_MODEL_FILE_NAME,
+    FINAL_MODEL_MANIFEST_FILE_NAME,
+    FINAL_MODEL_DRIFT_BASELINE_FILE_NAME,
+    FINAL_MODEL_COMPILED_FILE_NAME,
+    FINAL_MODEL_VERSIONS_DIR_NAME,
+    FINAL_MODEL_KEEP_VERSIONS,
+    MODEL_REGISTRY_POLL_INTERVAL_SECONDS
+)
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.logging.logger import logging
+from networksecurity_project.monitoring.drift import DriftHistogram
+from networksecurity_project.monitoring.metrics import MODEL_LOAD_SECONDS
+from networksecurity_project.utils.main_utils.utils import load_object, read_yaml_file, write_yaml_file
+from networksecurity_project.utils.ml_utils.model.estimator import NetworkModel
+from networksecurity_project.utils.ml_utils.model.compiled_ensemble import CompiledTreeEnsemble
+from networksecurity_project.utils.ml_utils.model.inference_preprocessor import KNNImputerIndex, InferencePreprocessor
+from networksecurity_project.utils.ml_utils.model.prediction_cache import PredictionCache
+
+
+def publish_model_version(staged_model_dir: str, model_dir: str, version: str, manifest: dict,
+                          keep_versions: int = FINAL_MODEL_KEEP_VERSIONS) -> str:
+    """
+    Copies the final model files a run staged to a version folder of model_dir, then points the manifest
+    at it. The manifest is swapped in one rename, so a reader never pairs the preprocessor or the drift
+    baseline of one training with the model of another. The oldest versions past keep_versions are deleted.
+    """
+    try:
+        versions_dir = os.path.join(model_dir, FINAL_MODEL_VERSIONS_DIR_NAME)
+        version_dir = os.path.join(versions_dir, version)
+        tmp_version_dir = f"{version_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_version_dir, ignore_errors=True)
+        shutil.copytree(staged_model_dir, tmp_version_dir)
+        shutil.rmtree(version_dir, ignore_errors=True)
+        os.replace(tmp_version_dir, version_dir)
+
+        write_yaml_file(os.path.join(model_dir, FINAL_MODEL_MANIFEST_FILE_NAME), content={
+            **manifest,
+            "version": version,
+            "model_dir": os.path.relpath(version_dir, model_dir)
+        })
+
+        versions = sorted((os.path.join(versions_dir, name) for name in os.listdir(versions_dir)
+                           if os.path.isdir(os.path.join(versions_dir, name)) and not name.endswith(".tmp")),
+                          key=os.path.getmtime, reverse=True)
+        for old_version_dir in versions[max(1, keep_versions):]:
+            if os.path.normpath(old_version_dir) != os.path.normpath(version_dir):
+                shutil.rmtree(old_version_dir, ignore_errors=True)
+        logging.info(f"Published model version {version} to {version_dir}")
+        return version_dir
+    except Exception as e:
+        raise NetworkSecurityException(e, sys) # type: ignore
+
+
+class ModelRegistry:
+    """
+    Keeps the final NetworkModel resident in memory for the serving app.
+
+    The model is loaded once and swapped as a single reference when the final_model
+    folder gets a new version, so a request that already holds a model keeps using it
+    until it finishes. The version is taken from the manifest written by the model
+    trainer, or from the pickle modification times when no manifest exists. All the files
+    are loaded from the version folder the manifest points to, models published before
+    version folders existed are loaded from the final_model folder itself. Every load
+    invalidates the prediction cache of the served models.
+    """
+    def __init__(self, model_dir: str = FINAL_MODEL_DIR, poll_interval: float = MODEL_REGISTRY_POLL_INTERVAL_SECONDS,
+                 prediction_cache: PredictionCache = None):
+        try:
+            self.model_dir = model_dir
+            self.manifest_file_path = os.path.join(model_dir, FINAL_MODEL_MANIFEST_FILE_NAME)
+            self._set_version_dir(model_dir)
+            self.poll_interval = poll_interval
+            self.prediction_cache = prediction_cache if prediction_cache is not None else PredictionCache()
+
+            self._lock = threading.Lock()
+            self._stop_event = threading.Event()
+            self._watcher = None
+
+            self._model = None
+            self._drift_baseline = None
+            self._signature = None
+            self.version = None
+            self.reload_count = 0
+            self.last_load_duration = None
+            self.loaded_at = None
+            self.last_error = None
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def _set_version_dir(self, version_dir: str):
+        self.version_dir = version_dir
+        self.preprocessor_file_path = os.path.join(version_dir, FINAL_MODEL_PREPROCESSOR_FILE_NAME)
+        self.preprocessor_index_file_path = os.path.join(version_dir, FINAL_MODEL_PREPROCESSOR_INDEX_FILE_NAME)
+        self.model_file_path = os.path.join(version_dir, FINAL_MODEL_FILE_NAME)
+        self.drift_baseline_file_path = os.path.join(version_dir, FINAL_MODEL_DRIFT_BASELINE_FILE_NAME)
+        self.compiled_model_file_path = os.path.join(version_dir, FINAL_MODEL_COMPILED_FILE_NAME)
+
+    def _current_signature(self):
+        """
+        Cheap stat based fingerprint of the final_model folder, used to detect a new version
+        without unpickling anything.
+        """
+        if os.path.exists(self.manifest_file_path):
+            return ("manifest", os.stat(self.manifest_file_path).st_mtime_ns)
+        preprocessor_file_path = os.path.join(self.model_dir, FINAL_MODEL_PREPROCESSOR_FILE_NAME)
+        model_file_path = os.path.join(self.model_dir, FINAL_MODEL_FILE_NAME)
+        if os.path.exists(preprocessor_file_path) and os.path.exists(model_file_path):
+            return ("pickles", os.stat(preprocessor_file_path).st_mtime_ns, os.stat(model_file_path).st_mtime_ns)
+        return None
+
+    def _read_manifest(self, signature) -> dict:
+        if signature[0] != "manifest":
+            return {}
+        return read_yaml_file(self.manifest_file_path) or {}
+
+    @staticmethod
+    def _read_version(signature, manifest: dict) -> str:
+        if "version" in manifest:
+            return str(manifest["version"])
+        return str(max(signature[1:]))
+
+    def _load_preprocessor(self):
+        """
+        Wraps the fitted preprocessor with the low latency inference path. The saved neighbor
+        index is used when it belongs to this preprocessor, otherwise it is rebuilt.
+        """
+        preprocessor = load_object(self.preprocessor_file_path)
+        index = None
+        if os.path.exists(self.preprocessor_index_file_path):
+            index = load_object(self.preprocessor_index_file_path)
+            if not index.matches(preprocessor):
+                logging.info("Saved preprocessor index does not match the preprocessor, rebuilding it")
+                index = None
+        if index is None:
+            index = KNNImputerIndex.from_preprocessor(preprocessor)
+        return InferencePreprocessor(preprocessor=preprocessor, index=index)
+
+    def _load_compiled_model(self, model):
+        """
+        The flat node arrays of a tree ensemble model. The saved arrays are used when they were
+        compiled from this model, otherwise they are compiled again. None for other models.
+        """
+        if os.path.exists(self.compiled_model_file_path):
+            compiled_model = CompiledTreeEnsemble.load(self.compiled_model_file_path)
+            if compiled_model.matches(model):
+                return compiled_model
+            logging.info("Saved compiled model does not match the model, compiling it again")
+        return CompiledTreeEnsemble.from_model(model)
+
+    def _load_drift_baseline(self):
+        ## models trained before the baseline was saved are served without drift monitoring
+        if not os.path.exists(self.drift_baseline_file_path):
+            return None
+        return DriftHistogram.from_dict(read_yaml_file(self.drift_baseline_file_path))
+
+    def reload(self) -> NetworkModel:
+        """
+        Load the preprocessor and model from disk and swap them in as the served model.
+        """
+        try:
+            with self._lock:
+                signature = self._current_signature()
+                if signature is None:
+                    raise Exception(f"No model found in the folder: {self.model_dir}")
+
+                start = time.perf_counter()
+                manifest = self._read_manifest(signature)
+                self._set_version_dir(os.path.join(self.model_dir, manifest["model_dir"]) if "model_dir" in manifest else self.model_dir)
+                preprocessor = self._load_preprocessor()
+                model = load_object(self.model_file_path)
+                compiled_model = self._load_compiled_model(model)
+                drift_baseline = self._load_drift_baseline()
+                ## the cached predictions belong to the previous version
+                network_model = NetworkModel(preprocessor=preprocessor, model=model, compiled_model=compiled_model,
+                                             prediction_cache=self.prediction_cache,
+                                             cache_generation=self.prediction_cache.invalidate())
+                load_duration = time.perf_counter() - start
+                MODEL_LOAD_SECONDS.observe(load_duration)
+
+                self._model = network_model
+                self._drift_baseline = drift_baseline
+                self._signature = signature
+                self.version = self._read_version(signature, manifest)
+                self.reload_count += 1
+                self.last_load_duration = load_duration
+                self.loaded_at = time.time()
+                self.last_error = None
+
+                logging.info(f"Loaded model version {self.version} in {load_duration:.3f} seconds")
+                return network_model
+        except Exception as e:
+            self.last_error = str(e)
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def refresh(self) -> bool:
+        """
+        Reload the model if the final_model folder changed since the last load.
+        A failed reload keeps the previous model in service.
+
+        Returns:
+            True if a new model was swapped in
+        """
+        signature = self._current_signature()
+        if signature is None or signature == self._signature:
+            return False
+        try:
+            self.reload()
+            return True
+        except NetworkSecurityException as e:
+            logging.info(f"Model reload failed, keeping version {self.version}: {e}")
+            return False
+
+    def get_model(self) -> NetworkModel:
+        try:
+            model = self._model
+            if model is None:
+                model = self.reload()
+            return model
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def get_drift_baseline(self):
+        """
+        Value counts of the train features of the served model, None without a baseline
+        """
+        return self._drift_baseline
+
+    def _watch(self):
+        while not self._stop_event.wait(self.poll_interval):
+            self.refresh()
+
+    def start_watcher(self):
+        if self._watcher is None or not self._watcher.is_alive():
+            self._stop_event.clear()
+            self._watcher = threading.Thread(target=self._watch, name="model-registry-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop_event.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=self.poll_interval)
+            self._watcher = None
+
+    def status(self) -> dict:
+        compiled_model = self._model.compiled_model if self._model is not None else None
+        return {
+            "loaded": self._model is not None,
+            "drift_baseline_loaded": self._drift_baseline is not None,
+            "compiled_model": compiled_model.kind if compiled_model is not None else None,
+            "version": self.version,
+            "reload_count": self.reload_count,
+            "last_load_duration_seconds": self.last_load_duration,
+            "loaded_at": self.loaded_at,
+            "last_error": self.last_error,
+            "prediction_cache": self.prediction_cache.status()
+        }
@@ -0,0 +1,108 @@
+import os, sys
+import json
+import hashlib
+
+import numpy as np
+import sklearn
+
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.logging.logger import logging
+
+
+def data_fingerprint(X, y, *arrays) -> str:
+    """
+    Hash of the training matrix and labels, and of the sample weights if any, including their shapes and dtypes.
+    """
+    digest = hashlib.sha256()
+    for array in (X, y, *arrays):
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.shape}{array.dtype}".encode("utf-8"))
+        digest.update(memoryview(array).cast("B"))
+    return digest.hexdigest()
+
+
+class SearchResultCache:
+    """
+    On disk memo of cross validation fold scores shared by all the training runs.
+
+    Every (data, estimator, parameters, fold) cell is one small json file named after the hash
+    of its key, so runs with the same training data and grid skip the cells they already know.
+    When the folder grows over max_size_bytes the least recently used cells are evicted.
+    """
+    def __init__(self, cache_dir: str, max_size_bytes: int):
+        try:
+            self.cache_dir = cache_dir
+            self.max_size_bytes = max_size_bytes
+            self.hits = 0
+            self.misses = 0
+            os.makedirs(self.cache_dir, exist_ok=True)
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    @staticmethod
+    def cell_key(fingerprint: str, estimator, params: dict, cv: int, fold: int) -> str:
+        estimator_class = f"{type(estimator).__module__}.{type(estimator).__qualname__}"
+        ## the base params matter too, e.g. a random_state fixed on the estimator itself
+        base_params = sorted((name, repr(value)) for name, value in estimator.get_params(deep=False).items())
+        cell = [fingerprint, estimator_class, base_params, sorted((name, repr(value)) for name, value in params.items()),
+                cv, fold, sklearn.__version__]
+        return hashlib.sha256(json.dumps(cell).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "r") as file_obj:
+                value = json.load(file_obj)
+            #the modification time doubles as the last use time for the eviction
+            os.utime(path)
+            self.hits += 1
+            return value
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: dict):
+        try:
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as file_obj:
+                json.dump(value, file_obj)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def evict(self) -> int:
+        """
+        Removes the least recently used cells until the cache fits in max_size_bytes.
+
+        Returns:
+            number of removed cells
+        """
+        try:
+            entries = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file() and entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total_size <= self.max_size_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total_size -= size
+                removed += 1
+            if removed:
+                logging.info(f"Evicted {removed} model search cache cells")
+            return removed
+        except Exception as e:
+            raise NetworkSecurityException(e, sys) # type: ignore
+
+    def stats(self) -> dict:
+        return {"cache_dir": self.cache_dir, "hits": self.hits, "misses": self.misses}
@@ -1,60 +1,51 @@
 import os
-import json 
+import sys
+import argparse
 
 from dotenv import load_dotenv
 load_dotenv()
 
 MONGO_DB_URL = os.getenv('MONGO_DB_URL')
 
-import certifi
-ca = certifi.where()
-
-import pandas as pd
-import numpy as np
-import pymongo
+from networksecurity_project.constant.training_pipeline import (
+    ARTIFACT_DIR,
+    SCHEMA_FILE_PATH,
+    BULK_LOAD_CHUNK_SIZE,
+    BULK_LOAD_BATCH_SIZE,
+    BULK_LOAD_MAX_WORKERS,
+    BULK_LOAD_CHECKPOINT_DIR
+)
 from networksecurity_project.exception.exception import NetworkSecurityException
-from networksecurity_project.logging.logger import logging 
-import sys 
-
-class NetworkDataExtract():
-    def __init__(self):
-        try:
-            pass
-        except Exception as e:
-            raise NetworkSecurityException(e,sys)
-        
-    def csv_to_json_converter(self,file_path):
-        try:
-            data=pd.read_csv(file_path)
-            data.reset_index(drop=True, inplace=True)
-            records=list(json.loads(data.T.to_json()).values())
-            return records   
-        except Exception as e:
-            raise NetworkSecurityException(e,sys)
-    
-    def insert_data_mongodb(self, records, database, collection):
-        try:
-            self.database=database
-            self.collection=collection
-            self.records=records
+from networksecurity_project.logging.logger import logging
+from networksecurity_project.pipeline.bulk_loader import MongoBulkLoader, get_mongo_collection
+from networksecurity_project.utils.main_utils.utils import get_schema_dtypes
 
-            self.mongo_client=pymongo.MongoClient(MONGO_DB_URL)
-            self.database= self.mongo_client[self.database]
 
-            self.collection=self.database[self.collection]
-            self.collection.insert_many(self.records)
-            return (len(self.records))
-        except Exception as e:
-            raise NetworkSecurityException(e,sys)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Stream a csv file into the MongoDB collection of the training data")
+    parser.add_argument("--file-path", default="Network_Data/phisingData.csv")
+    parser.add_argument("--database", default="MLOPS_AI")
+    parser.add_argument("--collection", default="NetworkData")
+    parser.add_argument("--chunk-size", type=int, default=BULK_LOAD_CHUNK_SIZE)
+    parser.add_argument("--batch-size", type=int, default=BULK_LOAD_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=BULK_LOAD_MAX_WORKERS)
+    parser.add_argument("--checkpoint", default=None, help="checkpoint file, one per collection by default")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and load the whole file again")
+    return parser.parse_args()
 
 
 if __name__=="__main__":
-    FILE_PATH="Network_Data/phisingData.csv"
-    DATABASE = "MLOPS_AI"
-    Collection ="NetworkData"
-
-    network_obj=NetworkDataExtract()
-    records=network_obj.csv_to_json_converter(file_path=FILE_PATH)
-    print(records)
-    no_of_records=network_obj.insert_data_mongodb(records, DATABASE, Collection)
-    print(no_of_records)
+    try:
+        args = parse_args()
+        checkpoint_file_path = args.checkpoint or os.path.join(ARTIFACT_DIR, BULK_LOAD_CHECKPOINT_DIR,
+                                                               f"{args.database}.{args.collection}.yaml")
+        collection = get_mongo_collection(MONGO_DB_URL, args.database, args.collection, max_pool_size=args.workers)
+        loader = MongoBulkLoader(collection, checkpoint_file_path, batch_size=args.batch_size, max_workers=args.workers,
+                                 chunk_size=args.chunk_size, dtypes=get_schema_dtypes(SCHEMA_FILE_PATH))
+        bulk_load_artifact = loader.load(args.file_path, restart=args.restart)
+        logging.info(f"Bulk load artifact: {bulk_load_artifact}")
+        print(f"{bulk_load_artifact.rows_inserted} rows inserted in {bulk_load_artifact.elapsed_seconds:.2f} seconds "
+              f"({bulk_load_artifact.rows_per_second:.0f} rows/s), {bulk_load_artifact.rows_duplicate} duplicates, "
+              f"{bulk_load_artifact.rows_resumed} rows from an earlier run")
+    except Exception as e:
+        raise NetworkSecurityException(e,sys)
@@ -43,7 +43,7 @@ setup(
     version="0.0.1",
     author="Rohan-Thoma",
     author_email='rohanvailalathoma@gmail.com',
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
     install_requires=get_requirements()
 )
 
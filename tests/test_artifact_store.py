@@ -0,0 +1,101 @@
+import hashlib
+import os
+from datetime import datetime
+
+import pytest
+
+from networksecurity_project.entity.config_entity import ArtifactStoreConfig, TrainingPipelineConfig
+from networksecurity_project.pipeline.artifact_store import ArtifactStore
+from networksecurity_project.utils.main_utils.utils import write_yaml_file
+
+SHARED = b"model" * 1000
+
+
+@pytest.fixture(autouse=True)
+def artifacts_in_tmp_path(tmp_path, monkeypatch):
+    ## the artifact folders are relative to the working directory
+    monkeypatch.chdir(tmp_path)
+
+
+def make_run(second: int, files: dict) -> str:
+    """
+    Writes and interns a run folder, returns the run name
+    """
+    training_pipeline_config = TrainingPipelineConfig(timestamp=datetime(2026, 1, 1, 0, 0, second))
+    for relative_path, data in files.items():
+        file_path = os.path.join(training_pipeline_config.artifact_dir, relative_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as file_obj:
+            file_obj.write(data)
+    ArtifactStore(ArtifactStoreConfig(training_pipeline_config)).intern_run()
+    return training_pipeline_config.timestamp
+
+
+def make_store() -> ArtifactStore:
+    return ArtifactStore(ArtifactStoreConfig(TrainingPipelineConfig(timestamp=datetime(2026, 1, 2))))
+
+
+def test_identical_files_of_two_runs_share_one_blob():
+    first = make_run(1, {"model_trainer/model.pkl": SHARED, "data_ingestion/train.parquet": b"a" * 10})
+    second = make_run(2, {"model_trainer/model.pkl": SHARED, "data_ingestion/train.parquet": b"b" * 10})
+    store = make_store()
+
+    first_stat = os.stat(os.path.join(store.run_dir(first), "model_trainer", "model.pkl"))
+    second_stat = os.stat(os.path.join(store.run_dir(second), "model_trainer", "model.pkl"))
+    assert first_stat.st_ino == second_stat.st_ino
+    ## two runs and the store
+    assert first_stat.st_nlink == 3
+    assert len(store._blobs()) == 3
+    status = store.status()
+    assert status["apparent_bytes"] - status["disk_bytes"] == len(SHARED)
+
+
+def test_served_and_promoted_runs_survive_keep_last_zero():
+    runs = [make_run(second, {"file": bytes([second]) * 10}) for second in range(4)]
+    store = make_store()
+    write_yaml_file(store.artifact_store_config.final_model_manifest_file_path, content={"version": runs[0]})
+    store.promote(runs[1])
+
+    artifact = store.collect_garbage(keep_last=0)
+
+    assert artifact.runs_deleted == 2
+    assert store.runs() == runs[:2]
+    assert len(store._blobs()) == 2
+
+
+def test_blob_is_removed_once_its_last_run_is_gone():
+    make_run(1, {"model.pkl": SHARED, "only_first": b"1" * 10})
+    second = make_run(2, {"model.pkl": SHARED})
+    store = make_store()
+    blob_path = store._blob_path(hashlib.sha256(SHARED).hexdigest())
+
+    artifact = store.collect_garbage(keep_last=1)
+    assert store.runs() == [second]
+    assert artifact.blobs_deleted == 1
+    assert os.path.exists(blob_path)
+
+    artifact = store.collect_garbage(keep_last=0)
+    assert store.runs() == []
+    assert artifact.blobs_deleted == 1
+    assert not os.path.exists(blob_path)
+    assert store._blobs() == []
+
+
+def test_dry_run_reports_what_the_collection_deletes():
+    runs = [make_run(1, {"model.pkl": SHARED, "a": b"a" * 100}),
+            make_run(2, {"model.pkl": SHARED, "b": b"b" * 200}),
+            make_run(3, {"c": b"c" * 300})]
+    store = make_store()
+    write_yaml_file(os.path.join(store.artifact_store_config.stage_cache_dir, "ingestion", "record.yaml"),
+                    content={"artifact_dir": store.run_dir(runs[0])})
+
+    dry_run = store.collect_garbage(keep_last=1, dry_run=True)
+    assert store.runs() == runs
+    collected = store.collect_garbage(keep_last=1)
+
+    for name in ["runs_deleted", "blobs_deleted", "stage_cache_records_deleted", "bytes_reclaimed"]:
+        assert getattr(dry_run, name) == getattr(collected, name), name
+    assert collected.runs_deleted == 2
+    assert collected.blobs_deleted == 3
+    assert collected.stage_cache_records_deleted == 1
+    assert collected.bytes_reclaimed == len(SHARED) + 300
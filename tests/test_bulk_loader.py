@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+from networksecurity_project.components.data_ingestion import DataIngestion
+from networksecurity_project.entity.config_entity import DataIngestionConfig, TrainingPipelineConfig
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.pipeline.bulk_loader import MongoBulkLoader, in_progress_load_floor
+from networksecurity_project.pipeline.memory_collection import InMemoryCollection
+
+
+N_ROWS = 95
+
+
+class FlakyCollection:
+    """
+    Collection whose connection drops on the given insert_many call, after or before writing the
+    batch, and stays down
+    """
+    def __init__(self, collection, fail_call, write_before_failing=False):
+        self.collection = collection
+        self.database = collection.database
+        self.full_name = collection.full_name
+        self.fail_call = fail_call
+        self.write_before_failing = write_before_failing
+        self.calls = 0
+
+    def insert_many(self, documents, ordered=True):
+        self.calls += 1
+        if self.calls == self.fail_call and self.write_before_failing:
+            self.collection.insert_many(documents, ordered=ordered)
+        if self.calls >= self.fail_call:
+            raise ConnectionError("connection reset")
+        return self.collection.insert_many(documents, ordered=ordered)
+
+
+@pytest.fixture
+def csv_file_path(tmp_path):
+    file_path = tmp_path / "data.csv"
+    lines = ["row,value"] + [f"{row},{'na' if row % 10 == 0 else row * 2}" for row in range(N_ROWS)]
+    file_path.write_text("\n".join(lines) + "\n")
+    return str(file_path)
+
+
+def make_loader(collection, tmp_path):
+    return MongoBulkLoader(collection, str(tmp_path / "checkpoint.yaml"), batch_size=10, max_workers=1, chunk_size=20)
+
+
+def loaded_rows(collection):
+    return sorted(document["row"] for document in collection.documents.values())
+
+
+def test_load_inserts_every_row(csv_file_path, tmp_path):
+    collection = InMemoryCollection()
+    artifact = make_loader(collection, tmp_path).load(csv_file_path)
+
+    assert artifact.rows_inserted == N_ROWS
+    assert artifact.rows_duplicate == 0
+    assert loaded_rows(collection) == list(range(N_ROWS))
+    values = {document["row"]: document["value"] for document in collection.documents.values()}
+    assert values[10] is None and values[11] == 22
+    assert in_progress_load_floor(collection) is None
+
+
+def test_resume_after_partial_failure(csv_file_path, tmp_path):
+    collection = InMemoryCollection()
+    with pytest.raises(NetworkSecurityException):
+        make_loader(FlakyCollection(collection, fail_call=4), tmp_path).load(csv_file_path)
+    assert len(collection.documents) == 30
+
+    artifact = make_loader(collection, tmp_path).load(csv_file_path)
+
+    assert artifact.rows_resumed == 30
+    assert artifact.rows_inserted == N_ROWS - 30
+    assert artifact.rows_duplicate == 0
+    assert loaded_rows(collection) == list(range(N_ROWS))
+
+
+def test_resent_batch_rows_are_counted_as_duplicates(csv_file_path, tmp_path):
+    ## the batch reached the server but its acknowledgement was lost
+    collection = InMemoryCollection()
+    with pytest.raises(NetworkSecurityException):
+        make_loader(FlakyCollection(collection, fail_call=3, write_before_failing=True), tmp_path).load(csv_file_path)
+    assert len(collection.documents) == 30
+
+    artifact = make_loader(collection, tmp_path).load(csv_file_path)
+
+    assert artifact.rows_resumed == 20
+    assert artifact.rows_duplicate == 10
+    assert artifact.rows_inserted == N_ROWS - 30
+    assert loaded_rows(collection) == list(range(N_ROWS))
+
+
+def test_completed_load_is_not_loaded_again(csv_file_path, tmp_path):
+    collection = InMemoryCollection()
+    make_loader(collection, tmp_path).load(csv_file_path)
+    artifact = make_loader(collection, tmp_path).load(csv_file_path)
+
+    assert artifact.rows_inserted == 0
+    assert len(collection.documents) == N_ROWS
+
+
+def test_ingestion_watermark_waits_for_in_progress_load(csv_file_path, tmp_path):
+    collection = InMemoryCollection()
+    with pytest.raises(NetworkSecurityException):
+        make_loader(FlakyCollection(collection, fail_call=4), tmp_path).load(csv_file_path)
+    ## another writer inserts a second after the interrupted load started
+    later_id = ObjectId.from_datetime(datetime.now(timezone.utc) + timedelta(seconds=1))
+    collection.insert_many([{"_id": later_id, "row": -1, "value": 0}])
+
+    data_ingestion = DataIngestion(DataIngestionConfig(TrainingPipelineConfig()))
+    cursor, watermark = data_ingestion.new_documents_cursor(collection, None)
+    assert cursor is None and watermark is None
+
+    make_loader(collection, tmp_path).load(csv_file_path)
+    cursor, watermark = data_ingestion.new_documents_cursor(collection, watermark)
+    assert sorted(document["row"] for document in cursor) == [-1] + list(range(N_ROWS))
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import ExtraTreesClassifier, GradientBoostingClassifier, RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+from networksecurity_project.utils.ml_utils.model.compiled_ensemble import CompiledTreeEnsemble
+
+N_FEATURES = 10
+
+MODELS = {
+    "tree": lambda: DecisionTreeClassifier(random_state=0),
+    "forest": lambda: RandomForestClassifier(n_estimators=25, random_state=0),
+    "extra_trees": lambda: ExtraTreesClassifier(n_estimators=25, random_state=0),
+    "boosting_prior": lambda: GradientBoostingClassifier(n_estimators=30, random_state=0),
+    "boosting_zero": lambda: GradientBoostingClassifier(n_estimators=30, init="zero", random_state=0)
+}
+
+
+def training_data(n_classes: int):
+    rng = np.random.default_rng(0)
+    X = rng.integers(-1, 2, (400, N_FEATURES)).astype(float)
+    ## a continuous feature, its thresholds are not exact in float32
+    X[:, -1] = rng.normal(0, 1, len(X))
+    score = X[:, 0] + X[:, 1] * X[:, 2] - X[:, 3] + X[:, -1] + rng.normal(0, 0.7, len(X))
+    if n_classes == 2:
+        ## the -1/1 labels of the target column
+        return X, np.where(score > 0, 1, -1)
+    return X, np.digitize(score, [-1, 1])
+
+
+def query_data() -> np.ndarray:
+    ## the imputed values are means of the donors, not only the -1/0/1 of the raw data
+    rng = np.random.default_rng(1)
+    X = rng.integers(-1, 2, (500, N_FEATURES)).astype(float)
+    imputed = rng.random(X.shape) < 0.1
+    X[imputed] = rng.choice([-1 / 3, 1 / 3, 0.5, -0.5, 2 / 3], size=np.count_nonzero(imputed))
+    return X
+
+
+@pytest.mark.parametrize("n_classes", [2, 3])
+@pytest.mark.parametrize("name", list(MODELS))
+def test_predict_matches_sklearn(name, n_classes):
+    model = MODELS[name]().fit(*training_data(n_classes))
+    compiled_model = CompiledTreeEnsemble.from_model(model)
+    assert compiled_model is not None
+    X = query_data()
+    ## rows right at the thresholds of the continuous feature, sklearn compares them in float32
+    thresholds = np.unique(compiled_model.threshold[(compiled_model.feature == N_FEATURES - 1) & ~compiled_model.is_leaf])
+    edges = np.concatenate([thresholds, np.nextafter(thresholds, np.inf), np.nextafter(thresholds, -np.inf)])[:len(X)]
+    X[:len(edges), -1] = edges
+
+    np.testing.assert_array_equal(compiled_model.predict(X), model.predict(X))
+    if compiled_model.kind == "boosting":
+        np.testing.assert_array_equal(compiled_model.decision_function(X).reshape(len(X), -1),
+                                      model.decision_function(X).reshape(len(X), -1))
+    else:
+        np.testing.assert_array_equal(compiled_model.decision_function(X), model.predict_proba(X))
+    ## batches of one row take the same path as the serving app
+    np.testing.assert_array_equal(np.concatenate([compiled_model.predict(X[row:row + 1]) for row in range(20)]),
+                                  model.predict(X[:20]))
+
+
+def test_saved_model_matches_its_model_only(tmp_path):
+    X, y = training_data(2)
+    model = MODELS["boosting_prior"]().fit(X, y)
+    file_path = str(tmp_path / "model_compiled.npz")
+    CompiledTreeEnsemble.from_model(model).save(file_path)
+
+    compiled_model = CompiledTreeEnsemble.load(file_path)
+    assert compiled_model.matches(model)
+    assert not compiled_model.matches(MODELS["boosting_zero"]().fit(X, y))
+    np.testing.assert_array_equal(compiled_model.predict(query_data()), model.predict(query_data()))
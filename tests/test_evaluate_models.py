@@ -0,0 +1,24 @@
+import numpy as np
+from sklearn.tree import DecisionTreeClassifier
+
+from networksecurity_project.monitoring.telemetry import PipelineTelemetry
+from networksecurity_project.utils.main_utils.utils import evaluate_models
+from networksecurity_project.utils.ml_utils.model.search_cache import SearchResultCache
+
+
+def test_candidate_telemetry_counts_the_fold_cells(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.integers(-1, 2, (90, 4)).astype(float)
+    y = (X[:, 0] > 0).astype(int)
+    search_cache = SearchResultCache(str(tmp_path / "search_cache"), max_size_bytes=10**7)
+
+    candidates = []
+    for max_depths in [[1, 2], [1, 2, 3]]:
+        telemetry = PipelineTelemetry(run_id="run")
+        evaluate_models(X[:60], y[:60], X[60:], y[60:], models={"tree": DecisionTreeClassifier(random_state=0)},
+                        params={"tree": {"max_depth": max_depths}}, n_jobs=1, search_cache=search_cache, telemetry=telemetry)
+        candidates.append(telemetry.run["candidates"][0])
+
+    ## three folds per parameter combination, the cells of the first search come from the cache the second time
+    assert [(candidate["fold_cells"], candidate["n_tasks"], candidate["n_cached_tasks"]) for candidate in candidates] == [(6, 6, 0), (9, 3, 6)]
+    assert all(candidate["rows_in"] == 60 and "rows_out" not in candidate for candidate in candidates)
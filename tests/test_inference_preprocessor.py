@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.impute import KNNImputer
+from sklearn.pipeline import Pipeline
+
+from networksecurity_project.components.data_transformation import DataTransformation
+from networksecurity_project.utils.ml_utils.model.inference_preprocessor import InferencePreprocessor, KNNImputerIndex
+
+N_FEATURES = 8
+
+
+def with_missing(n_rows: int, seed: int, missing_rate: float = 0.2) -> np.ndarray:
+    ## the -1/0/1 values of the schema, with repeated rows like the training data has
+    rng = np.random.default_rng(seed)
+    X = rng.integers(-1, 2, (n_rows, N_FEATURES)).astype(float)
+    X[rng.random(X.shape) < missing_rate] = np.nan
+    return X
+
+
+def queries(seed: int) -> np.ndarray:
+    X = with_missing(200, seed, missing_rate=0.3)
+    X[0] = np.nan
+    X[1, :-1] = np.nan
+    X[2] = with_missing(1, seed + 1, missing_rate=0)[0]
+    return X
+
+
+def fitted(preprocessor, X_train: np.ndarray):
+    columns = [f"feature_{col}" for col in range(N_FEATURES)]
+    preprocessor.fit(pd.DataFrame(X_train, columns=columns))
+    index = KNNImputerIndex.from_preprocessor(preprocessor)
+    ## the parity is only checked when the index serves the batch instead of the fallback
+    assert index is not None
+    return preprocessor, InferencePreprocessor(preprocessor=preprocessor, index=index), columns
+
+
+def test_transform_matches_the_pipeline_of_the_repo():
+    preprocessor, inference_preprocessor, columns = fitted(DataTransformation.get_data_transformer_object(), with_missing(300, 0))
+
+    for seed in range(1, 4):
+        x = pd.DataFrame(queries(seed), columns=columns)
+        np.testing.assert_array_equal(inference_preprocessor.transform(x), preprocessor.transform(x))
+        np.testing.assert_array_equal(inference_preprocessor.transform(x.to_numpy()), preprocessor.transform(x))
+
+
+@pytest.mark.parametrize("params", [
+    {"n_neighbors": 1},
+    {"n_neighbors": 5, "weights": "distance"},
+    {"n_neighbors": 3, "keep_empty_features": True}
+])
+def test_impute_matches_knn_imputer(params):
+    X_train = with_missing(150, 0)
+    ## a feature without any value in the training data is dropped, or zeroed with keep_empty_features
+    X_train[:, 3] = np.nan
+    preprocessor, inference_preprocessor, columns = fitted(Pipeline([("imputer", KNNImputer(**params))]), X_train)
+
+    x = pd.DataFrame(queries(5), columns=columns)
+    np.testing.assert_array_equal(inference_preprocessor.transform(x), preprocessor.transform(x))
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+from networksecurity_project.monitoring.drift import BIN_OFFSET, MISSING_BIN, DriftHistogram
+from networksecurity_project.monitoring.live_drift import LiveDriftMonitor, live_bins
+
+
+def make_monitor():
+    baseline = DriftHistogram.from_dataframe(pd.DataFrame({"a": [-1, 0, 1, 1], "b": [0, 1, 1, 0]}))
+    return LiveDriftMonitor(lambda: baseline, windows_seconds=(60,), bucket_seconds=60, min_rows=1)
+
+
+def test_live_bins_counts_non_integer_values_as_missing():
+    bins = live_bins(pd.DataFrame({"a": [1.0, 0.5, np.nan, 300.0], "b": [0, 1, 1, -1]}))
+
+    assert bins[:, 0].tolist() == [1 + BIN_OFFSET, MISSING_BIN, MISSING_BIN, MISSING_BIN]
+    assert bins[:, 1].tolist() == [BIN_OFFSET, 1 + BIN_OFFSET, 1 + BIN_OFFSET, -1 + BIN_OFFSET]
+
+
+def test_observe_reports_out_of_domain_values_in_missing_rate():
+    monitor = make_monitor()
+    monitor.observe(pd.DataFrame({"a": [0.5, 0.25, 1.0, -1.0], "b": [0, 1, 1, 0]}))
+
+    window = monitor.scores()["windows"]["60s"]
+    assert window["rows"] == 4
+    assert window["features"]["a"]["missing_rate"] == 0.5
+    assert monitor.window_counts(60)[0, BIN_OFFSET] == 0
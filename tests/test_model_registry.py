@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.impute import KNNImputer
+from sklearn.pipeline import Pipeline
+from sklearn.tree import DecisionTreeClassifier
+
+from networksecurity_project.constant.training_pipeline import (FINAL_MODEL_FILE_NAME, FINAL_MODEL_KEEP_VERSIONS,
+                                                                FINAL_MODEL_MANIFEST_FILE_NAME,
+                                                                FINAL_MODEL_PREPROCESSOR_FILE_NAME,
+                                                                FINAL_MODEL_VERSIONS_DIR_NAME)
+from networksecurity_project.utils.main_utils.utils import save_object
+from networksecurity_project.utils.ml_utils.model.registry import ModelRegistry, publish_model_version
+
+MODEL_DIR = "final_model"
+COLUMNS = ["a", "b", "c"]
+
+
+@pytest.fixture(autouse=True)
+def model_dir_in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def features(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    return pd.DataFrame(np.random.default_rng(seed).integers(-1, 2, (n_rows, len(COLUMNS))).astype(float), columns=COLUMNS)
+
+
+def publish(number: int) -> str:
+    """
+    Stages and publishes a version whose model flips the label of the version before it. The versions
+    are dated a second apart, the registry and the pruning order them by modification time.
+    """
+    x = features(60)
+    y = (x["a"] > 0).astype(int) ^ (number % 2)
+    staged_model_dir = os.path.join("staged", str(number))
+    os.makedirs(staged_model_dir)
+    save_object(os.path.join(staged_model_dir, FINAL_MODEL_PREPROCESSOR_FILE_NAME), Pipeline([("imputer", KNNImputer())]).fit(x))
+    save_object(os.path.join(staged_model_dir, FINAL_MODEL_FILE_NAME), DecisionTreeClassifier(random_state=0).fit(x, y))
+    os.utime(staged_model_dir, (number, number))
+
+    version = f"v{number}"
+    publish_model_version(staged_model_dir, MODEL_DIR, version, manifest={"trained_at": number})
+    os.utime(os.path.join(MODEL_DIR, FINAL_MODEL_MANIFEST_FILE_NAME), (number, number))
+    return version
+
+
+def test_new_version_is_swapped_in_and_a_held_model_stays_usable():
+    publish(1)
+    registry = ModelRegistry(model_dir=MODEL_DIR)
+    held_model = registry.get_model()
+    x = features(20, seed=1)
+    first_predictions = held_model.predict(x)
+    assert registry.version == "v1"
+    assert not registry.refresh()
+
+    publish(2)
+    assert registry.refresh()
+
+    assert registry.version == "v2"
+    assert registry.get_model() is not held_model
+    np.testing.assert_array_equal(registry.get_model().predict(x), 1 - first_predictions)
+    ## a request that took the model before the swap finishes with it, even once its files are pruned
+    publish(3)
+    assert registry.refresh()
+    assert not os.path.exists(os.path.join(MODEL_DIR, FINAL_MODEL_VERSIONS_DIR_NAME, "v1"))
+    np.testing.assert_array_equal(held_model.predict(x), first_predictions)
+    np.testing.assert_array_equal(registry.get_model().predict(x), first_predictions)
+    assert registry.reload_count == 3
+
+
+def test_versions_past_the_kept_ones_are_pruned():
+    versions = [publish(number) for number in range(1, FINAL_MODEL_KEEP_VERSIONS + 3)]
+
+    assert sorted(os.listdir(os.path.join(MODEL_DIR, FINAL_MODEL_VERSIONS_DIR_NAME))) == versions[-FINAL_MODEL_KEEP_VERSIONS:]
+    registry = ModelRegistry(model_dir=MODEL_DIR)
+    registry.get_model()
+    assert registry.version == versions[-1]
+    assert registry.version_dir == os.path.join(MODEL_DIR, FINAL_MODEL_VERSIONS_DIR_NAME, versions[-1])
@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+import pytest
+
+from networksecurity_project.components.data_ingestion import DataIngestion
+from networksecurity_project.components.data_validation import DataValidation
+from networksecurity_project.constant.training_pipeline import SCHEMA_FILE_PATH
+from networksecurity_project.entity.artifact_entity import DataIngestionArtifact
+from networksecurity_project.entity.config_entity import DataIngestionConfig, DataValidationConfig, TrainingPipelineConfig
+from networksecurity_project.exception.exception import NetworkSecurityException
+from networksecurity_project.pipeline.bulk_loader import row_object_id
+from networksecurity_project.pipeline.memory_collection import InMemoryCollection
+from networksecurity_project.utils.main_utils.utils import get_schema_dtypes
+
+
+class InterruptedCollection(InMemoryCollection):
+    """
+    Collection whose next find cursor breaks after the given number of documents
+    """
+    fail_after = None
+
+    def find(self, *args, **kwargs):
+        documents = super().find(*args, **kwargs)
+        fail_after, self.fail_after = self.fail_after, None
+        if fail_after is None:
+            return documents
+
+        def interrupted():
+            for position, document in enumerate(documents):
+                if position == fail_after:
+                    raise ConnectionError("cursor lost")
+                yield document
+        return interrupted()
+
+    def find_one(self, filter=None, projection=None, sort=None):
+        return next(super().find(filter, projection=projection, sort=sort), None)
+
+
+def insert_rows(collection, first_row, n_rows, seed=0):
+    columns = list(get_schema_dtypes(SCHEMA_FILE_PATH))
+    rng = np.random.default_rng(seed)
+    collection.insert_many([dict({column: int(value) for column, value in zip(columns, rng.integers(-1, 2, len(columns)))},
+                                 _id=row_object_id(1_700_000_000, 0, row))
+                            for row in range(first_row, first_row + n_rows)])
+
+
+@pytest.fixture
+def data_ingestion(tmp_path):
+    data_ingestion_config = DataIngestionConfig(TrainingPipelineConfig())
+    data_ingestion_config.incremental = True
+    data_ingestion_config.snapshot_dir = str(tmp_path / "snapshot")
+    data_ingestion_config.watermark_file_path = str(tmp_path / "snapshot" / "watermark.yaml")
+    return DataIngestion(data_ingestion_config)
+
+
+def test_retried_pull_writes_the_same_documents_once(data_ingestion):
+    collection = InterruptedCollection()
+    data_ingestion.get_collection = lambda: collection
+    insert_rows(collection, 0, 50)
+
+    collection.fail_after = 25
+    with pytest.raises(ConnectionError):
+        list(data_ingestion.iter_out_of_core_source(chunk_rows=10))
+    ## documents inserted before the retry are left for the next pull
+    insert_rows(collection, 50, 30, seed=1)
+
+    assert sum(len(dataframe) for dataframe in data_ingestion.iter_out_of_core_source(chunk_rows=10)) == 50
+    assert data_ingestion.read_pull_target() is None
+    assert sum(len(dataframe) for dataframe in data_ingestion.iter_out_of_core_source(chunk_rows=10)) == 80
+    assert len(os.listdir(data_ingestion.data_ingestion_config.snapshot_dir)) == 8 + 1
+
+
+def test_emptied_retry_range_moves_the_watermark_forward(data_ingestion):
+    collection = InterruptedCollection()
+    data_ingestion.get_collection = lambda: collection
+    insert_rows(collection, 0, 50)
+
+    collection.fail_after = 25
+    with pytest.raises(NetworkSecurityException):
+        data_ingestion.export_collection_dataframe()
+    target = data_ingestion.read_pull_target()
+    ## the documents of the recorded range are deleted before the retry
+    collection.documents.clear()
+    insert_rows(collection, 50, 30, seed=1)
+
+    assert len(data_ingestion.export_collection_dataframe()) == 0
+    assert data_ingestion.read_pull_target() is None
+    assert data_ingestion.read_watermark() == target
+    assert len(data_ingestion.export_collection_dataframe()) == 30
+    assert data_ingestion.read_watermark() == row_object_id(1_700_000_000, 0, 79)
+
+
+def test_out_of_core_validation_fails_on_empty_shards(tmp_path):
+    train_shard_dir, test_shard_dir = tmp_path / "train", tmp_path / "test"
+    train_shard_dir.mkdir()
+    test_shard_dir.mkdir()
+    data_validation_config = DataValidationConfig(TrainingPipelineConfig())
+    data_validation_config.drift_report_file_path = str(tmp_path / "report.yaml")
+    data_validation = DataValidation(DataIngestionArtifact(trained_file_path=str(train_shard_dir), test_file_path=str(test_shard_dir)),
+                                     data_validation_config)
+
+    with pytest.raises(NetworkSecurityException, match="no rows in the train shards"):
+        data_validation.initiate_out_of_core_validation()
+    assert os.path.exists(data_validation_config.drift_report_file_path)
@@ -0,0 +1,98 @@
+import json
+import os
+
+import pytest
+
+from networksecurity_project.cloud.object_store import LocalObjectStore
+from networksecurity_project.cloud.s3_syncer import S3Sync
+from networksecurity_project.exception.exception import NetworkSecurityException
+
+
+def write_file(folder, relative_path, data: bytes):
+    path = os.path.join(folder, *relative_path.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file_obj:
+        file_obj.write(data)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalObjectStore(str(tmp_path / "store"))
+
+
+@pytest.fixture
+def folder(tmp_path):
+    folder = str(tmp_path / "run")
+    write_file(folder, "a.txt", b"a" * 100)
+    write_file(folder, "nested/b.txt", b"b" * 200)
+    write_file(folder, "nested/a_copy.txt", b"a" * 100)
+    return folder
+
+
+def test_sync_uploads_then_skips_unchanged_files(store, folder):
+    sync = S3Sync(store=store, max_workers=2)
+    artifact = sync.sync_folder_to_s3(folder, "s3://bucket/artifact/run_1")
+
+    assert artifact.files == 3
+    assert artifact.files_transferred == 2
+    assert artifact.files_copied == 1
+    assert store.get_bytes("bucket", "artifact/run_1/nested/a_copy.txt") == b"a" * 100
+    assert json.loads(store.get_bytes("bucket", "artifact/.sync_latest.json")) == {"prefix": "artifact/run_1"}
+
+    artifact = sync.sync_folder_to_s3(folder, "s3://bucket/artifact/run_1")
+    assert artifact.files_skipped == 3
+    assert artifact.files_transferred == 0
+
+
+def test_new_prefix_copies_the_contents_of_the_latest_sync(store, folder):
+    sync = S3Sync(store=store, max_workers=2)
+    sync.sync_folder_to_s3(folder, "s3://bucket/artifact/run_1")
+    write_file(folder, "c.txt", b"c" * 50)
+
+    artifact = sync.sync_folder_to_s3(folder, "s3://bucket/artifact/run_2")
+
+    assert artifact.files_copied == 3
+    assert artifact.files_transferred == 1
+    assert artifact.bytes_transferred == 50
+    assert json.loads(store.get_bytes("bucket", "artifact/.sync_latest.json")) == {"prefix": "artifact/run_2"}
+
+
+def test_large_files_are_uploaded_in_parts(store, tmp_path):
+    folder = str(tmp_path / "model")
+    data = os.urandom(6 * 1024 * 1024 + 10)
+    write_file(folder, "model.pkl", data)
+    sync = S3Sync(store=store, max_workers=2, multipart_threshold=1024 * 1024, part_size=1024 * 1024)
+
+    artifact = sync.sync_folder_to_s3(folder, "s3://bucket/final_model/run_1")
+
+    assert artifact.multipart_uploads == 1
+    assert store.get_bytes("bucket", "final_model/run_1/model.pkl") == data
+    ## the parts are gone once the upload completed
+    assert os.listdir(os.path.join(store.root_dir, "bucket", LocalObjectStore.MULTIPART_DIR_NAME)) == []
+
+
+def test_sync_from_s3_downloads_only_missing_or_changed_files(store, folder, tmp_path):
+    sync = S3Sync(store=store, max_workers=2)
+    sync.sync_folder_to_s3(folder, "s3://bucket/artifact/run_1")
+    download_folder = str(tmp_path / "download")
+
+    artifact = sync.sync_folder_from_s3(download_folder, "s3://bucket/artifact/run_1")
+    assert artifact.files_transferred == 3
+    with open(os.path.join(download_folder, "nested", "b.txt"), "rb") as file_obj:
+        assert file_obj.read() == b"b" * 200
+
+    write_file(download_folder, "nested/b.txt", b"x" * 200)
+    artifact = sync.sync_folder_from_s3(download_folder, "s3://bucket/artifact/run_1")
+    assert artifact.files_transferred == 1
+    assert artifact.files_skipped == 2
+
+
+def test_missing_source_folder_fails_and_keeps_the_latest_sync(store, folder, tmp_path):
+    sync = S3Sync(store=store, max_workers=2)
+    sync.sync_folder_to_s3(folder, "s3://bucket/artifact/run_1")
+
+    with pytest.raises(NetworkSecurityException):
+        sync.sync_folder_to_s3(str(tmp_path / "missing"), "s3://bucket/artifact/run_2")
+
+    assert store.list("bucket", "artifact/run_2") == {}
+    assert json.loads(store.get_bytes("bucket", "artifact/.sync_latest.json")) == {"prefix": "artifact/run_1"}
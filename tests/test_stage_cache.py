@@ -0,0 +1,137 @@
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from networksecurity_project.constant import training_pipeline
+from networksecurity_project.constant.training_pipeline import SCHEMA_FILE_PATH
+from networksecurity_project.entity.artifact_entity import DataIngestionArtifact
+from networksecurity_project.entity.config_entity import (ArtifactStoreConfig, DataValidationConfig, StageCacheConfig,
+                                                          TrainingPipelineConfig)
+from networksecurity_project.pipeline import training_pipeline as training_pipeline_module
+from networksecurity_project.pipeline.artifact_store import ArtifactStore
+from networksecurity_project.pipeline.stage_cache import StageCache
+from networksecurity_project.utils.main_utils.utils import get_schema_dtypes, save_dataframe
+
+REPO_SCHEMA_FILE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), SCHEMA_FILE_PATH)
+
+
+@pytest.fixture(autouse=True)
+def artifacts_in_tmp_path(tmp_path, monkeypatch):
+    ## the artifact folders and the schema path are relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.dirname(SCHEMA_FILE_PATH))
+    shutil.copyfile(REPO_SCHEMA_FILE_PATH, SCHEMA_FILE_PATH)
+
+
+def run_config(second: int) -> TrainingPipelineConfig:
+    return TrainingPipelineConfig(timestamp=datetime(2026, 1, 1, 0, 0, second))
+
+
+def make_cache(training_pipeline_config: TrainingPipelineConfig) -> StageCache:
+    return StageCache(StageCacheConfig(training_pipeline_config),
+                      artifact_store=ArtifactStore(ArtifactStoreConfig(training_pipeline_config)))
+
+
+def write_file(file_path: str, data: bytes) -> str:
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as file_obj:
+        file_obj.write(data)
+    return file_path
+
+
+def cached_ingestion(training_pipeline_config: TrainingPipelineConfig, stage_cache: StageCache, fingerprint: str):
+    """
+    Writes the split files of an ingestion into the run folder and records them in the cache
+    """
+    artifact = DataIngestionArtifact(
+        trained_file_path=write_file(os.path.join(training_pipeline_config.artifact_dir, "data_ingestion", "train.parquet"), b"train" * 100),
+        test_file_path=write_file(os.path.join(training_pipeline_config.artifact_dir, "data_ingestion", "test.parquet"), b"test" * 100))
+    stage_cache.put("ingestion", fingerprint, artifact)
+    return artifact
+
+
+def test_inputs_config_and_version_change_the_fingerprint(monkeypatch):
+    input_file_path = write_file(os.path.join("inputs", "input.csv"), b"1,2,3\n")
+    first_config, second_config = run_config(1), run_config(2)
+    first_cache, second_cache = make_cache(first_config), make_cache(second_config)
+    fingerprint = first_cache.fingerprint("validation", DataValidationConfig(first_config), [input_file_path])
+
+    ## the run folder is not part of the key
+    assert second_cache.fingerprint("validation", DataValidationConfig(second_config), [input_file_path]) == fingerprint
+
+    write_file(input_file_path, b"1,2,4\n")
+    assert second_cache.fingerprint("validation", DataValidationConfig(second_config), [input_file_path]) != fingerprint
+    write_file(input_file_path, b"1,2,3\n")
+
+    data_validation_config = DataValidationConfig(second_config)
+    data_validation_config.drift_threshold = 0.5
+    assert second_cache.fingerprint("validation", data_validation_config, [input_file_path]) != fingerprint
+
+    monkeypatch.setattr(training_pipeline, "STAGE_CACHE_VERSION", training_pipeline.STAGE_CACHE_VERSION + 1)
+    assert second_cache.fingerprint("validation", DataValidationConfig(second_config), [input_file_path]) != fingerprint
+
+
+def test_record_with_a_changed_file_size_is_a_miss():
+    first_config = run_config(1)
+    first_cache = make_cache(first_config)
+    artifact = cached_ingestion(first_config, first_cache, "fingerprint")
+    assert make_cache(run_config(2)).get("ingestion", "fingerprint", DataIngestionArtifact) is not None
+
+    write_file(artifact.test_file_path, b"test" * 99)
+    second_cache = make_cache(run_config(3))
+    assert second_cache.get("ingestion", "fingerprint", DataIngestionArtifact) is None
+    assert second_cache.hits == []
+
+
+def test_hit_links_the_artifact_into_the_new_run():
+    first_config, second_config = run_config(1), run_config(2)
+    artifact = cached_ingestion(first_config, make_cache(first_config), "fingerprint")
+    second_cache = make_cache(second_config)
+
+    cached = second_cache.get("ingestion", "fingerprint", DataIngestionArtifact)
+
+    assert second_cache.hits == ["ingestion"]
+    for old_path, new_path in [(artifact.trained_file_path, cached.trained_file_path),
+                               (artifact.test_file_path, cached.test_file_path)]:
+        assert os.path.commonpath([new_path, second_config.artifact_dir]) == second_config.artifact_dir
+        assert os.stat(new_path).st_ino == os.stat(old_path).st_ino
+    ## the record now points at the new run, the first one can be deleted without breaking the cache
+    shutil.rmtree(first_config.artifact_dir)
+    third_cache = make_cache(run_config(3))
+    assert third_cache.get("ingestion", "fingerprint", DataIngestionArtifact) is not None
+    assert third_cache.hits == ["ingestion"]
+
+
+def test_pipeline_validation_hit_reuses_the_drift_baseline(monkeypatch):
+    ## an ingestion split shared by two runs of the pipeline, each run in a folder of its own
+    columns = list(get_schema_dtypes(SCHEMA_FILE_PATH))
+    rng = np.random.default_rng(0)
+    split_file_paths = []
+    for name in ["train.parquet", "test.parquet"]:
+        split_file_paths.append(os.path.join("ingested", name))
+        os.makedirs("ingested", exist_ok=True)
+        save_dataframe(split_file_paths[-1], pd.DataFrame(rng.integers(-1, 2, (40, len(columns))), columns=columns),
+                       schema_dtypes=get_schema_dtypes(SCHEMA_FILE_PATH))
+    data_ingestion_artifact = DataIngestionArtifact(trained_file_path=split_file_paths[0], test_file_path=split_file_paths[1])
+    monkeypatch.setenv("SYNC_LOCAL_ROOT", "bucket")
+
+    pipelines = []
+    for second in [1, 2]:
+        monkeypatch.setattr(training_pipeline_module, "TrainingPipelineConfig", lambda second=second: run_config(second))
+        pipelines.append(training_pipeline_module.TrainingPipeline())
+    first_artifact = pipelines[0].start_data_validation(data_ingestion_artifact)
+    os.remove(pipelines[0].data_validation_config.final_drift_baseline_file_path)
+    second_artifact = pipelines[1].start_data_validation(data_ingestion_artifact)
+
+    assert pipelines[0].stage_cache.hits == []
+    assert pipelines[1].stage_cache.hits == ["validation"]
+    second_run_dir = pipelines[1].training_pipeline_config.artifact_dir
+    assert os.path.commonpath([second_artifact.drift_baseline_file_path, second_run_dir]) == second_run_dir
+    assert os.stat(second_artifact.drift_baseline_file_path).st_ino == os.stat(first_artifact.drift_baseline_file_path).st_ino
+    with open(first_artifact.drift_baseline_file_path, "rb") as baseline, \
+            open(pipelines[1].data_validation_config.final_drift_baseline_file_path, "rb") as final_baseline:
+        assert final_baseline.read() == baseline.read()
@@ -0,0 +1,136 @@
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from networksecurity_project.pipeline.training_jobs import TrainingJobManager
+
+
+## job targets run in spawned processes, so they live at module level
+
+def succeeding_job(job_id, events):
+    events.put((job_id, "stage", "ingestion"))
+    events.put((job_id, "stage", "trainer"))
+    events.put((job_id, "succeeded", {"test_f1_score": 1.0}))
+
+
+def failing_job(job_id, events):
+    events.put((job_id, "stage", "ingestion"))
+    events.put((job_id, "failed", "no data"))
+
+
+def square(value):
+    return value * value
+
+
+def pool_job(job_id, events):
+    ## the model search starts worker processes from the training process
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        result = sum(executor.map(square, range(4)))
+    events.put((job_id, "succeeded", {"result": result}))
+
+
+def sleeping_job(job_id, events):
+    ## a model search in the middle of its fits, the stage reports the worker pids
+    executor = ProcessPoolExecutor(max_workers=2)
+    futures = [executor.submit(time.sleep, 60) for _ in range(2)]
+    while len(executor._processes) < 2:
+        time.sleep(0.05)
+    events.put((job_id, "stage", "workers:" + ",".join(str(pid) for pid in executor._processes)))
+    time.sleep(60)
+
+
+def process_gone(pid):
+    ## an orphaned worker may stay a zombie until the init process reaps it
+    try:
+        with open(f"/proc/{pid}/stat") as file_obj:
+            return file_obj.read().rsplit(")", 1)[1].split()[0] == "Z"
+    except FileNotFoundError:
+        return True
+
+
+def wait_for(predicate, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return
+        time.sleep(0.05)
+    raise AssertionError("condition not met in time")
+
+
+@pytest.fixture
+def make_manager():
+    managers = []
+
+    def make(**kwargs):
+        manager = TrainingJobManager(**kwargs)
+        manager.start()
+        managers.append(manager)
+        return manager
+    yield make
+    for manager in managers:
+        manager.stop()
+
+
+def test_job_succeeds_and_calls_on_success(make_manager):
+    calls = []
+    manager = make_manager(job_target=succeeding_job, on_success=lambda: calls.append(True))
+    job = manager.submit()
+    wait_for(lambda: manager.get(job.job_id).status == "succeeded")
+    wait_for(lambda: calls)
+    status = manager.status(job.job_id)
+    assert status["result"] == {"test_f1_score": 1.0}
+    assert status["stages_completed"] == ["ingestion", "trainer"]
+
+
+def test_job_failure_is_reported(make_manager):
+    manager = make_manager(job_target=failing_job)
+    job = manager.submit()
+    wait_for(lambda: manager.get(job.job_id).status == "failed")
+    assert manager.get(job.job_id).error == "no data"
+
+
+def test_training_process_can_start_worker_processes(make_manager):
+    manager = make_manager(job_target=pool_job)
+    job = manager.submit()
+    wait_for(lambda: manager.get(job.job_id).status in ("succeeded", "failed"))
+    assert manager.get(job.job_id).status == "succeeded", manager.get(job.job_id).error
+    assert manager.get(job.job_id).result == {"result": 14}
+
+
+def test_jobs_wait_for_a_free_slot_and_cancel(make_manager):
+    manager = make_manager(job_target=sleeping_job, max_concurrent=1)
+    first, second = manager.submit(), manager.submit()
+    wait_for(lambda: (manager.get(first.job_id).stage or "").startswith("workers:"))
+    worker_pids = [int(pid) for pid in manager.get(first.job_id).stage.split(":")[1].split(",")]
+    assert manager.get(second.job_id).status == "pending"
+
+    manager.cancel(second.job_id)
+    assert manager.get(second.job_id).status == "cancelled"
+
+    process = manager._processes[first.job_id]
+    manager.cancel(first.job_id)
+    assert manager.get(first.job_id).status == "cancelled"
+    assert not process.is_alive()
+    ## the model search workers go with the training process
+    wait_for(lambda: all(process_gone(pid) for pid in worker_pids), timeout=10)
+
+
+def test_success_callback_does_not_hold_the_lock(make_manager):
+    entered, release = threading.Event(), threading.Event()
+
+    def on_success():
+        entered.set()
+        release.wait(timeout=30)
+
+    manager = make_manager(job_target=succeeding_job, on_success=on_success)
+    manager.submit()
+    assert entered.wait(timeout=60)
+    try:
+        start = time.perf_counter()
+        job = manager.submit()
+        manager.cancel(job.job_id)
+        assert time.perf_counter() - start < 1.0
+    finally:
+        release.set()